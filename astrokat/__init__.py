@@ -29,7 +29,7 @@ from .utility import (
     datetime2timestamp,
     timestamp2datetime,
 )
-from .observatory import Observatory, collect_targets
+from .observatory import Observatory, build_catalogue, collect_targets, get_observatory
 
 
 # BEGIN VERSION CHECK
@@ -163,6 +163,40 @@ def cli(
     group.add_argument(
         "--trace", action="store_true", help="Debug trace logger output for debugging"
     )
+    group.add_argument(
+        "--log-format",
+        choices=["text", "json"],
+        default="text",
+        help="Simulation log output as text or compact JSON lines",
+    )
+    group.add_argument(
+        "--sensor-timeline",
+        type=str,
+        help="Replay sensor values from a CSV or JSON lines file in simulation",
+    )
+    group.add_argument(
+        "--sim-antennas",
+        type=str,
+        help="Simulated subarray: number of antennas, 'mkat' for all MeerKAT "
+             "antennas, an antenna position file or comma separated names",
+    )
+    group.add_argument(
+        "--slew-model",
+        type=str,
+        help="Calibrated simulator slew model YAML file, see astrokat-slewfit.py",
+    )
+    group.add_argument(
+        "--ephemeris-cache",
+        type=str,
+        help="Directory to save and reuse fitted Sun, Moon and planet positions",
+    )
+    group.add_argument(
+        "--sim-digitiser",
+        type=str,
+        help="Simulate digitiser noise diode replies, comma separated options "
+             "latency, jitter, clock_offset [sec], failure_rate and seed, "
+             "e.g. 'latency=0.05,jitter=0.01'",
+    )
 
     return parser.parse_known_args(args=args)
 
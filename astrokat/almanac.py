@@ -0,0 +1,325 @@
+"""Precomputed rise, transit and set times of catalogue sources.
+
+An almanac holds the first rise, transit and set time after the start of
+every UTC day in a date range for all sources in a set of catalogue files,
+so rise and set queries for any date in the range are array lookups.
+Almanacs are saved as compressed .npz files together with a hash of the
+catalogue files, and are only rebuilt when the catalogues change.
+
+"""
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import glob
+import ephem
+import hashlib
+import katpoint
+import numpy
+
+from datetime import datetime
+
+from . import coordinates
+from .observatory import Observatory, get_ref_location, _SIDEREAL_RATE
+from .simulate import _UNIX_EPOCH_DATE
+from .utility import datetime2timestamp
+
+_DAY = 86400.
+_SIDEREAL_DAY = _DAY / _SIDEREAL_RATE
+_ALMANAC_DAYS = 366
+_EVENTS = ["rise", "transit", "set"]
+# catalogue sources with the same name further apart are different targets
+_POSITION_TOLERANCE = numpy.radians(1. / 3600.)
+
+
+def catalogue_files(path):
+    """Sorted list of .csv catalogue files in a folder."""
+    return sorted(glob.glob(os.path.join(path, "*.csv")))
+
+
+def catalogue_hash(filenames):
+    """Hash of the names and contents of catalogue files."""
+    sha = hashlib.sha1()
+    for filename in sorted(filenames):
+        sha.update(os.path.basename(filename).encode("utf-8"))
+        with open(filename, "rb") as fin:
+            sha.update(fin.read())
+    return sha.hexdigest()
+
+
+class Almanac(object):
+    """Daily rise, transit and set times of catalogue sources.
+
+    Parameters
+    ----------
+    names: list of str
+        Source names
+    ra, dec: array_like
+        J2000 source coordinates [rad]
+    start: float
+        UTC timestamp of the start of the first day [sec]
+    horizon: float
+        Horizon of the rise and set times [deg]
+    location: str
+        katpoint description of the observer location
+    events: dict
+        (ndays, nsources) arrays per event name of the first event after
+        the start of every day [sec after day start], NaN if the source
+        does not cross the horizon
+    catalogue_hash: str, optional
+        Hash of the catalogue files the almanac was built from
+    aliases: list of list, optional
+        Alternative names per source
+
+    """
+
+    def __init__(self, names, ra, dec, start, horizon, location,
+                 events, catalogue_hash="", aliases=None):
+        self.names = list(names)
+        self.aliases = [list(alias) for alias in aliases or [[]] * len(self.names)]
+        self.ra = numpy.asarray(ra, dtype=float)
+        self.dec = numpy.asarray(dec, dtype=float)
+        self.start = float(start)
+        self.horizon = float(horizon)
+        self.location = str(location)
+        self.events = events
+        self.catalogue_hash = str(catalogue_hash)
+        self._index = dict((name, idx) for idx, name in enumerate(self.names))
+        for idx, aliases_ in enumerate(self.aliases):
+            for alias in aliases_:
+                self._index.setdefault(alias, idx)
+
+    @property
+    def days(self):
+        return self.events["rise"].shape[0]
+
+    @classmethod
+    def build(cls, catalogues, location=None, horizon=20.0, start=None,
+              days=_ALMANAC_DAYS):
+        """Compute the almanac of all sources in catalogue files.
+
+        Parameters
+        ----------
+        catalogues: list of str
+            Catalogue .csv files, sources found in earlier files take
+            precedence for duplicate names
+        location: str, optional
+            katpoint description of the observer location,
+            default the MeerKAT reference position
+        horizon: float, optional
+            Horizon [deg]
+        start: datetime, optional
+            First day of the almanac, default today
+        days: int, optional
+            Number of days
+
+        """
+        if location is None:
+            location = get_ref_location()
+        if start is None:
+            start = datetime.utcnow()
+        start = datetime2timestamp(
+            start.replace(hour=0, minute=0, second=0, microsecond=0))
+
+        names, aliases, ra, dec = [], [], [], []
+        for filename in catalogues:
+            with open(filename, "r") as fin:
+                for target in katpoint.Catalogue(fin):
+                    if target.name in names or target.body_type != "radec":
+                        continue
+                    names.append(target.name)
+                    aliases.append(target.aliases)
+                    ra.append(float(target.body._ra))
+                    dec.append(float(target.body._dec))
+
+        observatory = Observatory(location=location, horizon=horizon)
+        events = dict((event, numpy.empty((days, len(names)), dtype=numpy.float32))
+                      for event in _EVENTS)
+        for day in range(days):
+            day_start = start + day * _DAY
+            observatory.observer.date = ephem.Date(day_start / _DAY + _UNIX_EPOCH_DATE)
+            times = observatory.rise_set(ra, dec)
+            for event in _EVENTS:
+                utc = times["{}_utc".format(event)]
+                events[event][day] = (utc - float(observatory.observer.date)) * _DAY
+        return cls(names, ra, dec, start, horizon, location, events,
+                   catalogue_hash=catalogue_hash(catalogues),
+                   aliases=aliases)
+
+    def save(self, filename):
+        """Write the almanac to a compressed .npz file."""
+        arrays = dict(("{}_utc".format(event), self.events[event]) for event in _EVENTS)
+        # file object keeps the name, numpy would append .npz
+        with open(filename, "wb") as fout:
+            numpy.savez_compressed(fout,
+                                   names=numpy.array(self.names),
+                                   aliases=numpy.array(["|".join(alias)
+                                                        for alias in self.aliases]),
+                                   ra=self.ra,
+                                   dec=self.dec,
+                                   start=self.start,
+                                   horizon=self.horizon,
+                                   location=self.location,
+                                   catalogue_hash=self.catalogue_hash,
+                                   **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        """Read an almanac from a .npz file."""
+        with numpy.load(filename) as data:
+            events = dict((event, data["{}_utc".format(event)]) for event in _EVENTS)
+            return cls([str(name) for name in data["names"]],
+                       data["ra"],
+                       data["dec"],
+                       data["start"],
+                       data["horizon"],
+                       data["location"],
+                       events,
+                       catalogue_hash=data["catalogue_hash"],
+                       aliases=[str(alias).split("|") if alias else []
+                                for alias in data["aliases"]])
+
+    def covers(self, timestamp):
+        """Check that a UTC timestamp is within the almanac date range."""
+        return self.start <= timestamp < self.start + self.days * _DAY
+
+    def local_sidereal_time(self, timestamps):
+        """LST at the almanac location of UTC timestamps [hours]"""
+        longitude = float(katpoint.Antenna(self.location).observer.lon)
+        lst = coordinates.local_sidereal_time(timestamps, longitude)
+        return numpy.degrees(lst) / 15.
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def index(self, name):
+        """Position of a source by name or alias."""
+        return self._index[name]
+
+    def matches(self, target, location, horizon):
+        """Check that the almanac has the times of a target for an observer.
+
+        Parameters
+        ----------
+        target: katpoint.Target
+            Source, the almanac entry with its name must have its position
+        location: str
+            katpoint description of the observer location
+        horizon: float
+            Horizon of the rise and set times [deg]
+
+        """
+        if (self.location != location
+                or not numpy.isclose(self.horizon, horizon)
+                or target.body_type != "radec"
+                or target.name not in self):
+            return False
+        idx = self._index[target.name]
+        separation = ephem.separation((self.ra[idx], self.dec[idx]),
+                                      (target.body._ra, target.body._dec))
+        return float(separation) < _POSITION_TOLERANCE
+
+    def events_on(self, date, names=None):
+        """First rise, transit and set after the start of a UTC day.
+
+        Parameters
+        ----------
+        date: datetime or float
+            Day as datetime or UTC timestamp [sec]
+        names: list of str, optional
+            Source names, default all sources
+
+        Returns
+        -------
+        times: dict
+            UTC timestamps [sec] per event name, NaN if the source does
+            not cross the horizon
+
+        """
+        if isinstance(date, datetime):
+            date = datetime2timestamp(date)
+        if not self.covers(date):
+            raise ValueError("Date {} outside almanac starting {} for {} days"
+                             .format(datetime.utcfromtimestamp(date),
+                                     datetime.utcfromtimestamp(self.start),
+                                     self.days))
+        day = int((date - self.start) // _DAY)
+        idx = slice(None) if names is None else [self._index[name] for name in names]
+        # offsets are single precision, timestamps need double
+        return dict((event, self.start + day * _DAY
+                     + self.events[event][day, idx].astype(float))
+                    for event in _EVENTS)
+
+    def next_rise_set(self, name, timestamp):
+        """Next rise after a UTC timestamp and the set following it.
+
+        Returns
+        -------
+        rise, set: float
+            UTC timestamps [sec], None if the source does not cross the
+            horizon or the timestamp is outside the almanac date range
+
+        """
+        src = self._index[name]
+        times = []
+        for event in ["rise", "set"]:
+            day = int((timestamp - self.start) // _DAY)
+            if not 0 <= day < self.days:
+                return None, None
+            event_time = self.start + day * _DAY + float(self.events[event][day, src])
+            if not numpy.isfinite(event_time):
+                return None, None
+            # events repeat every sidereal day, up to twice per UTC day
+            while event_time < timestamp:
+                event_time += _SIDEREAL_DAY
+            times.append(event_time)
+            timestamp = event_time
+        return tuple(times)
+
+
+def load_almanac(filename, catalogues, location=None, horizon=20.0, date=None,
+                 days=_ALMANAC_DAYS):
+    """Read an almanac covering a date, building and saving it if outdated.
+
+    The almanac is rebuilt, starting at `date`, if the catalogue files
+    changed, the location or horizon differ, or it does not cover `date`.
+
+    Parameters
+    ----------
+    filename: str
+        Almanac .npz file
+    catalogues: list of str
+        Catalogue .csv files
+    location, horizon:
+        See `Almanac.build`
+    date: datetime, optional
+        Date to cover, default today
+    days: int, optional
+        Number of days of a rebuilt almanac
+
+    """
+    if location is None:
+        location = get_ref_location()
+    if date is None:
+        date = datetime.utcnow()
+    if os.path.isfile(filename):
+        almanac = Almanac.load(filename)
+        if (almanac.catalogue_hash == catalogue_hash(catalogues)
+                and almanac.location == location
+                and almanac.horizon == float(horizon)
+                and almanac.covers(datetime2timestamp(date))):
+            return almanac
+    almanac = Almanac.build(catalogues,
+                            location=location,
+                            horizon=horizon,
+                            start=date,
+                            days=days)
+    almanac.save(filename)
+    return almanac
+
+
+def timestamp2date(timestamp):
+    """ephem.Date of a UTC timestamp [sec]"""
+    return ephem.Date(timestamp / _DAY + _UNIX_EPOCH_DATE)
+
+# -fin-
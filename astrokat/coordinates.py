@@ -0,0 +1,375 @@
+"""Vectorised celestial coordinate conversions using NumPy only.
+
+Converts J2000 (ra, dec) positions to apparent place, hour angle and
+horizontal coordinates for arrays of targets and times, without calling
+ephem per position. Sidereal time follows IAU 1982, precession IAU 1976,
+nutation the leading terms of the IAU 1980 series and annual aberration
+the low precision solar theory, following Meeus, Astronomical Algorithms.
+Agreement with ephem is within 1 arcsec in az/el for dates within a few
+decades of J2000, including refraction above 1 deg elevation
+(see test_coordinates.py). Precession, nutation and aberration are
+evaluated at the start of UTC days, cached, and interpolated in between.
+
+All angles are in radians and all times are UTC timestamps in seconds
+since the Unix epoch. UT1 - UTC and TT - UTC are ignored.
+
+"""
+from __future__ import division
+from __future__ import absolute_import
+
+import numpy
+
+from .utility import LRUCache
+
+_DAY = 86400.
+_UNIX_EPOCH_JD = 2440587.5
+_J2000_JD = 2451545.0
+_ARCSEC = numpy.pi / (180. * 3600.)
+# constant of aberration
+_KAPPA = 20.49552 * _ARCSEC
+
+# Leading terms of the IAU 1980 nutation series:
+# multipliers of (D, M, M', F, Omega), dpsi and deps [0.0001 arcsec]
+# with their rates per Julian century
+_NUTATION_TERMS = numpy.array([
+    [0, 0, 0, 0, 1, -171996, -174.2, 92025, 8.9],
+    [-2, 0, 0, 2, 2, -13187, -1.6, 5736, -3.1],
+    [0, 0, 0, 2, 2, -2274, -0.2, 977, -0.5],
+    [0, 0, 0, 0, 2, 2062, 0.2, -895, 0.5],
+    [0, 1, 0, 0, 0, 1426, -3.4, 54, -0.1],
+    [0, 0, 1, 0, 0, 712, 0.1, -7, 0.0],
+    [-2, 1, 0, 2, 2, -517, 1.2, 224, -0.6],
+    [0, 0, 0, 2, 1, -386, -0.4, 200, 0.0],
+    [0, 0, 1, 2, 2, -301, 0.0, 129, -0.1],
+    [-2, -1, 0, 2, 2, 217, -0.5, -95, 0.3],
+    [-2, 0, 1, 0, 0, -158, 0.0, 0, 0.0],
+    [-2, 0, 0, 2, 1, 129, 0.1, -70, 0.0],
+    [0, 0, -1, 2, 2, 123, 0.0, -53, 0.0],
+    [2, 0, 0, 0, 0, 63, 0.0, 0, 0.0],
+    [0, 0, 1, 0, 1, 63, 0.1, -33, 0.0],
+    [2, 0, -1, 2, 2, -59, 0.0, 26, 0.0],
+    [0, 0, -1, 0, 1, -58, -0.1, 32, 0.0],
+    [0, 0, 1, 2, 1, -51, 0.0, 27, 0.0],
+])
+
+# precession-nutation matrix, aberration vector and equation of the
+# equinoxes at the start of UTC days, shared by all positions of the day
+_daily_terms_cache = LRUCache(maxsize=1024)
+
+# refraction model of ephem (libastro), switching formula around 15 deg
+_REFRACTION_LOW = numpy.radians(14.5)
+_REFRACTION_HIGH = numpy.radians(15.5)
+
+
+def julian_centuries(timestamps):
+    """Julian centuries since J2000 for UTC timestamps [sec]."""
+    jd = numpy.asarray(timestamps, dtype=float) / 86400. + _UNIX_EPOCH_JD
+    return (jd - _J2000_JD) / 36525.
+
+
+def gmst(timestamps):
+    """Greenwich mean sidereal time [rad], IAU 1982."""
+    timestamps = numpy.asarray(timestamps, dtype=float)
+    days = timestamps / 86400. + _UNIX_EPOCH_JD - _J2000_JD
+    t = days / 36525.
+    # split the day count, keeping precision of the fast term
+    whole_days = numpy.floor(days)
+    gmst_deg = (280.46061837
+                + 360.98564736629 * (days - whole_days)
+                + 0.98564736629 * whole_days
+                + 0.000387933 * t ** 2
+                - t ** 3 / 38710000.)
+    return numpy.radians(numpy.mod(gmst_deg, 360.))
+
+
+def mean_obliquity(timestamps):
+    """Mean obliquity of the ecliptic [rad], IAU 1980."""
+    t = julian_centuries(timestamps)
+    eps = (84381.448 - 46.8150 * t - 0.00059 * t ** 2 + 0.001813 * t ** 3)
+    return eps * _ARCSEC
+
+
+def nutation(timestamps):
+    """Nutation in longitude and obliquity [rad], truncated IAU 1980 series.
+
+    Returns
+    -------
+    dpsi, deps: numpy.ndarray
+
+    """
+    t = julian_centuries(timestamps)
+    t_ = t[..., numpy.newaxis]
+    args = numpy.radians(numpy.array([
+        297.85036 + 445267.111480 * t - 0.0019142 * t ** 2 + t ** 3 / 189474.,
+        357.52772 + 35999.050340 * t - 0.0001603 * t ** 2 - t ** 3 / 300000.,
+        134.96298 + 477198.867398 * t + 0.0086972 * t ** 2 + t ** 3 / 56250.,
+        93.27191 + 483202.017538 * t - 0.0036825 * t ** 2 + t ** 3 / 327270.,
+        125.04452 - 1934.136261 * t + 0.0020708 * t ** 2 + t ** 3 / 450000.,
+    ]))
+    # argument of every series term, shape (..., nterms)
+    phase = numpy.tensordot(numpy.moveaxis(args, 0, -1),
+                            _NUTATION_TERMS[:, :5].T,
+                            axes=1)
+    terms = _NUTATION_TERMS
+    dpsi = ((terms[:, 5] + terms[:, 6] * t_) * numpy.sin(phase)).sum(axis=-1)
+    deps = ((terms[:, 7] + terms[:, 8] * t_) * numpy.cos(phase)).sum(axis=-1)
+    return dpsi * 1e-4 * _ARCSEC, deps * 1e-4 * _ARCSEC
+
+
+def gast(timestamps):
+    """Greenwich apparent sidereal time [rad]."""
+    dpsi, _ = nutation(timestamps)
+    eqeq = dpsi * numpy.cos(mean_obliquity(timestamps))
+    return numpy.mod(gmst(timestamps) + eqeq, 2. * numpy.pi)
+
+
+def local_sidereal_time(timestamps, longitude):
+    """Local apparent sidereal time [rad] at east longitude [rad]."""
+    timestamps = numpy.asarray(timestamps, dtype=float)
+    _, _, eqeq = _slow_terms_(timestamps)
+    return numpy.mod(gmst(timestamps) + eqeq + longitude, 2. * numpy.pi)
+
+
+def _rotation_(axis, angle):
+    """Rotation matrices of the coordinate frame, shape angle.shape + (3, 3)."""
+    angle = numpy.asarray(angle, dtype=float)
+    c, s = numpy.cos(angle), numpy.sin(angle)
+    one, zero = numpy.ones_like(angle), numpy.zeros_like(angle)
+    if axis == 0:
+        rows = [[one, zero, zero], [zero, c, s], [zero, -s, c]]
+    elif axis == 1:
+        rows = [[c, zero, -s], [zero, one, zero], [s, zero, c]]
+    else:
+        rows = [[c, s, zero], [-s, c, zero], [zero, zero, one]]
+    return numpy.moveaxis(numpy.array(rows), [0, 1], [-2, -1])
+
+
+def precession_matrix(timestamps):
+    """Rotation from J2000 mean equator to mean equator of date, IAU 1976."""
+    t = julian_centuries(timestamps)
+    zeta = (2306.2181 * t + 0.30188 * t ** 2 + 0.017998 * t ** 3) * _ARCSEC
+    z = (2306.2181 * t + 1.09468 * t ** 2 + 0.018203 * t ** 3) * _ARCSEC
+    theta = (2004.3109 * t - 0.42665 * t ** 2 - 0.041833 * t ** 3) * _ARCSEC
+    return numpy.matmul(_rotation_(2, -z),
+                        numpy.matmul(_rotation_(1, theta), _rotation_(2, -zeta)))
+
+
+def nutation_matrix(timestamps):
+    """Rotation from mean equator of date to true equator of date."""
+    dpsi, deps = nutation(timestamps)
+    eps = mean_obliquity(timestamps)
+    return numpy.matmul(_rotation_(0, -(eps + deps)),
+                        numpy.matmul(_rotation_(2, -dpsi), _rotation_(0, eps)))
+
+
+def aberration_vector(timestamps):
+    """Earth velocity over the speed of light in the true equator of date."""
+    t = julian_centuries(timestamps)
+    mean_anomaly = numpy.radians(357.52911 + 35999.05029 * t - 0.0001537 * t ** 2)
+    centre = numpy.radians((1.914602 - 0.004817 * t - 0.000014 * t ** 2)
+                           * numpy.sin(mean_anomaly)
+                           + (0.019993 - 0.000101 * t) * numpy.sin(2. * mean_anomaly)
+                           + 0.000289 * numpy.sin(3. * mean_anomaly))
+    sun_lon = numpy.radians(280.46646 + 36000.76983 * t + 0.0003032 * t ** 2) + centre
+    eccentricity = 0.016708634 - 0.000042037 * t
+    perihelion = numpy.radians(102.93735 + 1.71946 * t + 0.00046 * t ** 2)
+    vx = _KAPPA * (numpy.sin(sun_lon) - eccentricity * numpy.sin(perihelion))
+    vy = -_KAPPA * (numpy.cos(sun_lon) - eccentricity * numpy.cos(perihelion))
+    dpsi, deps = nutation(timestamps)
+    eps = mean_obliquity(timestamps) + deps
+    return numpy.array([vx, vy * numpy.cos(eps), vy * numpy.sin(eps)])
+
+
+def unit_vectors(ra, dec):
+    """Cartesian unit vectors, shape (3,) + ra.shape."""
+    ra = numpy.asarray(ra, dtype=float)
+    dec = numpy.asarray(dec, dtype=float)
+    return numpy.array([numpy.cos(dec) * numpy.cos(ra),
+                        numpy.cos(dec) * numpy.sin(ra),
+                        numpy.sin(dec)])
+
+
+def _daily_terms_(day):
+    """Slowly changing terms of the apparent place at the start of a UTC day.
+
+    Returns the precession-nutation matrix, aberration vector and equation
+    of the equinoxes flattened into one array of 13 values.
+
+    """
+    terms = _daily_terms_cache.get(day)
+    if terms is None:
+        timestamp = numpy.array([day * _DAY])
+        rotation = numpy.matmul(nutation_matrix(timestamp), precession_matrix(timestamp))
+        dpsi, _ = nutation(timestamp)
+        eqeq = dpsi * numpy.cos(mean_obliquity(timestamp))
+        terms = numpy.concatenate([rotation[0].ravel(),
+                                   aberration_vector(timestamp)[:, 0],
+                                   eqeq])
+        _daily_terms_cache.put(day, terms)
+    return terms
+
+
+def _slow_terms_(timestamps):
+    """Precession-nutation matrix, aberration vector and equation of the equinoxes.
+
+    The terms are interpolated linearly between their values at the start
+    of UTC days, changing by less than 0.5 arcsec per day with curvature
+    below 0.001 arcsec, instead of evaluating the series at every time.
+
+    Parameters
+    ----------
+    timestamps: numpy.ndarray
+        UTC times [sec]
+
+    Returns
+    -------
+    rotation, aberration, eqeq: numpy.ndarray
+        Arrays of shape timestamps.shape + (3, 3), timestamps.shape + (3,)
+        and timestamps.shape
+
+    """
+    days = numpy.floor(timestamps / _DAY)
+    unique_days, inverse = numpy.unique(days, return_inverse=True)
+    start = numpy.array([_daily_terms_(int(day)) for day in unique_days])
+    end = numpy.array([_daily_terms_(int(day) + 1) for day in unique_days])
+    inverse = inverse.reshape(timestamps.shape)
+    fraction = (timestamps / _DAY - days)[..., numpy.newaxis]
+    terms = start[inverse] + fraction * (end - start)[inverse]
+    return (terms[..., :9].reshape(timestamps.shape + (3, 3)),
+            terms[..., 9:12],
+            terms[..., 12])
+
+
+def apparent_radec(ra, dec, timestamps, epoch=None):
+    """Apparent place of mean positions at the given times.
+
+    Parameters
+    ----------
+    ra, dec: array_like
+        Mean equatorial coordinates [rad], broadcast against timestamps
+    timestamps: array_like
+        UTC times [sec]
+    epoch: float, optional
+        Time of the mean equinox of the coordinates [sec], default J2000
+
+    Returns
+    -------
+    ra, dec: numpy.ndarray
+        Apparent geocentric coordinates of date [rad]
+
+    """
+    ra, dec, timestamps = numpy.broadcast_arrays(numpy.asarray(ra, dtype=float),
+                                                 numpy.asarray(dec, dtype=float),
+                                                 numpy.asarray(timestamps, dtype=float))
+    # the slowly changing rotation is evaluated per unique time
+    times, inverse = numpy.unique(timestamps, return_inverse=True)
+    rotation, aberration, _ = _slow_terms_(times)
+    if epoch is not None:
+        # precess back from the mean equinox of epoch to J2000 first
+        rotation = numpy.matmul(rotation, precession_matrix(epoch).T)
+    inverse = inverse.reshape(ra.shape)
+    vec = numpy.moveaxis(unit_vectors(ra, dec), 0, -1)[..., numpy.newaxis]
+    vec = numpy.matmul(rotation[inverse], vec)[..., 0] + aberration[inverse]
+    vec /= numpy.sqrt((vec ** 2).sum(axis=-1))[..., numpy.newaxis]
+    return (numpy.mod(numpy.arctan2(vec[..., 1], vec[..., 0]), 2. * numpy.pi),
+            numpy.arcsin(numpy.clip(vec[..., 2], -1., 1.)))
+
+
+def hadec_to_azel(ha, dec, latitude):
+    """Horizontal coordinates, azimuth from north through east [rad]."""
+    az = numpy.arctan2(-numpy.cos(dec) * numpy.sin(ha),
+                       numpy.sin(dec) * numpy.cos(latitude)
+                       - numpy.cos(dec) * numpy.cos(ha) * numpy.sin(latitude))
+    el = numpy.arcsin(numpy.clip(numpy.sin(latitude) * numpy.sin(dec)
+                                 + numpy.cos(latitude) * numpy.cos(dec) * numpy.cos(ha),
+                                 -1., 1.))
+    return numpy.mod(az, 2. * numpy.pi), el
+
+
+def azel_to_hadec(az, el, latitude):
+    """Hour angle and declination of horizontal coordinates [rad]."""
+    ha = numpy.arctan2(-numpy.sin(az) * numpy.cos(el),
+                       numpy.cos(latitude) * numpy.sin(el)
+                       - numpy.sin(latitude) * numpy.cos(el) * numpy.cos(az))
+    dec = numpy.arcsin(numpy.clip(numpy.sin(latitude) * numpy.sin(el)
+                                  + numpy.cos(latitude) * numpy.cos(el) * numpy.cos(az),
+                                  -1., 1.))
+    return ha, dec
+
+
+def parallactic_angle(ha, dec, latitude):
+    """Parallactic angle [rad]."""
+    return numpy.arctan2(numpy.sin(ha),
+                         numpy.tan(latitude) * numpy.cos(dec)
+                         - numpy.sin(dec) * numpy.cos(ha))
+
+
+def _unrefract_(el, pressure, temperature):
+    """True elevation of an apparent elevation, ephem refraction model."""
+    el_deg = numpy.degrees(el)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        low = el - numpy.radians(
+            (0.1594 + 0.0196 * el_deg + 0.00002 * el_deg ** 2) * pressure
+            / ((1. + 0.505 * el_deg + 0.0845 * el_deg ** 2) * (273. + temperature)))
+        high = el - 7.888888e-5 * pressure / ((273. + temperature) * numpy.tan(el))
+    weight = numpy.clip((el - _REFRACTION_LOW) / (_REFRACTION_HIGH - _REFRACTION_LOW),
+                        0., 1.)
+    return (numpy.where(weight > 0., weight * high, 0.)
+            + numpy.where(weight < 1., (1. - weight) * low, 0.))
+
+
+def refract(el, pressure=1010., temperature=10.):
+    """Apparent elevation of a true elevation [rad].
+
+    Parameters
+    ----------
+    el: array_like
+        True (airless) elevation [rad]
+    pressure: float
+        Atmospheric pressure [mbar], 0 for no refraction
+    temperature: float
+        Air temperature [deg C]
+
+    """
+    el = numpy.asarray(el, dtype=float)
+    if not pressure:
+        return el
+    apparent = el.copy()
+    # fixed point iteration on the inverse model
+    for _ in range(4):
+        apparent = apparent + (el - _unrefract_(apparent, pressure, temperature))
+    return apparent
+
+
+def radec_to_azel(ra, dec, timestamps, longitude, latitude,
+                  pressure=0., temperature=15.):
+    """Horizontal coordinates of J2000 positions.
+
+    Parameters
+    ----------
+    ra, dec: array_like
+        J2000 coordinates [rad], broadcast against timestamps
+    timestamps: array_like
+        UTC times [sec]
+    longitude, latitude: float
+        Geodetic observer position, east longitude [rad]
+    pressure: float, optional
+        Atmospheric pressure [mbar], default no refraction
+    temperature: float, optional
+        Air temperature [deg C]
+
+    Returns
+    -------
+    az, el, ha, pa: numpy.ndarray
+        Azimuth, elevation, hour angle and parallactic angle [rad]
+
+    """
+    timestamps = numpy.asarray(timestamps, dtype=float)
+    app_ra, app_dec = apparent_radec(ra, dec, timestamps)
+    ha = local_sidereal_time(timestamps, longitude) - app_ra
+    ha = numpy.mod(ha + numpy.pi, 2. * numpy.pi) - numpy.pi
+    az, el = hadec_to_azel(ha, app_dec, latitude)
+    el = refract(el, pressure, temperature)
+    return az, el, ha, parallactic_angle(ha, app_dec, latitude)
+
+# -fin-
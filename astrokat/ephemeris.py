@@ -0,0 +1,202 @@
+"""Interpolated ephemerides of moving bodies.
+
+The apparent topocentric position of the Sun, Moon and planets is sampled
+by ephem once per UTC day and fitted with Chebyshev polynomials, halving
+the fit interval until the fit is within the requested accuracy. Position
+queries are then polynomial evaluations, converted to horizontal
+coordinates by the `coordinates` engine, at the cost of a fixed target.
+
+Fitted days can be persisted as .npz files in a directory to be reused
+by later runs for the same location.
+
+"""
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import ephem
+import numpy
+
+from datetime import datetime, timedelta
+from numpy.polynomial import chebyshev
+
+from . import coordinates
+from .simulate import _UNIX_EPOCH_DATE
+from .utility import LRUCache
+
+# Fit accuracy [arcsec]
+_DEFAULT_ACCURACY = 0.5
+_CHEBYSHEV_DEGREE = 12
+# Maximum number of fit interval halvings per day
+_MAX_DEPTH = 6
+_DAY = 86400.
+
+
+def _location_key_(observer):
+    return (round(float(observer.lat), 9),
+            round(float(observer.lon), 9),
+            round(float(observer.elevation), 1))
+
+
+def _unit_vectors_(body, observer, timestamps):
+    """Apparent topocentric position of body as unit vectors, shape (3, N)"""
+    ra = numpy.empty(len(timestamps))
+    dec = numpy.empty(len(timestamps))
+    for idx, timestamp in enumerate(timestamps):
+        observer.date = timestamp / _DAY + _UNIX_EPOCH_DATE
+        body.compute(observer)
+        ra[idx], dec[idx] = body.ra, body.dec
+    return coordinates.unit_vectors(ra, dec)
+
+
+class EphemerisCache(object):
+    """Chebyshev interpolated positions of moving bodies.
+
+    Parameters
+    ----------
+    accuracy: float, optional
+        Maximum position error of the interpolation [arcsec]
+    directory: str, optional
+        Directory to persist fitted days in, memory only if not given
+    maxsize: int, optional
+        Maximum number of fitted days kept in memory
+
+    """
+
+    def __init__(self, accuracy=_DEFAULT_ACCURACY, directory=None, maxsize=256):
+        self.accuracy = accuracy
+        self.directory = directory
+        self._days = LRUCache(maxsize=maxsize)
+
+    @staticmethod
+    def cacheable(body):
+        """Bodies with an interpolated ephemeris, the Sun, Moon and planets"""
+        return isinstance(body, ephem.Planet)
+
+    def _filename_(self, name, location, day):
+        date = datetime(1970, 1, 1) + timedelta(days=day)
+        return os.path.join(self.directory,
+                            "{}_{:%Y%m%d}_{:.6f}_{:.6f}_{:.0f}.npz".format(
+                                name,
+                                date,
+                                numpy.degrees(location[0]),
+                                numpy.degrees(location[1]),
+                                location[2]))
+
+    def _fit_day_(self, body, observer, day):
+        """Chebyshev coefficients per fit interval, shape (nint, degree + 1, 3)"""
+        tolerance = numpy.radians(self.accuracy / 3600.)
+        # fit at Chebyshev nodes, check the fit halfway between them
+        nodes = numpy.cos(numpy.pi * (numpy.arange(_CHEBYSHEV_DEGREE + 1) + 0.5)
+                          / (_CHEBYSHEV_DEGREE + 1))[::-1]
+        checks = (nodes[1:] + nodes[:-1]) / 2.
+        for depth in range(_MAX_DEPTH + 1):
+            nint = 2 ** depth
+            width = _DAY / nint
+            starts = day * _DAY + width * numpy.arange(nint)
+            coefs = numpy.empty((nint, _CHEBYSHEV_DEGREE + 1, 3))
+            error = 0.
+            for idx, start in enumerate(starts):
+                vec = _unit_vectors_(body, observer, start + width * (nodes + 1.) / 2.)
+                coefs[idx] = chebyshev.chebfit(nodes, vec.T, _CHEBYSHEV_DEGREE)
+                vec = _unit_vectors_(body, observer, start + width * (checks + 1.) / 2.)
+                fit = chebyshev.chebval(checks, coefs[idx])
+                fit /= numpy.sqrt((fit ** 2).sum(axis=0))
+                error = max(error, numpy.sqrt(((fit - vec) ** 2).sum(axis=0)).max())
+            if error < tolerance:
+                break
+        return coefs
+
+    def _day_coefficients_(self, body, observer, day):
+        name = type(body).__name__
+        location = _location_key_(observer)
+        key = (name, location, day)
+        coefs = self._days.get(key)
+        if coefs is not None:
+            return coefs
+        filename = None
+        if self.directory is not None:
+            filename = self._filename_(name, location, day)
+            if os.path.isfile(filename):
+                with numpy.load(filename) as data:
+                    if float(data["accuracy"]) <= self.accuracy:
+                        coefs = data["coefs"]
+        if coefs is None:
+            coefs = self._fit_day_(body, observer, day)
+            if filename is not None:
+                if not os.path.isdir(self.directory):
+                    os.makedirs(self.directory)
+                numpy.savez(filename, coefs=coefs, accuracy=self.accuracy)
+        self._days.put(key, coefs)
+        return coefs
+
+    def radec(self, body, observer, timestamps):
+        """Apparent topocentric (ra, dec) of body [rad].
+
+        Parameters
+        ----------
+        body: ephem.Planet
+            Sun, Moon or planet
+        observer: ephem.Observer
+            observer location, its date is not changed
+        timestamps: array_like
+            UTC times since the epoch [sec]
+
+        """
+        timestamps = numpy.atleast_1d(numpy.asarray(timestamps, dtype=float))
+        # refraction is applied to horizontal coordinates only
+        observer = observer.copy()
+        observer.pressure = 0.
+        days = numpy.floor(timestamps / _DAY)
+        vec = numpy.empty((3, timestamps.size))
+        for day in numpy.unique(days):
+            coefs = self._day_coefficients_(body, observer, int(day))
+            nint = coefs.shape[0]
+            offset = (timestamps - day * _DAY) * nint / _DAY
+            interval = numpy.clip(numpy.floor(offset), 0, nint - 1)
+            for idx in numpy.unique(interval[days == day]):
+                mask = (days == day) & (interval == idx)
+                x = 2. * (offset[mask] - idx) - 1.
+                vec[:, mask] = chebyshev.chebval(x, coefs[int(idx)])
+        return (numpy.mod(numpy.arctan2(vec[1], vec[0]), 2. * numpy.pi),
+                numpy.arctan2(vec[2], numpy.sqrt(vec[0] ** 2 + vec[1] ** 2)))
+
+    def azel(self, body, observer, timestamps):
+        """Horizontal coordinates of body at the timestamps.
+
+        Returns
+        -------
+        az, el, ha, pa: numpy.ndarray
+            Azimuth, elevation, hour angle and parallactic angle [rad]
+
+        """
+        timestamps = numpy.atleast_1d(numpy.asarray(timestamps, dtype=float))
+        lat = float(observer.lat)
+        ra, dec = self.radec(body, observer, timestamps)
+        ha = coordinates.local_sidereal_time(timestamps, float(observer.lon)) - ra
+        ha = numpy.mod(ha + numpy.pi, 2. * numpy.pi) - numpy.pi
+        az, el = coordinates.hadec_to_azel(ha, dec, lat)
+        el = coordinates.refract(el, observer.pressure, observer.temp)
+        return az, el, ha, coordinates.parallactic_angle(ha, dec, lat)
+
+    def clear(self):
+        """Forget the fitted days held in memory."""
+        self._days.clear()
+
+
+ephemeris_cache = EphemerisCache()
+
+
+def set_cache_directory(directory):
+    """Persist the fitted days of the shared `ephemeris_cache` in a directory.
+
+    Parameters
+    ----------
+    directory: str
+        Directory of the .npz files, created when the first day is saved,
+        None to keep fitted days in memory only
+
+    """
+    ephemeris_cache.directory = directory
+
+# -fin-
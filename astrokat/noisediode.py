@@ -4,6 +4,10 @@ from __future__ import absolute_import
 
 import numpy as np
 import time
+import timeit
+
+from collections import deque
+from multiprocessing.pool import ThreadPool
 
 try:
     from katcorelib import user_logger
@@ -11,15 +15,370 @@ except ImportError:
     from .simulate import user_logger
 from . import _DEFAULT_LEAD_TIME
 from . import max_cycle_len
+from .utility import get_sensor_cache
+
+# Maximum number of digitiser requests in flight at the same time
+_ND_DISPATCH_THREADS = 32
+# Adaptive lead time: slowest recent command round trip plus a safety margin
+_LEAD_TIME_MARGIN = 0.5  # sec
+_LATENCY_MIN_SAMPLES = 3
+_LATENCY_WINDOW = 50
+# Fraction into a correlator dump at which aligned switch times are placed
+_ND_DUMP_FRACTION = 0.5
+# Final part of a timed wait spent polling the clock instead of sleeping
+_WAIT_SPIN = 0.002  # sec
+
+# Python 2 has no monotonic clock, fall back to the best available timer
+_monotonic = getattr(time, 'monotonic', timeit.default_timer)
+
+
+class CommandLatency(object):
+    """Round trip times of noise diode commands to all digitisers
+
+    Parameters
+    ----------
+    window : int
+        Number of most recent commands used to estimate the lead time
+    """
+
+    def __init__(self, window=_LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+
+    def add(self, latency):
+        self.samples.append(latency)
+
+    def reset(self):
+        self.samples.clear()
+
+    def lead_time(self, margin=_LEAD_TIME_MARGIN, default=_DEFAULT_LEAD_TIME):
+        """Smallest safe lead time, default until enough commands are measured
+        """
+        if len(self.samples) < _LATENCY_MIN_SAMPLES:
+            return default
+        return round(max(self.samples) + margin, 3)
+
+
+nd_latency = CommandLatency()
+
+
+class NoiseDiodeState(object):
+    """Noise diode setting last commanded per antenna
+
+    Antennas map to their (on fraction, cycle length, start offset), with
+    (0, 1., 0.) for off and (1, 1., 0.) for on, so that commands not
+    changing the state can be skipped. The start offset is the delay of an
+    antenna pattern after the first antenna, nonzero when patterns are
+    cycled over the antennas.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget all settings, the next commands are always sent"""
+        self.antennas = {}
+        # pattern setup switched off for a target, restored when needed again
+        self.restore = None
+
+    @staticmethod
+    def _settings_(antennas, on_fraction, cycle_length, cycle):
+        """Setting per antenna, patterns staggered in sorted order if cycled"""
+        step = float(cycle_length) * float(on_fraction) if cycle else 0.
+        return dict((ant, (float(on_fraction), float(cycle_length), idx * step))
+                    for idx, ant in enumerate(sorted(antennas)))
+
+    def update(self, antennas, on_fraction, cycle_length, cycle=False):
+        self.antennas.update(self._settings_(antennas,
+                                             on_fraction,
+                                             cycle_length,
+                                             cycle))
+
+    def forget(self, antennas):
+        """Unknown setting for antennas, their next commands are always sent"""
+        for ant in antennas:
+            self.antennas.pop(ant, None)
+
+    def is_set(self, antennas, on_fraction, cycle_length, cycle=False):
+        """All antennas known to have the given setting and sync mode"""
+        settings = self._settings_(antennas, on_fraction, cycle_length, cycle)
+        return (len(settings) > 0
+                and all(self.antennas.get(ant) == setting
+                        for ant, setting in settings.items()))
+
+
+nd_state = NoiseDiodeState()
+
+
+class DeadlineTimer(object):
+    """Wait until absolute timestamps, recording how late each wait ends
+
+    The remaining time to a wall clock deadline is converted once to a
+    deadline on `clock`, followed by a coarse sleep and a short spin on
+    the clock to wake up close to the deadline.
+
+    Parameters
+    ----------
+    clock : callable, optional
+        Clock measuring the wait [sec], defaults to a monotonic clock
+    sleep : callable, optional
+        Sleep function used for the coarse part of the wait
+    spin : float, optional
+        Final part of the wait spent polling the clock [sec]
+    window : int, optional
+        Number of most recent overshoots kept
+    """
+
+    def __init__(self, clock=None, sleep=None, spin=_WAIT_SPIN,
+                 window=_LATENCY_WINDOW):
+        self.clock = _monotonic if clock is None else clock
+        self.sleep = time.sleep if sleep is None else sleep
+        self.spin = spin
+        self.overshoot = deque(maxlen=window)
+
+    def reset(self):
+        self.overshoot.clear()
+
+    def wait_until(self, deadline):
+        """Wait until the deadline, return the overshoot [sec]
+
+        Parameters
+        ----------
+        deadline : float
+            Time since the epoch as a floating point number [sec]
+        """
+        remaining = deadline - time.time()
+        target = self.clock() + remaining
+        if remaining - self.spin > 0:
+            self.sleep(remaining - self.spin)
+        while self.clock() < target:
+            pass
+        overshoot = self.clock() - target
+        self.overshoot.append(overshoot)
+        if remaining < 0:
+            user_logger.debug('DEBUG: deadline {} already passed'
+                              .format(deadline))
+        user_logger.trace('TRACE: waited until {}, overshoot {:.6f} sec'
+                          .format(deadline, overshoot))
+        return overshoot
+
+
+# simulated sessions replace time.time and time.sleep, look them up per call
+nd_timer = DeadlineTimer()
+sim_timer = DeadlineTimer(clock=lambda: time.time(),
+                          sleep=lambda seconds: time.sleep(seconds),
+                          spin=0)
+
+
+def wait_until(kat, deadline):
+    """Wait until a noise diode switch time, on the simulated clock in dry-run
+
+    Parameters
+    ----------
+    kat : session kat container-like object
+        Container for accessing KATCP resources allocated to schedule block.
+    deadline : float
+        Time since the epoch as a floating point number [sec]
+
+    Returns
+    -------
+    overshoot : float
+        Time the wait ended after the deadline [sec]
+    """
+    timer = sim_timer if kat.dry_run else nd_timer
+    return timer.wait_until(deadline)
+
+
+def dump_aligned(timestamps, dump_period, dump_epoch=0., fraction=_ND_DUMP_FRACTION):
+    """Move switch times to a fixed fraction into a correlator dump
+
+    Parameters
+    ----------
+    timestamps : float or array_like
+        Earliest switch times [sec]
+    dump_period : float
+        Correlator integration time [sec]
+    dump_epoch : float, optional
+        Start of any correlator dump, e.g. the correlator sync time [sec]
+    fraction : float, optional
+        Fraction of the dump period from the dump start to the switch time
+
+    Returns
+    -------
+    timestamps : float or numpy.ndarray
+        Switch times at or after the requested times, placed `fraction`
+        into a dump, away from the dump boundaries
+    """
+    dumps = np.ceil((np.asarray(timestamps, dtype=float) - dump_epoch) / dump_period
+                    - fraction)
+    return dump_epoch + (dumps + fraction) * dump_period
+
+
+class DumpTiming(object):
+    """Correlator dump boundaries at epoch + n * period, if known"""
+
+    def __init__(self, period=None, epoch=0.):
+        self.period = period
+        self.epoch = epoch
+
+    def align(self, timestamps):
+        if not self.period:
+            return np.asarray(timestamps, dtype=float)
+        return dump_aligned(timestamps, self.period, self.epoch)
+
+
+nd_dumps = DumpTiming()
+
+
+def set_dump_timing(period, epoch=0.):
+    """Align noise diode switching to correlator dumps, None to disable
+
+    Parameters
+    ----------
+    period : float
+        Correlator integration time [sec]
+    epoch : float, optional
+        Start of any correlator dump, e.g. the correlator sync time [sec]
+    """
+    nd_dumps.period = period
+    nd_dumps.epoch = epoch
+    if period:
+        user_logger.debug('DEBUG: aligning noise diode switching to {} sec '
+                          'dumps from {}'.format(period, epoch))
+
+
+def trigger_edges(start_time, duration):
+    """Switch on and off times of a noise diode trigger
+
+    The switch on time is moved into a correlator dump when the dump timing
+    is known, with the on time a whole number of dumps (at least one).
+
+    Parameters
+    ----------
+    start_time : float
+        Earliest switch on time [sec]
+    duration : float
+        Requested on time [sec]
+
+    Returns
+    -------
+    on_time, off_time : float
+    """
+    on_time = float(nd_dumps.align(start_time))
+    duration = float(duration)
+    if nd_dumps.period:
+        duration = max(round(duration / nd_dumps.period), 1) * nd_dumps.period
+    return on_time, on_time + duration
+
+
+def switch_timing(requested,
+                  reported,
+                  commands,
+                  dump_period=None,
+                  dump_epoch=0.,
+                  track_starts=None):
+    """Timing of recorded noise diode switch events
+
+    Parameters
+    ----------
+    requested : array_like
+        Switch time requested per antenna per command [sec]
+    reported : array_like
+        Switch time reported by the digitiser [sec]
+    commands : array_like of int
+        Command each antenna event belongs to
+    dump_period : float or array_like, optional
+        Correlator integration time [sec], per event or for all events,
+        no dump distances if None or NaN
+    dump_epoch : float or array_like, optional
+        Start of any correlator dump, e.g. the correlator sync time [sec]
+    track_starts : array_like, optional
+        Start times of target tracks [sec]
+
+    Returns
+    -------
+    timing : dict
+        Per event arrays:
+            'offset': reported minus requested switch time [sec],
+            'skew': spread of offsets over the antennas of the command [sec],
+            'dump_distance': distance of the switch time to the nearest
+                             dump boundary [sec], NaN if not known,
+            'track_distance': time from the switch time to the nearest
+                              track start [sec], NaN if not known
+    """
+    requested = np.asarray(requested, dtype=float)
+    reported = np.asarray(reported, dtype=float)
+    commands = np.asarray(commands)
+    offset = reported - requested
+
+    # spread of offsets per command, without looping over commands
+    _, command_idx = np.unique(commands, return_inverse=True)
+    ncommands = command_idx.max() + 1 if command_idx.size else 0
+    max_offset = np.full(ncommands, -np.inf)
+    min_offset = np.full(ncommands, np.inf)
+    np.maximum.at(max_offset, command_idx, offset)
+    np.minimum.at(min_offset, command_idx, offset)
+    skew = (max_offset - min_offset)[command_idx]
+
+    dump_distance = np.full(reported.shape, np.nan)
+    if dump_period is not None:
+        dump_period = np.asarray(dump_period, dtype=float)
+        phase = np.mod(reported - dump_epoch, dump_period)
+        dump_distance = np.minimum(phase, dump_period - phase)
+
+    track_distance = np.full(reported.shape, np.nan)
+    if track_starts is not None and len(track_starts) > 0:
+        track_starts = np.sort(np.asarray(track_starts, dtype=float))
+        after = np.clip(np.searchsorted(track_starts, reported), 0, len(track_starts) - 1)
+        before = np.clip(after - 1, 0, len(track_starts) - 1)
+        to_after = track_starts[after] - reported
+        to_before = track_starts[before] - reported
+        track_distance = np.where(np.abs(to_before) < np.abs(to_after),
+                                  to_before, to_after)
+
+    return {'offset': offset,
+            'skew': skew,
+            'dump_distance': dump_distance,
+            'track_distance': track_distance,
+            }
+
+
+def get_lead_time(nd_setup=None):
+    """Lead time for noise diode commands [sec]
+
+    Parameters
+    ----------
+    nd_setup : dict, optional (default = None, system default lead time)
+        Noise diode setup from the observation plan, with optional keys:
+            'lead_time': lead time [sec], or 'auto' to derive the lead time
+                         from the measured command latency,
+            'lead_time_margin': margin added to the measured latency [sec]
+    """
+    if nd_setup is None or 'lead_time' not in nd_setup:
+        return _DEFAULT_LEAD_TIME
+    if nd_setup['lead_time'] == 'auto':
+        margin = nd_setup.get('lead_time_margin', _LEAD_TIME_MARGIN)
+        lead_time = nd_latency.lead_time(margin=margin)
+        user_logger.debug('DEBUG: adaptive lead time {:.3f} sec ({} samples)'
+                          .format(lead_time, len(nd_latency.samples)))
+        return lead_time
+    return nd_setup['lead_time']
 
 
 def _get_max_cycle_len(kat):
     """Get maximum cycle length for noise diode switching
     """
+    sensor_cache = get_sensor_cache(kat)
     if not kat.dry_run:
-        return max_cycle_len(kat.sensor.sub_band.get_value())
+        band = sensor_cache.get('sub_band', kat.sensor.sub_band.get_value)
     else:
-        return max_cycle_len('l')
+        band = sensor_cache.get('sub_band', lambda: kat.sensor_value('sub_band', 'l'))
+    return max_cycle_len(band)
+
+
+def _katcp_replies_(kat):
+    """Digitiser requests return KATCP replies, live or simulated
+    """
+    return not kat.dry_run or getattr(kat, 'sim_digitisers', False) is True
 
 
 def _get_nd_timestamp_(lead_time):
@@ -74,31 +433,33 @@ def _set_dig_nd_(kat,
         on_fraction = switch
 
     # Noise diodes trigger is evaluated per antenna
-    timestamps = []
+    requests = []
     for ant in nd_antennas:
-        ped = getattr(kat, ant)
-        reply = ped.req.dig_noise_source(timestamp,
-                                         on_fraction,
-                                         cycle_length)
-        if not kat.dry_run:
-            timestamps.append(_katcp_reply_({ant: reply}))
-        else:
-            msg = ('Dry-run: Set noise diode for antenna {} at '
-                   'timestamp {}'.format(ant, timestamp))
-            user_logger.debug(msg)
-
+        requests.append((ant, timestamp))
         if cycle:
             # add time [sec] to ensure all digitisers set at the same time
             timestamp += cycle_length * on_fraction
+    replies = _dig_nd_requests_(kat, requests, on_fraction, cycle_length)
 
-    # assuming ND for all antennas must be the same
-    # only display single timestamp
-    if not kat.dry_run:
+    if not _katcp_replies_(kat):
+        for ant, ant_timestamp in requests:
+            msg = ('Dry-run: Set noise diode for antenna {} at '
+                   'timestamp {}'.format(ant, ant_timestamp))
+            user_logger.debug(msg)
+        nd_state.update(nd_antennas, on_fraction, cycle_length, cycle=cycle)
+    else:
+        ant_timestamps = _reply_timestamps_(replies)
+        nd_state.update(nd_antennas, on_fraction, cycle_length, cycle=cycle)
+        nd_state.forget(set(nd_antennas) - set(ant_timestamps))
         # test incorrect reply check
-        if len(timestamps) < len(nd_antennas):
+        if len(ant_timestamps) < len(nd_antennas):
             err_msg = 'Noise diode activation not in sync'
             user_logger.error(err_msg)
-        timestamp = np.mean(timestamps)
+        # assuming ND for all antennas must be the same
+        # only display single timestamp
+        if len(ant_timestamps) > 0:
+            timestamp = np.mean(list(ant_timestamps.values()))
+            _nd_skew_log_(requests, ant_timestamps)
     msg = ('Set all noise diodes with timestamp {} ({})'
            .format(int(timestamp),
                    time.ctime(timestamp)))
@@ -107,20 +468,80 @@ def _set_dig_nd_(kat,
     return timestamp
 
 
-def _katcp_reply_(dig_katcp_replies):
-    """ KATCP timestamp return logs"""
-    ant_ts_list = []
+def _dig_nd_requests_(kat, requests, on_fraction, cycle_length):
+    """Send noise diode requests to all digitisers concurrently
+
+    Parameters
+    ----------
+    kat : session kat container-like object
+        Container for accessing KATCP resources allocated to schedule block.
+    requests : list
+        (antenna name, switch timestamp) per digitiser
+    on_fraction : float
+        On fraction of pattern length
+    cycle_length : float
+        Pattern length [sec]
+
+    Returns
+    -------
+    replies : dict
+        (reply, informs) per antenna name
+    """
+    def request(ant_request):
+        ant, timestamp = ant_request
+        ped = getattr(kat, ant)
+        reply = ped.req.dig_noise_source(timestamp,
+                                         on_fraction,
+                                         cycle_length)
+        return ant, reply
+
+    start = timeit.default_timer()
+    if len(requests) < 2 or not _katcp_replies_(kat):
+        replies = [request(ant_request) for ant_request in requests]
+    else:
+        pool = ThreadPool(min(len(requests), _ND_DISPATCH_THREADS))
+        try:
+            replies = pool.map(request, requests)
+        finally:
+            pool.close()
+            pool.join()
+    latency = timeit.default_timer() - start
+    user_logger.debug('DEBUG: noise diode requests to {} antennas took {:.3f} sec'
+                      .format(len(requests),
+                              latency))
+    if _katcp_replies_(kat):
+        nd_latency.add(latency)
+    return dict(replies)
+
+
+def _nd_skew_log_(requests, ant_timestamps):
+    """Report spread of digitiser switch times around the requested times"""
+    offsets = []
+    for ant, ant_timestamp in requests:
+        if ant in ant_timestamps:
+            user_logger.debug('DEBUG: Noise diode for antenna {} requested at '
+                              '{:.6f}, reported {:.6f}'
+                              .format(ant, ant_timestamp, ant_timestamps[ant]))
+            offsets.append(ant_timestamps[ant] - ant_timestamp)
+    skew = max(offsets) - min(offsets)
+    msg = ('Noise diode timestamp skew {:.6f} sec over {} antennas'
+           .format(skew, len(offsets)))
+    user_logger.debug('DEBUG: {}'.format(msg))
+    return skew
+
+
+def _reply_timestamps_(dig_katcp_replies):
+    """Digitiser switch timestamps of all successful replies"""
+    ant_timestamps = {}
     for ant in sorted(dig_katcp_replies):
         reply, informs = dig_katcp_replies[ant]
         if reply.reply_ok():
-            ant_ts_list.append(_nd_log_msg_(ant, reply, informs))
+            ant_timestamps[ant] = _nd_log_msg_(ant, reply, informs)
         else:
             msg = 'Unexpected noise diode reply from ant {}'.format(ant)
             user_logger.warn(msg)
             user_logger.debug('DEBUG: {}'.format(reply.arguments))
-            continue
-    # assume all ND timestamps similar and return average
-    return np.mean(ant_ts_list)
+    return ant_timestamps
 
 
 def _nd_log_msg_(ant,
@@ -222,7 +643,7 @@ def on(kat,
     user_logger.debug('DEBUG: now {}, sleep {}'
                       .format(time.time(),
                               sleeptime))
-    time.sleep(sleeptime)  # default sleep to see for signal to get through
+    wait_until(kat, true_timestamp)  # wait for signal to get through
     user_logger.debug('DEBUG: now {}, slept {}'
                       .format(time.time(),
                               sleeptime))
@@ -253,6 +674,14 @@ def off(kat,
         Linux timestamp reported by digitiser
     """
 
+    if nd_state.is_set([ant.name for ant in kat.ants], 0, 1.):
+        user_logger.debug('DEBUG: noise-diode already off')
+        if timestamp is None:
+            return time.time()
+        # callers rely on the switch time having passed on return
+        wait_until(kat, timestamp)
+        return timestamp
+
     if timestamp is None:
         timestamp = _get_nd_timestamp_(lead_time)
 
@@ -289,11 +718,15 @@ def trigger(kat,
                      .format(lead_time))
     user_logger.debug('DEBUG: issue command to switch ND on @ {}'
                       .format(time.time()))
+    # switch edges planned up front, aligned to correlator dumps if known
+    on_edge, off_edge = trigger_edges(_get_nd_timestamp_(lead_time), duration)
+    # on time in whole correlator dumps, if the dump timing is known
+    on_duration = off_edge - on_edge
     if duration > lead_time:
         user_logger.trace('TRACE: Trigger duration > lead_time')
         # allow lead time for all to switch on simultaneously
         # timestamp on = now + lead
-        on_time = on(kat, lead_time=lead_time)
+        on_time = on(kat, timestamp=on_edge, lead_time=lead_time)
         user_logger.debug('DEBUG: on {} ({})'
                           .format(on_time,
                                   time.ctime(on_time)))
@@ -302,7 +735,7 @@ def trigger(kat,
         sleeptime = min(duration - lead_time, lead_time)
         user_logger.trace('TRACE: sleep {}'
                           .format(sleeptime))
-        off_time = on_time + duration
+        off_time = on_time + on_duration
         user_logger.trace('TRACE: desired off_time {} ({})'
                           .format(off_time,
                                   time.ctime(off_time)))
@@ -319,11 +752,11 @@ def trigger(kat,
         cycle_len = _get_max_cycle_len(kat)
         nd_setup = {'antennas': 'all',
                     'cycle_len': cycle_len,
-                    'on_frac': float(duration) / cycle_len,
+                    'on_frac': on_duration / cycle_len,
                     }
         user_logger.debug('DEBUG: fire nd for {} using pattern'
-                          .format(duration))
-        on_time = pattern(kat, nd_setup, lead_time=lead_time)
+                          .format(on_duration))
+        on_time = pattern(kat, nd_setup, lead_time=lead_time, timestamp=on_edge)
         user_logger.debug('DEBUG: pattern set {} ({})'
                           .format(on_time,
                                   time.ctime(on_time)))
@@ -340,7 +773,7 @@ def trigger(kat,
     user_logger.debug('DEBUG: now {}, sleep {}'
                       .format(time.time(),
                               sleeptime))
-    time.sleep(sleeptime)  # default sleep to see for signal to get through
+    wait_until(kat, off_time)  # wait for signal to get through
     user_logger.debug('DEBUG: now {}, slept {}'
                       .format(time.time(),
                               sleeptime))
@@ -350,6 +783,7 @@ def trigger(kat,
 def pattern(kat,
             nd_setup,
             lead_time=_DEFAULT_LEAD_TIME,
+            timestamp=None,
             ):
     """Start background noise diode pattern controlled by digitiser hardware.
 
@@ -365,6 +799,8 @@ def pattern(kat,
             etc., etc.
     lead_time : float, optional (default = system default lead time)
         Lead time before digitisers pattern is set [sec]
+    timestamp : float, optional (default = None)
+        Pattern start time [sec], defaults to after the lead time
 
     Returns
     -------
@@ -388,19 +824,10 @@ def pattern(kat,
         user_logger.error('Nonstandard ND usage: lead time > max cycle len')
         raise RuntimeError('ND pattern setting cannot be achieved')
 
-    start_time = _get_nd_timestamp_(lead_time)
-    user_logger.trace('TRACE: desired start_time {} ({})'
-                      .format(start_time,
-                              time.ctime(start_time)))
-    msg = ('Request: Set noise diode pattern to activate at {} '
-           '(includes {} sec lead time)'
-           .format(start_time,
-                   lead_time))
-    user_logger.warning(msg)
-
     nd_antennas = nd_setup['antennas']
-    sb_ants = ",".join(str(ant.name) for ant in kat.ants)
-    nd_setup['antennas'] = sb_ants
+    sb_ant_names = [str(ant.name) for ant in kat.ants]
+    sb_ants = set(sb_ant_names)
+    nd_setup['antennas'] = ",".join(sb_ant_names)
     if nd_antennas == 'all':
         cycle = False
     elif nd_antennas == 'cycle':
@@ -410,6 +837,28 @@ def pattern(kat,
         nd_setup['antennas'] = ",".join(
             ant.strip() for ant in nd_antennas.split(",") if ant.strip() in sb_ants
         )
+
+    # pattern already running on all antennas, nothing to reprogram
+    if nd_state.is_set(nd_setup['antennas'].split(","),
+                       nd_setup['on_frac'],
+                       nd_setup['cycle_len'],
+                       cycle=cycle):
+        user_logger.info('Noise diode pattern already set on {}'
+                         .format(nd_setup['antennas']))
+        return time.time()
+
+    if timestamp is None:
+        timestamp = nd_dumps.align(_get_nd_timestamp_(lead_time))
+    start_time = float(timestamp)
+    user_logger.trace('TRACE: desired start_time {} ({})'
+                      .format(start_time,
+                              time.ctime(start_time)))
+    msg = ('Request: Set noise diode pattern to activate at {} '
+           '(includes {} sec lead time)'
+           .format(start_time,
+                   lead_time))
+    user_logger.warning(msg)
+
     user_logger.info('Antennas found in subarray, setting ND: {}'
                      .format(nd_setup['antennas']))
 
@@ -428,7 +877,7 @@ def pattern(kat,
     wait_time = timestamp - time.time()
     user_logger.trace('TRACE: delta {}'
                       .format(wait_time))
-    time.sleep(wait_time)
+    wait_until(kat, timestamp)
     user_logger.trace('TRACE: set nd pattern at {}, slept {}'
                       .format(time.time(),
                               wait_time))
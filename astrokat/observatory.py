@@ -5,58 +5,231 @@ from __future__ import absolute_import
 import os
 import json
 import ephem
+import functools
 import numpy
 import katpoint
 
 
 from datetime import datetime, timedelta
 
-from .simulate import user_logger, setobserver
-from .utility import katpoint_target
-
-try:
-    import katconf
-
-    # Set up configuration source
-    _config_path = "/var/kat/config"
-    _node_file = "/var/kat/node.conf"
-    _settings = {}
-    if os.path.isdir(_config_path):
-        katconf.set_config(katconf.environ(override=_config_path))
-    elif os.path.isfile(_node_file):
-        with open(_node_file, "r") as fh:
-            _node_conf = json.loads(fh.read())
-        for _key, _val in _node_conf.items():
+from . import coordinates
+from .ephemeris import ephemeris_cache
+from .simulate import user_logger, setobserver, _UNIX_EPOCH_DATE
+from .utility import LRUCache, katpoint_target
+
+# default reference position for MKAT array
+_DEFAULT_REF_LOCATION = "ref, -30:42:39.8, 21:26:38.0, 1035.0, 0.0, , , 1.15"
+# (reference location, node config available), resolved on first use
+_node_config = None
+
+
+def _set_katconf_(katconf):
+    """Set up configuration source, ValueError if no node config found"""
+    config_path = "/var/kat/config"
+    node_file = "/var/kat/node.conf"
+    settings = {}
+    if os.path.isdir(config_path):
+        katconf.set_config(katconf.environ(override=config_path))
+    elif os.path.isfile(node_file):
+        with open(node_file, "r") as fh:
+            node_conf = json.loads(fh.read())
+        for key, val in node_conf.items():
             # Remove comments at the end of the line
-            _val = _val.split("#", 1)[0]
-            _settings[_key] = _val.strip()
-        if _settings.get("configuri", False):
-            katconf.set_config(katconf.environ(_node_conf["configuri"]))
+            val = val.split("#", 1)[0]
+            settings[key] = val.strip()
+        if settings.get("configuri", False):
+            katconf.set_config(katconf.environ(node_conf["configuri"]))
         else:
             raise ValueError("Could not open node config file using configuri")
     else:
         raise ValueError("Could not open node config file")
 
-except (ImportError, ValueError):
-    # default reference position for MKAT array
-    _ref_location = "ref, -30:42:39.8, 21:26:38.0, 1035.0, 0.0, , , 1.15"
-    _node_config_available = False
-else:
+
+def _read_node_config_():
+    """Reference location and node config availability, cached after first use
+
+    Nodes without katconf use the default MKAT reference position without
+    looking for node config files.
+
+    """
+    global _node_config
+    if _node_config is not None:
+        return _node_config
+    _node_config = (_DEFAULT_REF_LOCATION, False)
+    try:
+        import katconf
+    except ImportError:
+        return _node_config
+    try:
+        _set_katconf_(katconf)
+    except ValueError:
+        return _node_config
     # default reference position for MKAT array from katconf
-    _ref_location = (
-        katconf.ArrayConfig().array["array"]["name"]
-        + ", "
-        + katconf.ArrayConfig().array["array"]["position"]
-    )
-    _node_config_available = True
+    array = katconf.ArrayConfig().array["array"]
+    _node_config = (array["name"] + ", " + array["position"], True)
+    return _node_config
+
+
+def get_ref_location():
+    """Array reference position as a katpoint.Antenna description."""
+    return _read_node_config_()[0]
+
+
+# Solar days per sidereal day
+_SIDEREAL_RATE = 1.002737909350795
+# Rise and set times are reused for observer dates within the same bucket
+_RISE_SET_DATE_BUCKET = 60.  # sec
+# Below this number of target positions ephem is faster than the array engines
+_EPHEM_MAX_POSITIONS = 8
+_observatory_cache = LRUCache(maxsize=64)
+_rise_set_cache = LRUCache(maxsize=4096)
+
+
+def _body_key_(ephem_target):
+    """Hashable description of a body, None if rise and set are not memoised"""
+    if isinstance(ephem_target, ephem.FixedBody):
+        return ("radec",
+                float(ephem_target._ra),
+                float(ephem_target._dec),
+                float(ephem_target._epoch))
+    if isinstance(ephem_target, ephem.Planet):
+        # Sun, Moon and planets
+        return (type(ephem_target).__name__,)
+    return None
+
+
+def _memoised_rise_set_(func):
+    """Memoise rise or set times per location, body, date bucket and horizon"""
+    @functools.wraps(func)
+    def wrapper(self, ephem_target, lst=True):
+        body_key = _body_key_(ephem_target)
+        if body_key is None:
+            return func(self, ephem_target, lst=lst)
+        date_bucket = int(float(self.observer.date) * 86400. // _RISE_SET_DATE_BUCKET)
+        key = (func.__name__,
+               self.location,
+               body_key,
+               date_bucket,
+               float(self.observer.horizon),
+               lst)
+        value = _rise_set_cache.get(key)
+        if value is None:
+            value = func(self, ephem_target, lst=lst)
+            _rise_set_cache.put(key, value)
+        return value
+    return wrapper
+
+
+def sky_positions(observer, targets, timestamps):
+    """Horizontal coordinates of N targets at M times in one call.
+
+    Radec targets are handled by the array based `coordinates` engine,
+    the Sun, Moon and planets by the interpolated `ephemeris_cache`,
+    other bodies (azel, satellites) are computed by ephem per timestamp.
+    A few positions, as in visibility checks, are all computed by ephem,
+    which is faster than the array setup for small N x M.
+
+    Parameters
+    ----------
+    observer: ephem.Observer
+        observer location, its date is not changed
+    targets: list
+        katpoint.Target or ephem.Body objects
+    timestamps: float or array_like
+        UTC times since the epoch [sec]
+
+    Returns
+    -------
+    positions: dict
+        (N, M) arrays with keys:
+            'az': azimuth [deg], 'el': elevation [deg],
+            'ha': hour angle [hours] in range -12 to 12,
+            'pa': parallactic angle [deg]
+
+    """
+    timestamps = numpy.atleast_1d(numpy.asarray(timestamps, dtype=float))
+    lat = float(observer.lat)
+    bodies = [getattr(target, "body", target) for target in targets]
+    shape = (len(bodies), timestamps.size)
+    az, el = numpy.empty(shape), numpy.empty(shape)
+    ha, pa = numpy.empty(shape), numpy.empty(shape)
+    fixed = [idx for idx, body in enumerate(bodies)
+             if isinstance(body, ephem.FixedBody)
+             and float(body._epoch) == float(ephem.J2000)]
+    moving = [idx for idx, body in enumerate(bodies)
+              if ephemeris_cache.cacheable(body)]
+    if (len(fixed) + len(moving)) * timestamps.size <= _EPHEM_MAX_POSITIONS:
+        # a few positions (visibility checks) are cheaper one by one
+        fixed, moving = [], []
+    if fixed:
+        ra = numpy.array([float(bodies[idx]._ra) for idx in fixed])
+        dec = numpy.array([float(bodies[idx]._dec) for idx in fixed])
+        (az[fixed], el[fixed],
+         ha[fixed], pa[fixed]) = coordinates.radec_to_azel(ra[:, numpy.newaxis],
+                                                           dec[:, numpy.newaxis],
+                                                           timestamps,
+                                                           float(observer.lon),
+                                                           lat,
+                                                           pressure=observer.pressure,
+                                                           temperature=observer.temp)
+    for idx in moving:
+        az[idx], el[idx], ha[idx], pa[idx] = ephemeris_cache.azel(bodies[idx],
+                                                                  observer,
+                                                                  timestamps)
+    others = [idx for idx in range(len(bodies))
+              if idx not in fixed and idx not in moving]
+    if others:
+        observer = observer.copy()
+        for col, timestamp in enumerate(timestamps):
+            observer.date = timestamp / 86400. + _UNIX_EPOCH_DATE
+            for idx in others:
+                bodies[idx].compute(observer)
+                az[idx, col] = bodies[idx].az
+                el[idx, col] = bodies[idx].alt
+        ha_dec = coordinates.azel_to_hadec(az[others], el[others], lat)
+        ha[others] = ha_dec[0]
+        pa[others] = coordinates.parallactic_angle(ha_dec[0], ha_dec[1], lat)
+
+    return {"az": numpy.degrees(az),
+            "el": numpy.degrees(el),
+            "ha": numpy.mod(numpy.degrees(ha) / 15. + 12., 24.) - 12.,
+            "pa": numpy.degrees(pa),
+            }
+
+
+def get_observatory(location=None, horizon=20.0, datetime=None):
+    """Shared Observatory for a location, horizon and date.
+
+    Building an Observatory parses the location and creates an observer,
+    repeated requests for the same setup reuse the first instance.
+    The observer of a shared instance must not be changed by the caller.
+
+    Parameters
+    ----------
+    location: str, optional
+        katpoint.Antenna description, default the array reference position
+    horizon: float
+        minimum pointing angle in degrees
+    datetime: ephem.Date or datetime, optional
+        observer date, default the time of first use
+
+    """
+    date = None if datetime is None else float(ephem.Date(datetime))
+    key = (location, float(horizon), date)
+    observatory = _observatory_cache.get(key)
+    if observatory is None:
+        observatory = Observatory(location=location,
+                                  horizon=horizon,
+                                  datetime=datetime)
+        _observatory_cache.put(key, observatory)
+    return observatory
 
 
 class Observatory(object):
     """Basic LST calculations using ephem."""
 
     def __init__(self, location=None, horizon=20.0, datetime=None):
-        self.location = _ref_location
-        self.node_config_available = _node_config_available
+        self.location, self.node_config_available = _read_node_config_()
         if location is not None:
             self.location = location
         self.kat = self.get_location()
@@ -70,6 +243,7 @@ class Observatory(object):
                                       second=0,
                                       microsecond=0)
 
+    @_memoised_rise_set_
     def _ephem_risetime_(self, ephem_target, lst=True):
         midnight_plus_one = ((self._midnight_() + timedelta(seconds=1))
                              .strftime("%H:%M:%S"))
@@ -83,9 +257,12 @@ class Observatory(object):
 
         if not lst:
             return rise_time
-        self.observer.date = rise_time
-        return self.observer.sidereal_time()
+        # LST on a copy, the observer date is the reference for all queries
+        observer = self.observer.copy()
+        observer.date = rise_time
+        return observer.sidereal_time()
 
+    @_memoised_rise_set_
     def _ephem_settime_(self, ephem_target, lst=True):
         midnight = self._midnight_() + timedelta(days=1)
         midnight_minus_one = ((midnight - timedelta(seconds=1))
@@ -101,8 +278,9 @@ class Observatory(object):
 
         if not lst:
             return set_time
-        self.observer.date = set_time
-        return self.observer.sidereal_time()
+        observer = self.observer.copy()
+        observer.date = set_time
+        return observer.sidereal_time()
 
     def read_file_from_node_config(self, catalogue_file):
         """Read catalogue file from node config.
@@ -117,6 +295,8 @@ class Observatory(object):
         if not self.node_config_available:
             raise AttributeError("Node config is not configured")
         else:
+            import katconf
+
             err_msg = "Catalogue file does not exist in node config!"
             assert katconf.resource_exists(catalogue_file), err_msg
             return katconf.resource_template(catalogue_file)
@@ -209,6 +389,112 @@ class Observatory(object):
         )
         return "%.3f" % time_
 
+    def rise_set(self, ra, dec, epoch=ephem.J2000):
+        """Rise, transit and set times of fixed radec positions.
+
+        Uses the closed form hour angle of the horizon crossing, after
+        moving the positions to their apparent place at the observer date,
+        for any number of targets at once.
+
+        Parameters
+        ----------
+        ra: float or array_like
+            right ascension [rad]
+        dec: float or array_like
+            declination [rad]
+        epoch: ephem.Date, optional
+            epoch of the coordinates
+
+        Returns
+        -------
+        times: dict
+            Arrays with keys:
+                'rise_lst', 'transit_lst', 'set_lst': LST of the events [hours],
+                'rise_utc', 'transit_utc', 'set_utc': first event after the
+                observer date as ephem.Date values [days],
+                'always_up', 'never_up': targets not crossing the horizon,
+            rise and set are NaN for targets not crossing the horizon
+
+        """
+        ra, dec = numpy.broadcast_arrays(numpy.asarray(ra, dtype=float),
+                                         numpy.asarray(dec, dtype=float))
+        timestamp = (float(self.observer.date) - _UNIX_EPOCH_DATE) * 86400.
+        epoch = (float(epoch) - _UNIX_EPOCH_DATE) * 86400.
+        ra, dec = coordinates.apparent_radec(ra, dec, timestamp, epoch=epoch)
+
+        lat = float(self.observer.lat)
+        horizon = float(self.observer.horizon)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            cos_ha = ((numpy.sin(horizon) - numpy.sin(lat) * numpy.sin(dec))
+                      / (numpy.cos(lat) * numpy.cos(dec)))
+        always_up = cos_ha < -1.
+        never_up = cos_ha > 1.
+        ha = numpy.where(always_up | never_up,
+                         numpy.nan,
+                         numpy.arccos(numpy.clip(cos_ha, -1., 1.)))
+
+        lst = float(self.observer.sidereal_time())
+        date = float(self.observer.date)
+        times = {"always_up": always_up, "never_up": never_up}
+        for event, event_lst in [("rise", ra - ha),
+                                 ("transit", ra),
+                                 ("set", ra + ha)]:
+            event_lst = numpy.mod(event_lst, 2. * numpy.pi)
+            wait = numpy.mod(event_lst - lst, 2. * numpy.pi) / (2. * numpy.pi)
+            times["{}_lst".format(event)] = numpy.degrees(event_lst) / 15.
+            times["{}_utc".format(event)] = date + wait / _SIDEREAL_RATE
+        return times
+
+    def sky_positions(self, targets, timestamps):
+        """Horizontal coordinates of N targets at M times.
+
+        Parameters
+        ----------
+        targets: list
+            katpoint.Target or ephem.Body objects
+        timestamps: float or array_like
+            UTC times since the epoch [sec]
+
+        Returns
+        -------
+        positions: dict
+            (N, M) arrays of 'az', 'el', 'pa' [deg] and 'ha' [hours],
+            see `sky_positions`
+
+        """
+        return sky_positions(self.observer, targets, timestamps)
+
+    def _rise_set_lst_(self, target_list, event):
+        """Rise or set LST per target, closed form for radec targets"""
+        bodies = [self.get_target(target).body for target in target_list]
+        fixed = [idx for idx, body in enumerate(bodies)
+                 if isinstance(body, ephem.FixedBody)
+                 and float(body._epoch) == float(ephem.J2000)]
+        times = self.rise_set([float(bodies[idx]._ra) for idx in fixed],
+                              [float(bodies[idx]._dec) for idx in fixed])
+        if times["never_up"].any():
+            name = bodies[fixed[int(times["never_up"].argmax())]].name
+            raise ephem.NeverUpError("{} is below the horizon".format(name))
+        if event == "rise":
+            always_up = self._midnight_() + timedelta(seconds=1)
+        else:
+            always_up = self._midnight_() + timedelta(days=1) - timedelta(seconds=1)
+        always_up = ephem.hours(always_up.strftime("%H:%M:%S"))
+
+        lsts = [None] * len(bodies)
+        for idx, event_lst, up in zip(fixed,
+                                      times["{}_lst".format(event)],
+                                      times["always_up"]):
+            lsts[idx] = always_up if up else ephem.hours(numpy.radians(event_lst * 15.))
+        # special bodies are left to ephem
+        for idx, body in enumerate(bodies):
+            if lsts[idx] is None:
+                if event == "rise":
+                    lsts[idx] = self._ephem_risetime_(body)
+                else:
+                    lsts[idx] = self._ephem_settime_(body)
+        return lsts
+
     def start_obs(self, target_list, str_flag=False):
         """Start time of the observation.
 
@@ -222,10 +508,7 @@ class Observatory(object):
         str_flag:
 
         """
-        start_lst = []
-        for target in target_list:
-            target_ = self.get_target(target).body
-            start_lst.append(self._ephem_risetime_(target_))
+        start_lst = self._rise_set_lst_(target_list, "rise")
         start_lst = start_lst[numpy.asarray(start_lst, dtype=float).argmin()]
         if str_flag:
             return str(start_lst)
@@ -244,16 +527,114 @@ class Observatory(object):
         str_flag:
 
         """
-        end_lst = []
-        for target in target_list:
-            target_ = self.get_target(target).body
-            end_lst.append(self._ephem_settime_(target_))
+        end_lst = self._rise_set_lst_(target_list, "set")
         end_lst = end_lst[numpy.asarray(end_lst, dtype=float).argmax()]
         if str_flag:
             return str(end_lst)
         return self.lst2hours(end_lst)
 
 
+def _new_catalogue_():
+    """Empty catalogue at the array reference position"""
+    catalogue = katpoint.Catalogue()
+    catalogue.antenna = katpoint.Antenna(get_ref_location())
+
+    setobserver(catalogue.antenna.observer)
+    return catalogue
+
+
+def _lookup_sources_(kat, names):
+    """Targets from the default catalogue by name, None if not found
+
+    Targets found are cached on the kat object, the default catalogue of
+    a connection is only accessed once per name. Names not found are
+    looked up again, the catalogue may have changed.
+
+    """
+    # vars, simulated connections return themselves for unknown attributes
+    source_cache = vars(kat).get("source_cache")
+    if source_cache is None:
+        source_cache = {}
+        kat.source_cache = source_cache
+    names = set(names)
+    missing = [name for name in names if name not in source_cache]
+    if missing:
+        sources = kat.sources
+        for name in missing:
+            source = sources[name]
+            if source is not None:
+                source_cache[name] = source
+    return dict((name, source_cache.get(name)) for name in names)
+
+
+def _add_targets_(catalogue, kat, targets):
+    """Add targets, description strings and default catalogue names
+
+    Returns
+    -------
+    from_names, from_strings: int
+        Number of targets found in the default catalogue and from
+        descriptions or target objects
+
+    """
+    from_names = from_strings = 0
+    names = [target for target in targets
+             if not isinstance(target, katpoint.Target) and target.find(",") < 0]
+    sources = _lookup_sources_(kat, names)
+    parsed = {}
+    resolved = []
+    for target in targets:
+        if isinstance(target, katpoint.Target):
+            resolved.append(target)
+            from_strings += 1
+        elif target.find(",") < 0:
+            if sources[target] is None:
+                msg = "Unknown target or catalogue {}, skipping it".format(target)
+                user_logger.warning(msg)
+            else:
+                resolved.append(sources[target])
+                from_names += 1
+        else:
+            # identical descriptions are parsed once
+            if target not in parsed:
+                try:
+                    parsed[target] = katpoint.Target(target)
+                except ValueError as err:
+                    msg = "Invalid target {}, skipping it [{}]".format(target, err)
+                    user_logger.warning(msg)
+                    parsed[target] = None
+            if parsed[target] is not None:
+                resolved.append(parsed[target])
+                from_strings += 1
+    catalogue.add(resolved)
+    return from_names, from_strings
+
+
+def build_catalogue(kat, targets):
+    """Build katpoint catalogue from parsed targets in a single pass.
+
+    Unlike `collect_targets`, entries are never tried as catalogue files.
+
+    Parameters
+    ----------
+    kat: session kat container-like object
+    targets: list
+        katpoint.Target objects, target description strings, or names of
+        targets in the default catalogue
+
+    """
+    catalogue = _new_catalogue_()
+    from_names, from_strings = _add_targets_(catalogue, kat, targets)
+    if len(catalogue) == 0:
+        raise ValueError("No known targets found in argument list")
+    msg = (
+        "Found {} target(s): {} from default catalogue and "
+        "{} as target string(s)".format(len(catalogue), from_names, from_strings)
+    )
+    user_logger.info(msg)
+    return catalogue
+
+
 def collect_targets(kat, args):
     """Collect targets into katpoint catalogue.
 
@@ -263,44 +644,41 @@ def collect_targets(kat, args):
 
     """
     from_names = from_strings = from_catalogues = num_catalogues = 0
-    catalogue = katpoint.Catalogue()
-    catalogue.antenna = katpoint.Antenna(_ref_location)
-
-    setobserver(catalogue.antenna.observer)
+    catalogue = _new_catalogue_()
 
+    # targets are added in bulk between catalogue files, keeping their order
+    pending = []
     for arg in args:
-        try:
-            # First assume the string is a catalogue file name
-            count_before_add = len(catalogue)
+        # With a comma in the string, it is a target description
+        if arg.find(",") < 0:
             try:
-                catalogue.add(open(arg))
-            except ValueError:
-                msg = "Catalogue {} contains bad targets".format(arg)
-                user_logger.warning(msg)
-            from_catalogues += len(catalogue) - count_before_add
-            num_catalogues += 1
-        except IOError:
-            # If the file failed to load,
-            # assume it is a name or description string
-            # With no comma in target string,
-            # assume it's the name of a target
-            # to be looked up in standard catalogue
-            if arg.find(",") < 0:
-                target = kat.sources[arg]
-                if target is None:
-                    msg = "Unknown target or catalogue {}, skipping it".format(arg)
-                    user_logger.warning(msg)
-                else:
-                    catalogue.add(target)
-                    from_names += 1
+                # Assume the string is a catalogue file name
+                catalogue_file = open(arg)
+            except IOError:
+                # If the file failed to load,
+                # assume it's the name of a target
+                # to be looked up in standard catalogue
+                pass
             else:
-                # Assume the argument is a target description string
+                names, strings = _add_targets_(catalogue, kat, pending)
+                from_names += names
+                from_strings += strings
+                pending = []
+                count_before_add = len(catalogue)
                 try:
-                    catalogue.add(arg)
-                    from_strings += 1
-                except ValueError as err:
-                    msg = "Invalid target {}, skipping it [{}]".format(arg, err)
+                    catalogue.add(catalogue_file)
+                except ValueError:
+                    msg = "Catalogue {} contains bad targets".format(arg)
                     user_logger.warning(msg)
+                finally:
+                    catalogue_file.close()
+                from_catalogues += len(catalogue) - count_before_add
+                num_catalogues += 1
+                continue
+        pending.append(arg)
+    names, strings = _add_targets_(catalogue, kat, pending)
+    from_names += names
+    from_strings += strings
     if len(catalogue) == 0:
         raise ValueError("No known targets found in argument list")
     msg = (
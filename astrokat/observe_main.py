@@ -7,7 +7,12 @@ import os
 import time
 
 import astrokat
-from astrokat.utility import datetime2timestamp, timestamp2datetime
+from astrokat.utility import (
+    datetime2timestamp,
+    timestamp2datetime,
+    fetch_sensors,
+    get_sensor_cache,
+)
 from astrokat import (
     _DEFAULT_LEAD_TIME,
     NoTargetsUpError,
@@ -18,6 +23,8 @@ from astrokat import (
     read_yaml,
     scans,
 )
+from astrokat.ephemeris import ephemeris_cache, set_cache_directory
+from astrokat.observatory import sky_positions
 
 try:
     from katcorelib import (
@@ -27,8 +34,9 @@ try:
         verify_and_connect,
     )
 except ImportError:
+    # plan targets are already parsed descriptions, skip catalogue file lookups
     from astrokat import (
-        collect_targets,
+        build_catalogue as collect_targets,
         user_logger,
         start_session,
         verify_and_connect,
@@ -39,13 +47,6 @@ except ImportError:
 DUMP_RATE_TOLERANCE = 0.002
 
 
-def __horizontal_coordinates__(target, observer, datetime_):
-    """Utility function to calculate ephem horizontal coordinates"""
-    observer.date = ephem.date(datetime_)
-    target.compute(observer)
-    return target.az, target.alt
-
-
 # TODO: target description defined in function needs to be in configuration
 def read_targets(target_items):
     """Read targets info.
@@ -148,8 +149,7 @@ def observe(session, target_info, **kwargs):
     if kwargs.get("noise_diode"):
         nd_setup = kwargs["noise_diode"]
         # user specified lead time
-        if "lead_time" in nd_setup:
-            nd_lead = nd_setup['lead_time']
+        nd_lead = noisediode.get_lead_time(nd_setup)
         # not a ND pattern
         if "cycle_len" not in nd_setup:
             nd_setup = None
@@ -157,8 +157,18 @@ def observe(session, target_info, **kwargs):
     # implement target specific noise diode behaviour
     nd_period = None
     nd_restore = False
+    nd_off = (target_info["noise_diode"] is not None
+              and "off" in target_info["noise_diode"])
+    if not nd_off and noisediode.nd_state.restore is not None:
+        # restore pattern switched off for the previous target(s)
+        user_logger.info('Observation: Restoring ND pattern')
+        noisediode.pattern(session.kat,
+                           noisediode.nd_state.restore,
+                           lead_time=nd_lead,
+                           )
+        noisediode.nd_state.restore = None
     if target_info["noise_diode"] is not None:
-        if "off" in target_info["noise_diode"]:
+        if nd_off:
             user_logger.info('Observation: No ND for target')
             nd_restore = True
             # disable noise diode pattern for target
@@ -219,12 +229,9 @@ def observe(session, target_info, **kwargs):
     user_logger.trace("TRACE: ts after {} {}".format(obs_type, time.time()))
 
     if (nd_setup is not None and nd_restore):
-        # restore pattern if programmed at setup
-        user_logger.info('Observation: Restoring ND pattern')
-        noisediode.pattern(session.kat,
-                           nd_setup,
-                           lead_time=nd_lead,
-                           )
+        # restore pattern if programmed at setup, only once a following
+        # target needs it so consecutive targets without ND share the off time
+        noisediode.nd_state.restore = nd_setup
 
     return target_visible
 
@@ -256,7 +263,7 @@ def above_horizon(target,
     # use local copies so you do not overwrite target time attribute
     horizon = ephem.degrees(str(horizon))
 
-    if type(target) is not ephem.FixedBody:
+    if type(target) is not ephem.FixedBody and not ephemeris_cache.cacheable(target):
         # anticipate katpoint special target for AzEl targets
         if 'alt' not in vars(target):
             raise RuntimeError('Unknown target type, exiting...')
@@ -264,30 +271,22 @@ def above_horizon(target,
         # check pointing altitude is above minimum elevation limit
         return bool(target.alt >= horizon)
 
-    # must be celestial target (ra, dec)
-    # check that target is visible at start of track
-    start_ = timestamp2datetime(time.time())
-    [azim, elev] = __horizontal_coordinates__(target,
-                                              observer,
-                                              start_)
+    # must be celestial target (ra, dec) or Sun, Moon and planets
+    # check that target is visible at start and end of track
+    timestamps = [time.time()]
+    if duration:
+        timestamps.append(time.time() + duration)
+    positions = sky_positions(observer, [target], timestamps)
     user_logger.trace(
-        "TRACE: target at start (az, el)= ({}, {})".format(azim, elev)
+        "TRACE: target at start (az, el)= ({}, {})".format(positions["az"][0, 0],
+                                                           positions["el"][0, 0])
     )
-    if not elev > horizon:
-        return False
-
-    # check that target will be visible at end of track
     if duration:
-        end_ = timestamp2datetime(time.time() + duration)
-        [azim, elev] = __horizontal_coordinates__(target,
-                                                  observer,
-                                                  end_)
         user_logger.trace(
-            "TRACE: target at end (az, el)= ({}, {})".format(azim, elev)
+            "TRACE: target at end (az, el)= ({}, {})".format(positions["az"][0, -1],
+                                                             positions["el"][0, -1])
         )
-        return elev > horizon
-
-    return True
+    return bool((positions["el"][0] > np.degrees(horizon)).all())
 
 
 class Telescope(object):
@@ -319,10 +318,17 @@ class Telescope(object):
         user_logger.info("Observation start up")
         user_logger.info("Running astrokat version - %s", astrokat.__version__)
         obs_plan_params = self.opts.obs_plan_params
+        # configuration sensors are read afresh for every schedule block
+        get_sensor_cache(self.array).invalidate()
         if "instrument" in obs_plan_params:
             self.subarray_setup(obs_plan_params["instrument"])
 
         # TODO: noise diode implementations should be moved to sessions
+        # command latency is measured afresh for every observation
+        noisediode.nd_latency.reset()
+        noisediode.nd_state.reset()
+        noisediode.nd_timer.reset()
+        noisediode.set_dump_timing(None)
         # switch noise-source pattern off (known setup starting observation)
         noisediode.off(self.array)
 
@@ -341,13 +347,24 @@ class Telescope(object):
         # Ensure known exit state before quitting
         # TODO: Return correlator settings to entry values
         # switch noise-source pattern off (ensure this after each observation)
+        noisediode.nd_state.reset()
         noisediode.off(self.array)
+        sensor_cache = get_sensor_cache(self.array)
+        user_logger.debug("DEBUG: sensor cache {} hits, {} reads"
+                          .format(sensor_cache.hits, sensor_cache.misses))
+        sensor_cache.invalidate()
+        if noisediode.nd_timer.overshoot:
+            user_logger.debug("DEBUG: noise diode wait overshoot max {:.6f} sec "
+                              "over {} waits".format(max(noisediode.nd_timer.overshoot),
+                                                     len(noisediode.nd_timer.overshoot)))
         self.array.disconnect()
 
     def subarray_setup(self, instrument):
         """Set up the array for observing.
 
         Include current sensor list in instrument.
+        The subarray sensors are read concurrently and all differences
+        from the requested configuration are reported together.
 
         Parameters
         ----------
@@ -366,13 +383,17 @@ class Telescope(object):
         if self.opts.obs_plan_params["instrument"] is None:
             return
 
-        approved_sb_sensor = self.array.sched.sensor.get("approved_schedule")
-        if not approved_sb_sensor:
+        def read_approved_schedule():
+            approved_sb_sensor = self.array.sched.sensor.get("approved_schedule")
+            return approved_sb_sensor.get_value() if approved_sb_sensor else None
+
+        approved_sb_sensor_value = get_sensor_cache(self.array).get(
+            "approved_schedule", read_approved_schedule)
+        if approved_sb_sensor_value is None:
             user_logger.info(
                 "Skipping instrument checks - approved_schedule does not exist"
             )
             return
-        approved_sb_sensor_value = approved_sb_sensor.get_value()
         if self.array.sb_id_code not in approved_sb_sensor_value:
             user_logger.info(
                 "Skipping instrument checks - {} "
@@ -380,12 +401,21 @@ class Telescope(object):
             )
             return
 
+        # read all subarray sensors at once, then check them against the plan
+        sensor_names = dict((key, "sub_{}".format(key)) for key in instrument)
+        sub_sensors, read_errors = fetch_sensors(self.array.sensor,
+                                                 list(sensor_names.values()))
+        errors = ["Subarray configuration {} could not be read, {}"
+                  .format(sensor_name, read_errors[sensor_name])
+                  for sensor_name in sorted(read_errors)]
         for key in instrument.keys():
             conf_param = instrument[key]
             user_logger.trace("{}: {}".format(key, conf_param))
-            sensor_name = "sub_{}".format(key)
+            sensor_name = sensor_names[key]
             user_logger.trace("{}".format(sensor_name))
-            sub_sensor = self.array.sensor.get(sensor_name).get_value()
+            if sensor_name not in sub_sensors:
+                continue
+            sub_sensor = sub_sensors[sensor_name]
             if isinstance(conf_param, list):
                 conf_param = set(conf_param)
             if isinstance(sub_sensor, list):
@@ -398,28 +428,48 @@ class Telescope(object):
                 pool_params = [str_.strip() for str_ in conf_param.split(",")]
                 for param in pool_params:
                     if param not in sub_sensor:
-                        raise RuntimeError(
+                        errors.append(
                             "Subarray configuration {} error, {} required, "
                             "{} found".format(sensor_name, param, sub_sensor)
                         )
             elif key == "dump_rate":
                 delta = abs(conf_param - sub_sensor)
                 if delta > DUMP_RATE_TOLERANCE:
-                    raise RuntimeError(
+                    errors.append(
                         "Subarray configuration {} error, {} required, "
                         "{} found, delta > tolerance ({} > {})".format(
                             sensor_name, conf_param, sub_sensor, delta,
                             DUMP_RATE_TOLERANCE)
                     )
             elif conf_param != sub_sensor:
-                raise RuntimeError(
+                errors.append(
                     "Subarray configuration {} error, {} required, "
                     "{} found".format(sensor_name, conf_param, sub_sensor)
                 )
 
+        # report all configuration problems together
+        for error in errors:
+            user_logger.error(error)
+        if errors:
+            raise RuntimeError("\n".join(errors))
+
 
 def run_observation(opts, kat):
-    """Extract control and observation information provided in observation file."""
+    """Extract control and observation information provided in observation file.
+
+    Target counters and last observation times start from `opts.target_state`
+    if given, a mapping of target names to a dict with 'obs_cntr' and
+    'last_observed' [sec], to continue cadences of an earlier run.
+
+    Returns
+    -------
+    obs_stats: list
+        Summary per completed observation cycle, a dict with keys
+        'LST', 'start_time', 'total_obs_time' and 'targets', which maps
+        each target name to a dict with 'obs_cntr', 'on_source' [sec],
+        'cadence' [sec] and 'visits', the timestamps of completed observations
+
+    """
     obs_plan_params = opts.obs_plan_params
     # remove observation specific instructions housed in YAML file
     del opts.obs_plan_params
@@ -436,6 +486,7 @@ def run_observation(opts, kat):
 
     # Each observation loop contains a number of observation cycles over LST ranges
     # For a single observation loop, only a start LST and duration is required
+    obs_stats = []
     for observation_cycle in obs_plan_params["observation_loop"]:
         # Unpack all target information
         if not ("target_list" in observation_cycle.keys()):
@@ -444,6 +495,14 @@ def run_observation(opts, kat):
             )
             continue
         obs_targets = read_targets(observation_cycle["target_list"])
+        target_state = getattr(opts, "target_state", None) or {}
+        for tgt in obs_targets:
+            if tgt["name"] in target_state:
+                tgt["obs_cntr"] = target_state[tgt["name"]]["obs_cntr"]
+                tgt["last_observed"] = target_state[tgt["name"]]["last_observed"]
+        # statistics count the observations of this run only
+        initial_cntrs = obs_targets["obs_cntr"].copy()
+        visits = dict((name, []) for name in obs_targets["name"])
         target_list = obs_targets["target"].tolist()
         # build katpoint catalogues for tidy handling of targets
         catalogue = collect_targets(kat.array, target_list)
@@ -567,18 +626,31 @@ def run_observation(opts, kat):
             #  so it happens in the line above
             if "noise_diode" in obs_plan_params:
                 nd_setup = obs_plan_params["noise_diode"]
-                nd_lead = _DEFAULT_LEAD_TIME
-                if "lead_time" in nd_setup:
-                    nd_lead = nd_setup['lead_time']
+                nd_lead = noisediode.get_lead_time(nd_setup)
 
-                # Set noise diode period to multiple of correlator integration time.
+                # Correlator dump boundaries for aligning noise diode edges
+                sensor_cache = get_sensor_cache(kat.array)
                 if not kat.array.dry_run:
                     cbf_corr = session.cbf.correlator
-                    dump_period = cbf_corr.sensor.int_time.get_value()
+
+                    def read_sync_time():
+                        sync_time = getattr(cbf_corr.sensor, "sync_time", None)
+                        return None if sync_time is None else sync_time.get_value()
+
+                    dump_period = sensor_cache.get("int_time",
+                                                   cbf_corr.sensor.int_time.get_value)
+                    sync_time = sensor_cache.get("sync_time", read_sync_time)
                 else:
-                    dump_period = 0.5  # sec
+                    dump_period = sensor_cache.get(  # sec
+                        "int_time", lambda: kat.array.sensor_value('int_time', 0.5))
+                    sync_time = sensor_cache.get(
+                        "sync_time", lambda: kat.array.sensor_value('sync_time'))
                 user_logger.debug('DEBUG: Correlator integration time {} [sec]'
                                   .format(dump_period))
+                if sync_time is not None:
+                    noisediode.set_dump_timing(dump_period, sync_time)
+
+                # Set noise diode period to multiple of correlator integration time.
 
                 if "cycle_len" in nd_setup:
                     if (nd_setup['cycle_len'] >= dump_period):
@@ -704,6 +776,7 @@ def run_observation(opts, kat):
                                 targets_visible += True
                                 tgt["obs_cntr"] += 1
                                 tgt["last_observed"] = time.time()
+                                visits[tgt["name"]].append(tgt["last_observed"])
                             else:
                                 # target not visibile to sessions anymore
                                 cadence_targets.remove(tgt)
@@ -749,6 +822,7 @@ def run_observation(opts, kat):
                         if targets_visible:
                             target["obs_cntr"] += 1
                             target["last_observed"] = time.time()
+                            visits[target["name"]].append(target["last_observed"])
                         user_logger.trace(
                             "TRACE: target observation # {} last observed "
                             "{}".format(target["obs_cntr"], target["last_observed"])
@@ -839,13 +913,29 @@ def run_observation(opts, kat):
             "Total observation time {:.2f} sec "
             "({:.2f} min)".format(total_obs_time, total_obs_time / 60.0)
         )
+        cycle_stats = {
+            "LST": observation_cycle["LST"],
+            "start_time": session.start_time,
+            "total_obs_time": total_obs_time,
+            "targets": {},
+        }
+        obs_stats.append(cycle_stats)
         if len(obs_targets) > 0:
             user_logger.info("Targets observed :")
             for unique_target in np.unique(obs_targets["name"]):
-                cntrs = obs_targets[obs_targets["name"] == unique_target]["obs_cntr"]
+                cntrs = (obs_targets["obs_cntr"]
+                         - initial_cntrs)[obs_targets["name"] == unique_target]
                 durations = obs_targets[obs_targets["name"] == unique_target][
                     "duration"
                 ]
+                cadences = obs_targets[obs_targets["name"] == unique_target]["cadence"]
+                on_source = np.nansum(cntrs * durations)
+                cycle_stats["targets"][unique_target] = {
+                    "obs_cntr": int(np.sum(cntrs)),
+                    "on_source": float(on_source),
+                    "cadence": float(np.max(cadences)),
+                    "visits": sorted(visits[unique_target]),
+                }
                 if np.isnan(durations).any():
                     user_logger.info(
                         "{} observed {} times".format(unique_target, np.sum(cntrs))
@@ -858,6 +948,8 @@ def run_observation(opts, kat):
                     )
         print
 
+    return obs_stats
+
 
 def main(args):
     """Run the observation.
@@ -911,6 +1003,12 @@ def main(args):
         user_logger.setLevel(logging.DEBUG)
     if opts.trace:
         user_logger.setLevel(logging.TRACE)
+    if opts.log_format != "text":
+        astrokat.simulate.set_log_format(opts.log_format)
+    if opts.slew_model:
+        astrokat.simulate.load_slew_model(opts.slew_model)
+    if opts.ephemeris_cache:
+        set_cache_directory(opts.ephemeris_cache)
 
     # setup and observation
     with Telescope(opts) as kat:
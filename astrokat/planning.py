@@ -0,0 +1,554 @@
+"""Observation plan robustness analysis using the observation simulator."""
+from __future__ import division
+from __future__ import absolute_import
+
+import argparse
+import copy
+import json
+import katpoint
+import logging
+import multiprocessing
+import numpy
+import time
+
+from datetime import datetime
+
+from . import observe_main, simulate
+from .observatory import get_observatory, _SIDEREAL_RATE
+from .utility import get_lst, katpoint_target, lst2utc, timestamp2datetime
+
+# Resolution of the shared sky position cache used for plan simulations [sec]
+_PLAN_AZEL_RESOLUTION_SEC = 60.0
+_PLAN_AZEL_CACHE_SIZE = 1000000
+
+
+def simulate_plan(obs_plan_params,
+                  start_time,
+                  obs_duration=None,
+                  horizon=None,
+                  target_state=None):
+    """Run an observation plan through the simulator.
+
+    Parameters
+    ----------
+    obs_plan_params: dict
+        Observation plan as read from the YAML file by `read_yaml`
+    start_time: float
+        Observation start time as time since the epoch [sec]
+    obs_duration: float, optional
+        Observation duration [sec], overriding the plan duration
+    horizon: float, optional
+        Minimum pointing elevation [deg], overriding the plan horizon
+    target_state: dict, optional
+        Target names mapped to 'obs_cntr' and 'last_observed' [sec]
+        of an earlier run, continuing target cadences
+
+    Returns
+    -------
+    obs_stats: list
+        Observation cycle statistics, as returned by `run_observation`
+
+    """
+    if observe_main.start_session is not simulate.start_session:
+        raise RuntimeError("Plan simulation is only available without a live system")
+
+    obs_plan_params = copy.deepcopy(obs_plan_params)
+    durations = obs_plan_params.setdefault("durations", {})
+    durations["start_time"] = timestamp2datetime(start_time)
+    if obs_duration is not None:
+        durations["obs_duration"] = obs_duration
+    if horizon is None:
+        horizon = obs_plan_params.get("horizon", 20.0)
+    opts = argparse.Namespace(
+        obs_plan_params=obs_plan_params,
+        horizon=horizon,
+        all_up=False,
+        target_state=target_state,
+    )
+
+    # the simulated session replaces the system clock, restore it afterwards
+    realtime, realsleep = time.time, time.sleep
+    try:
+        with observe_main.Telescope(opts) as kat:
+            return observe_main.run_observation(opts, kat)
+    finally:
+        time.time, time.sleep = realtime, realsleep
+
+
+def plan_targets(obs_plan_params, antenna=None):
+    """Construct katpoint targets for all targets in an observation plan.
+
+    Parameters
+    ----------
+    obs_plan_params: dict
+        Observation plan as read from the YAML file by `read_yaml`
+    antenna: katpoint.Antenna, optional
+        Observer location, defaults to the array reference position
+
+    Returns
+    -------
+    targets: list of katpoint.Target
+
+    """
+    if antenna is None:
+        antenna = katpoint.Antenna(get_observatory().location)
+    targets = {}
+    for observation_cycle in obs_plan_params["observation_loop"]:
+        for target_item in observation_cycle["target_list"]:
+            _, target = katpoint_target(target_item)
+            targets[target] = katpoint.Target(target, antenna=antenna)
+    return list(targets.values())
+
+
+def lst_window(obs_plan_params, date=None):
+    """UTC time range over which the plan LST window is open.
+
+    Parameters
+    ----------
+    obs_plan_params: dict
+        Observation plan as read from the YAML file by `read_yaml`
+    date: datetime, optional
+        Date of observation, defaults to the plan start time date or today
+
+    Returns
+    -------
+    start_time: float
+        Time the first observation loop LST window opens, since the epoch [sec]
+    window_length: float
+        Length of the LST window in UTC seconds
+
+    """
+    if date is None:
+        date = obs_plan_params.get("durations", {}).get("start_time")
+    if date is None:
+        date = datetime.utcnow()
+    start_lst, end_lst = [
+        float(lst) for lst in get_lst(obs_plan_params["observation_loop"][0]["LST"])
+    ]
+    lst_hours = (end_lst - start_lst) % 24.0
+    if lst_hours == 0.0:
+        lst_hours = 24.0
+    start_datetime = lst2utc(start_lst, get_observatory().location, date=date)
+    start_time = (start_datetime - datetime(1970, 1, 1)).total_seconds()
+    return start_time, lst_hours * 3600.0 / _SIDEREAL_RATE
+
+
+def sweep_start_times(obs_plan_params, nruns=24, date=None, monte_carlo=False, seed=None):
+    """Start times spread over the plan LST window.
+
+    Parameters
+    ----------
+    obs_plan_params: dict
+        Observation plan as read from the YAML file by `read_yaml`
+    nruns: int
+        Number of start times
+    date: datetime, optional
+        Date of observation, see `lst_window`
+    monte_carlo: bool
+        Draw random start times instead of using a regular grid
+    seed: int, optional
+        Random generator seed for repeatable Monte Carlo sweeps
+
+    Returns
+    -------
+    start_times: numpy.ndarray
+        Start times as time since the epoch [sec]
+
+    """
+    window_start, window_length = lst_window(obs_plan_params, date=date)
+    if monte_carlo:
+        offsets = numpy.sort(
+            numpy.random.RandomState(seed).uniform(0.0, window_length, nruns)
+        )
+    else:
+        offsets = numpy.linspace(0.0, window_length, nruns, endpoint=False)
+    return window_start + offsets
+
+
+def cadence_misses(visits, cadence, end_time):
+    """Count the number of cadence intervals passing without a target visit.
+
+    Parameters
+    ----------
+    visits: list
+        Sorted timestamps of completed observations of the target [sec]
+    cadence: float
+        Requested cadence [sec], no misses for targets without a cadence
+    end_time: float
+        End of the observation [sec]
+
+    Returns
+    -------
+    misses: int
+
+    """
+    if cadence <= 0 or len(visits) < 1:
+        return 0
+    gaps = numpy.diff(numpy.r_[visits, end_time])
+    return int(numpy.maximum(numpy.floor(gaps / cadence) - 1, 0).sum())
+
+
+def run_summary(obs_stats):
+    """Collect observation statistics per target over all observation cycles.
+
+    Parameters
+    ----------
+    obs_stats: list
+        Observation cycle statistics, as returned by `run_observation`
+
+    Returns
+    -------
+    summary: dict
+        'total_obs_time' [sec] and 'targets', mapping target names to
+        a dict with 'on_source' [sec], 'obs_cntr', 'cadence_misses' and
+        'last_observed' [sec], None if the target was not observed
+
+    """
+    summary = {"total_obs_time": 0.0, "targets": {}}
+    for cycle_stats in obs_stats or []:
+        summary["total_obs_time"] += cycle_stats["total_obs_time"]
+        end_time = cycle_stats["start_time"] + cycle_stats["total_obs_time"]
+        for name, stats in cycle_stats["targets"].items():
+            target = summary["targets"].setdefault(
+                name,
+                {"on_source": 0.0, "obs_cntr": 0, "cadence_misses": 0,
+                 "last_observed": None},
+            )
+            target["on_source"] += stats["on_source"]
+            target["obs_cntr"] += stats["obs_cntr"]
+            target["cadence_misses"] += cadence_misses(
+                stats["visits"], stats["cadence"], end_time
+            )
+            if stats["visits"]:
+                target["last_observed"] = max(stats["visits"][-1],
+                                              target["last_observed"] or 0.0)
+    return summary
+
+
+def _quiet_simulation_():
+    """Suppress simulator log output for bulk simulation runs."""
+    simulate.user_logger.setLevel(logging.CRITICAL)
+
+
+def _simulate_summary_(args):
+    obs_plan_params, start_time, obs_duration = args
+    return run_summary(simulate_plan(obs_plan_params, start_time, obs_duration))
+
+
+def lst_sweep(obs_plan_params,
+              start_times,
+              obs_duration=None,
+              processes=None,
+              resolution=_PLAN_AZEL_RESOLUTION_SEC):
+    """Simulate an observation plan for a set of start times.
+
+    Target positions are precomputed on a shared grid before the runs are
+    distributed over the worker processes, so that all runs reuse the same
+    ephemeris calculations.
+
+    Parameters
+    ----------
+    obs_plan_params: dict
+        Observation plan as read from the YAML file by `read_yaml`
+    start_times: list
+        Observation start times as time since the epoch [sec]
+    obs_duration: float, optional
+        Observation duration [sec], overriding the plan duration
+    processes: int, optional
+        Number of worker processes, defaults to the number of CPUs
+    resolution: float
+        Time resolution of the shared sky position grid [sec]
+
+    Returns
+    -------
+    summaries: list
+        Run summary for each start time, see `run_summary`
+
+    """
+    # sky positions are needed up to the end of the last run
+    max_duration = obs_duration
+    if max_duration is None:
+        max_duration = obs_plan_params.get("durations", {}).get("obs_duration", -1)
+    if max_duration < 0:
+        max_duration = lst_window(obs_plan_params)[1]
+    simulate.set_azel_cache(resolution=resolution, maxsize=_PLAN_AZEL_CACHE_SIZE)
+    simulate.azel_cache.precompute(plan_targets(obs_plan_params),
+                                   numpy.min(start_times),
+                                   numpy.max(start_times) + max_duration)
+
+    runs = [(obs_plan_params, start_time, obs_duration) for start_time in start_times]
+    if processes == 1:
+        _quiet_simulation_()
+        return [_simulate_summary_(run) for run in runs]
+    pool = multiprocessing.Pool(processes=processes, initializer=_quiet_simulation_)
+    try:
+        return pool.map(_simulate_summary_, runs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def sweep_statistics(summaries):
+    """Distributions of run results over a sweep.
+
+    Parameters
+    ----------
+    summaries: list
+        Run summaries, see `run_summary`
+
+    Returns
+    -------
+    statistics: dict
+        'total_obs_time' array and 'targets', mapping target names to a dict
+        with 'on_source' and 'cadence_misses' arrays (one value per run)
+        and 'skipped', the number of runs in which the target was not observed
+
+    """
+    names = sorted(set(name for summary in summaries for name in summary["targets"]))
+    statistics = {
+        "total_obs_time": numpy.array([summary["total_obs_time"]
+                                       for summary in summaries]),
+        "targets": {},
+    }
+    empty = {"on_source": 0.0, "obs_cntr": 0, "cadence_misses": 0}
+    for name in names:
+        runs = [summary["targets"].get(name, empty) for summary in summaries]
+        statistics["targets"][name] = {
+            "on_source": numpy.array([run["on_source"] for run in runs]),
+            "cadence_misses": numpy.array([run["cadence_misses"] for run in runs]),
+            "skipped": sum(run["obs_cntr"] < 1 for run in runs),
+        }
+    return statistics
+
+
+def sweep_report(statistics):
+    """Text table of sweep result distributions.
+
+    Parameters
+    ----------
+    statistics: dict
+        Sweep result distributions, see `sweep_statistics`
+
+    Returns
+    -------
+    report: str
+
+    """
+    percentiles = [0, 25, 50, 75, 100]
+    nruns = len(statistics["total_obs_time"])
+    report = "Simulated {} runs\n".format(nruns)
+    report += "Total observation time [min] (min/25%/50%/75%/max): {}\n".format(
+        " / ".join("{:.1f}".format(val / 60.0) for val in
+                   numpy.percentile(statistics["total_obs_time"], percentiles)))
+    report += "{: <24}{: <44}{: <16}{: <16}\n".format(
+        "Target", "On source [min] (min/25%/50%/75%/max)", "Skipped runs",
+        "Cadence misses")
+    for name, target in sorted(statistics["targets"].items()):
+        on_source = numpy.percentile(target["on_source"], percentiles) / 60.0
+        report += "{: <24}{: <44}{: <16}{: <16}\n".format(
+            name,
+            " / ".join("{:.1f}".format(val) for val in on_source),
+            "{}/{}".format(target["skipped"], nruns),
+            "{} (max {})".format(int(target["cadence_misses"].sum()),
+                                 int(target["cadence_misses"].max())),
+        )
+    return report
+
+
+def campaign_windows(obs_plan_params, nnights, date=None, obs_duration=None):
+    """Observation windows for a plan repeated on consecutive nights.
+
+    Parameters
+    ----------
+    obs_plan_params: dict
+        Observation plan as read from the YAML file by `read_yaml`
+    nnights: int
+        Number of consecutive nights, each starting at the LST of the
+        plan start time, or when the LST window opens without a start time
+    date: datetime, optional
+        Date of the first night, see `lst_window`
+    obs_duration: float, optional
+        Observation duration [sec], defaults to the plan duration or
+        the length of the LST window
+
+    Returns
+    -------
+    windows: list
+        (start_time, obs_duration) per night, start time since the epoch [sec]
+
+    """
+    plan_start = obs_plan_params.get("durations", {}).get("start_time")
+    if date is None:
+        date = plan_start
+    if date is None:
+        date = datetime.utcnow()
+    if obs_duration is None:
+        obs_duration = obs_plan_params.get("durations", {}).get("obs_duration", -1)
+    start_time, window_length = lst_window(obs_plan_params, date=date)
+    if plan_start is not None:
+        # every night starts at the same LST as the planned observation
+        antenna = katpoint.Antenna(get_observatory().location)
+        start_lst = numpy.degrees(antenna.local_sidereal_time(
+            (plan_start - datetime(1970, 1, 1)).total_seconds())) / 15.0
+        start_time = (lst2utc(start_lst, get_observatory().location, date=date)
+                      - datetime(1970, 1, 1)).total_seconds()
+    if obs_duration <= 0:
+        obs_duration = window_length
+    return [(start_time + night * 24.0 * 3600.0 / _SIDEREAL_RATE, obs_duration)
+            for night in range(nnights)]
+
+
+def _target_name_(target_item):
+    return katpoint.Target(katpoint_target(target_item)[1]).name
+
+
+def remaining_plan(obs_plan_params, completed):
+    """Observation plan without the targets that completed their goals.
+
+    Parameters
+    ----------
+    obs_plan_params: dict
+        Observation plan as read from the YAML file by `read_yaml`
+    completed: set
+        Names of targets to remove from the plan
+
+    Returns
+    -------
+    obs_plan_params: dict
+        Copy of the plan, observation loops without targets are dropped
+
+    """
+    obs_plan_params = copy.deepcopy(obs_plan_params)
+    observation_loop = []
+    for observation_cycle in obs_plan_params["observation_loop"]:
+        observation_cycle["target_list"] = [
+            target_item
+            for target_item in observation_cycle["target_list"]
+            if _target_name_(target_item) not in completed
+        ]
+        if observation_cycle["target_list"]:
+            observation_loop.append(observation_cycle)
+    obs_plan_params["observation_loop"] = observation_loop
+    return obs_plan_params
+
+
+def read_campaign_state(filename):
+    """Campaign progress saved by `write_campaign_state`."""
+    with open(filename) as fin:
+        return json.load(fin)
+
+
+def write_campaign_state(filename, state):
+    """Save campaign progress for continuation in a later simulation."""
+    with open(filename, "w") as fout:
+        json.dump(state, fout, indent=2, sort_keys=True)
+
+
+def campaign(obs_plan_params,
+             windows,
+             goals=None,
+             state=None,
+             resolution=_PLAN_AZEL_RESOLUTION_SEC):
+    """Simulate an observation plan over a series of observation windows.
+
+    Observation counts and on-source time accumulate across windows, and
+    targets are removed from the plan once their on-source time goal is met.
+    The campaign ends when all targets with goals are complete.
+
+    Parameters
+    ----------
+    obs_plan_params: dict
+        Observation plan as read from the YAML file by `read_yaml`
+    windows: list
+        (start_time, obs_duration) per window [sec], see `campaign_windows`
+    goals: dict, optional
+        Mapping of target names to on-source time goals [sec]
+    state: dict, optional
+        Campaign progress from an earlier simulation to continue from
+    resolution: float
+        Time resolution of the sky position cache [sec]
+
+    Returns
+    -------
+    state: dict
+        'windows', a list of (start_time, run summary) per simulated window,
+        'targets', mapping target names to the accumulated 'on_source' [sec]
+        and 'obs_cntr' and the 'last_observed' time [sec], and 'completed',
+        the sorted names of targets that met their goals.
+        Every window continues the counters and cadences of the targets
+        from the state of the previous windows
+
+    """
+    goals = goals or {}
+    if state is None:
+        state = {"windows": [], "targets": {}, "completed": []}
+    state = copy.deepcopy(state)
+
+    simulate.set_azel_cache(resolution=resolution, maxsize=_PLAN_AZEL_CACHE_SIZE)
+    _quiet_simulation_()
+    for start_time, obs_duration in windows:
+        completed = set(state["completed"])
+        if goals and completed.issuperset(goals):
+            break
+        night_plan = remaining_plan(obs_plan_params, completed)
+        if not night_plan["observation_loop"]:
+            break
+        # positions of one window at a time keep the cache bounded
+        simulate.azel_cache.clear()
+        simulate.azel_cache.precompute(plan_targets(night_plan),
+                                       start_time,
+                                       start_time + obs_duration)
+        target_state = dict((name, {"obs_cntr": target["obs_cntr"],
+                                    "last_observed": target.get("last_observed")})
+                            for name, target in state["targets"].items())
+        summary = run_summary(simulate_plan(night_plan,
+                                            start_time,
+                                            obs_duration,
+                                            target_state=target_state))
+        state["windows"].append((start_time, summary))
+        for name, stats in summary["targets"].items():
+            target = state["targets"].setdefault(
+                name, {"on_source": 0.0, "obs_cntr": 0, "last_observed": None})
+            target["on_source"] += stats["on_source"]
+            target["obs_cntr"] += stats["obs_cntr"]
+            if stats["last_observed"] is not None:
+                target["last_observed"] = stats["last_observed"]
+            if name in goals and target["on_source"] >= goals[name]:
+                completed.add(name)
+        state["completed"] = sorted(completed)
+    return state
+
+
+def campaign_report(state, goals=None):
+    """Text table of campaign progress.
+
+    Parameters
+    ----------
+    state: dict
+        Campaign progress, see `campaign`
+    goals: dict, optional
+        Mapping of target names to on-source time goals [sec]
+
+    Returns
+    -------
+    report: str
+
+    """
+    goals = goals or {}
+    report = "Simulated {} observation windows\n".format(len(state["windows"]))
+    report += "{: <24}{: <16}{: <16}{: <16}\n".format(
+        "Target", "On source [hr]", "Goal [hr]", "Observations")
+    for name, target in sorted(state["targets"].items()):
+        goal = "{:.2f}".format(goals[name] / 3600.0) if name in goals else "-"
+        if name in state["completed"]:
+            goal += " (done)"
+        report += "{: <24}{: <16}{: <16}{: <16}\n".format(
+            name,
+            "{:.2f}".format(target["on_source"] / 3600.0),
+            goal,
+            target["obs_cntr"],
+        )
+    return report
+
+
+# -fin-
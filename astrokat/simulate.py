@@ -2,20 +2,29 @@
 from __future__ import division
 from __future__ import absolute_import
 
+import csv
 import ephem
+import json
 import logging
 import numpy
+import os
+import re
 import time
 import sys
 import katpoint
+import yaml
 
 from collections import namedtuple
+from datetime import datetime
 
-from .utility import get_lst, datetime2timestamp, timestamp2datetime
+from .utility import LRUCache, get_lst, datetime2timestamp, timestamp2datetime
 
 global simobserver
 simobserver = ephem.Observer()
 
+# Simulated sessions replace time.sleep, latency injection needs the real one
+_wallsleep = time.sleep
+
 
 # MeerKAT receptor parameters for azimuth and elevation slewing
 # (some from specifications, some from empirical data - see JIRA MT-1206).
@@ -31,6 +40,490 @@ _AZ_ACCEL_DEG_PER_SEC_SQ = 1.0
 _AZ_LONG_SLEW_DEG = 0.0
 _AZ_LONG_SLEW_SETTLE_TIME_SEC = 6.1
 
+# Slew and overhead model parameters used by the simulator,
+# replaced by a calibrated model with `load_slew_model`
+_DEFAULT_SLEW_MODEL = {
+    "sim_overhead": _SIM_OVERHEAD_SEC,
+    "slew_init_overhead": _SLEW_INIT_OVERHEAD,
+    "el_speed": _EL_SPEED_DEG_PER_SEC,
+    "el_accel": _EL_ACCEL_DEG_PER_SEC_SQ,
+    "el_long_slew": _EL_LONG_SLEW_DEG,
+    "el_long_slew_settle_time": _EL_LONG_SLEW_SETTLE_TIME_SEC,
+    "az_speed": _AZ_SPEED_DEG_PER_SEC,
+    "az_accel": _AZ_ACCEL_DEG_PER_SEC_SQ,
+    "az_long_slew": _AZ_LONG_SLEW_DEG,
+    "az_long_slew_settle_time": _AZ_LONG_SLEW_SETTLE_TIME_SEC,
+}
+global slew_model
+slew_model = dict(_DEFAULT_SLEW_MODEL)
+
+# Simulated subarray, unless another antenna list is requested
+_DEFAULT_SIM_ANTENNAS = ["m011", "m022", "m033", "m044"]
+_MKAT_NUM_ANTENNAS = 64
+_MKAT_ANTENNAS_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "config",
+    "mkat_antennas.yml",
+)
+_ANTENNA_NAME = re.compile(r"^[a-z]\d{3,4}$")
+
+# Sky positions are reused for all queries falling in the same time bucket,
+# exact by default so that dry-run positions are not changed by the cache
+_AZEL_CACHE_RESOLUTION_SEC = 0.
+_AZEL_CACHE_SIZE = 8192
+
+
+def _axis_slew_time(dist, speed, accel, long_slew, settle_time):
+    """Slew time along a single axis for angular distances in degrees."""
+    # Time, t, to accelerate to full speed: v = u + at
+    t_acc = (speed - 0.0) / accel
+    # Corresponding displacement to accelerate
+    # up to full speed:  s = ut + (at^2)/2
+    s_acc = 0.0 * t_acc + (accel * t_acc ** 2) / 2.0
+
+    # The factors of 2 account for acceleration and deceleration
+    # i.e., ramping up to full speed, and then ramping down to stop
+    left = dist - 2.0 * s_acc
+    return numpy.where(
+        left > 0.0,
+        2.0 * t_acc + left / speed + numpy.where(left > long_slew, settle_time, 0.0),
+        # Time taken to cover distance: s = ut + (at^2)/2
+        2.0 * 2.0 * numpy.sqrt(dist / 2.0 / accel),
+    )
+
+
+def _slew_distances(from_az, from_el, to_az, to_el):
+    az_dist = numpy.abs(numpy.asarray(to_az, dtype=float) - from_az)
+    el_dist = numpy.abs(numpy.asarray(to_el, dtype=float) - from_el)
+    # wrap angle into +-180, ignoring receptor cable wrapping
+    az_dist = numpy.abs((az_dist + 180.) % 360. - 180.)
+    return az_dist, el_dist
+
+
+def slew_time(from_az, from_el, to_az, to_el, model=None):
+    """Get estimated slew time between pointings.
+
+    Vectorised over all inputs, which are broadcast against each other
+    following the normal NumPy rules.
+
+    Parameters
+    ----------
+    from_az: float or array_like
+        The azimuth co-ordinate(s) slewed from in degrees.
+    from_el: float or array_like
+        The elevation co-ordinate(s) slewed from in degrees.
+    to_az: float or array_like
+        The azimuth co-ordinate(s) slewed to in degrees.
+    to_el: float or array_like
+        The elevation co-ordinate(s) slewed to in degrees.
+    model: dict, optional
+        Slew model parameters, defaults to the current simulator `slew_model`
+
+    Returns
+    -------
+    slew_time: numpy.ndarray
+        The number of seconds it takes to slew, broadcast shape of the inputs.
+
+    """
+    if model is None:
+        model = slew_model
+    az_dist, el_dist = _slew_distances(from_az, from_el, to_az, to_el)
+    el_slew_time = _axis_slew_time(el_dist,
+                                   model["el_speed"],
+                                   model["el_accel"],
+                                   model["el_long_slew"],
+                                   model["el_long_slew_settle_time"])
+    az_slew_time = _axis_slew_time(az_dist,
+                                   model["az_speed"],
+                                   model["az_accel"],
+                                   model["az_long_slew"],
+                                   model["az_long_slew_settle_time"])
+
+    # Add additional overhead between initialising and slewing
+    return numpy.maximum(az_slew_time, el_slew_time) + model["slew_init_overhead"]
+
+
+def slew_time_matrix(az, el):
+    """Get estimated slew times between all pairs of pointings.
+
+    Parameters
+    ----------
+    az: array_like, shape (..., N)
+        Azimuth co-ordinates of N pointings in degrees.
+        Leading dimensions, e.g. a grid of M timestamps as shape (M, N),
+        are preserved.
+    el: array_like, shape (..., N)
+        Elevation co-ordinates of N pointings in degrees.
+
+    Returns
+    -------
+    slew_times: numpy.ndarray, shape (..., N, N)
+        Slew time in seconds, where element [..., i, j] is the time
+        to slew from pointing i to pointing j.
+
+    """
+    az = numpy.asarray(az, dtype=float)
+    el = numpy.asarray(el, dtype=float)
+    return slew_time(az[..., :, numpy.newaxis],
+                     el[..., :, numpy.newaxis],
+                     az[..., numpy.newaxis, :],
+                     el[..., numpy.newaxis, :])
+
+
+def _axis_fit_columns(dist, dominant, model, axis):
+    """Least squares design columns for slews dominated by one axis.
+
+    Short slews never reach full speed, t = k sqrt(d) with k = 2 sqrt(2 / a),
+    cruising slews add a linear term, t = d / v + v / a (+ settle time once
+    beyond the long slew distance).
+
+    """
+    speed = model["{}_speed".format(axis)]
+    accel = model["{}_accel".format(axis)]
+    left = dist - speed ** 2 / accel
+    short = dominant & (left <= 0.0)
+    long_ = dominant & (left > model["{}_long_slew".format(axis)])
+    cruise = dominant & ~short & ~long_
+    columns = numpy.column_stack([
+        numpy.where(short, numpy.sqrt(dist), 0.0),
+        numpy.where(cruise | long_, dist, 0.0),
+        cruise.astype(float),
+        long_.astype(float),
+    ])
+    return columns, [short.sum(), (cruise | long_).sum(), cruise.sum(), long_.sum()]
+
+
+def _axis_fit_params(params, counts, model, axis):
+    """Physical axis parameters from the fitted linear coefficients."""
+    k, inv_speed, cruise_offset, long_offset = params
+    n_short, n_moving, n_cruise, n_long = counts
+    fitted = {}
+    speed = model["{}_speed".format(axis)]
+    if n_moving > 0 and inv_speed > 0:
+        speed = 1.0 / inv_speed
+    accel = model["{}_accel".format(axis)]
+    if n_short > 0 and k > 0:
+        accel = 8.0 / k ** 2
+    elif n_cruise > 0 and cruise_offset > 0:
+        accel = speed / cruise_offset
+    fitted["{}_speed".format(axis)] = float(speed)
+    fitted["{}_accel".format(axis)] = float(accel)
+    if n_long > 0:
+        fitted["{}_long_slew_settle_time".format(axis)] = float(
+            max(long_offset - speed / accel, 0.0)
+        )
+    return fitted
+
+
+def _linear_slew_fit(model, az_dist, el_dist, durations, niter):
+    """Alternate axis attribution and linear fits, see `fit_slew_model`."""
+    model = dict(model)
+    dominant = None
+    for _ in range(niter):
+        az_time = _axis_slew_time(az_dist,
+                                  model["az_speed"],
+                                  model["az_accel"],
+                                  model["az_long_slew"],
+                                  model["az_long_slew_settle_time"])
+        el_time = _axis_slew_time(el_dist,
+                                  model["el_speed"],
+                                  model["el_accel"],
+                                  model["el_long_slew"],
+                                  model["el_long_slew_settle_time"])
+        az_dominant = az_time >= el_time
+        if dominant is not None and numpy.array_equal(az_dominant, dominant):
+            break
+        dominant = az_dominant
+
+        az_columns, az_counts = _axis_fit_columns(az_dist, dominant, model, "az")
+        el_columns, el_counts = _axis_fit_columns(el_dist, ~dominant, model, "el")
+        design = numpy.hstack([az_columns, el_columns])
+        # the overhead is only separable from the cruising offsets
+        # when some slews are short
+        fit_overhead = (az_counts[0] + el_counts[0]) > 0
+        target = durations
+        if fit_overhead:
+            design = numpy.hstack([design, numpy.ones((len(durations), 1))])
+        else:
+            target = durations - model["slew_init_overhead"]
+        params = numpy.linalg.lstsq(design, target, rcond=None)[0]
+        if fit_overhead:
+            model["slew_init_overhead"] = float(max(params[-1], 0.0))
+        model.update(_axis_fit_params(params[:4], az_counts, model, "az"))
+        model.update(_axis_fit_params(params[4:8], el_counts, model, "el"))
+
+    # parameters constrained by the measurements
+    keys = ["az_speed", "el_speed"]
+    if fit_overhead:
+        keys.append("slew_init_overhead")
+    for axis, counts in [("az", az_counts), ("el", el_counts)]:
+        if counts[0] > 0 or counts[2] > 0:
+            keys.append("{}_accel".format(axis))
+        if counts[3] > 0:
+            keys.append("{}_long_slew_settle_time".format(axis))
+    return model, keys
+
+
+def fit_slew_model(from_az, from_el, to_az, to_el, durations, model=None, niter=5):
+    """Fit slew model parameters to measured slew durations.
+
+    Each slew is attributed to the axis that takes longest under the current
+    model, after which the speeds, accelerations, settle times and the slew
+    initialisation overhead of both axes follow from a single linear least
+    squares fit. Attribution and fit are repeated until they agree.
+    Which slews reach full speed depends on the accelerations, so the fit
+    starts from a grid of accelerations around the initial model and the
+    best fit is refined with Gauss-Newton steps on the full piecewise model.
+
+    Parameters
+    ----------
+    from_az, from_el, to_az, to_el: array_like
+        Start and end pointings of the slews in degrees
+    durations: array_like
+        Measured slew durations [sec]
+    model: dict, optional
+        Initial model parameters, defaults to the current `slew_model`
+    niter: int
+        Maximum number of attribution iterations
+
+    Returns
+    -------
+    model: dict
+        Fitted slew model parameters, long slew distances and parameters
+        not constrained by the measurements keep their initial values
+
+    """
+    model = dict(slew_model if model is None else model)
+    durations = numpy.asarray(durations, dtype=float)
+    slews = (from_az, from_el, to_az, to_el)
+    az_dist, el_dist = _slew_distances(*slews)
+
+    best = None
+    scales = 2.0 ** numpy.arange(-3, 3)
+    for az_scale in scales:
+        for el_scale in scales:
+            start = dict(model,
+                         az_accel=model["az_accel"] * az_scale,
+                         el_accel=model["el_accel"] * el_scale)
+            fitted, keys = _linear_slew_fit(start, az_dist, el_dist, durations, niter)
+            residuals = durations - slew_time(*slews, model=fitted)
+            fit = numpy.mean(residuals ** 2)
+            if best is None or fit < best[0]:
+                best = (fit, fitted, keys)
+    _, fitted, keys = best
+    return _refine_slew_model(fitted, slews, durations, keys)
+
+
+def _refine_slew_model(model, slews, durations, keys, niter=20):
+    """Gauss-Newton refinement of the full, piecewise slew model."""
+    def rms(model_):
+        return numpy.sqrt(numpy.mean((durations - slew_time(*slews, model=model_)) ** 2))
+
+    best = rms(model)
+    for _ in range(niter):
+        predicted = slew_time(*slews, model=model)
+        jacobian = numpy.empty((len(durations), len(keys)))
+        for idx, key in enumerate(keys):
+            step = 1e-6 * max(abs(model[key]), 1.0)
+            model_ = dict(model)
+            model_[key] += step
+            jacobian[:, idx] = (slew_time(*slews, model=model_) - predicted) / step
+        update = numpy.linalg.lstsq(jacobian, durations - predicted, rcond=None)[0]
+        for scale in [1.0, 0.5, 0.25, 0.125]:
+            model_ = dict(model)
+            for key, delta in zip(keys, update):
+                model_[key] = max(model[key] + scale * delta, 1e-6)
+            fit = rms(model_)
+            if fit < best:
+                break
+        if fit >= best:
+            break
+        converged = (best - fit) < 1e-9 * max(best, 1.0)
+        model, best = model_, fit
+        if converged:
+            break
+    return model
+
+
+def set_slew_model(**params):
+    """Update simulator slew model parameters, see `_DEFAULT_SLEW_MODEL`."""
+    unknown = set(params) - set(_DEFAULT_SLEW_MODEL)
+    if unknown:
+        raise ValueError("Unknown slew model parameters {}".format(sorted(unknown)))
+    slew_model.update(params)
+    # cached slew costs were computed with the previous model
+    azel_cache.slew_times.clear()
+
+
+def load_slew_model(filename):
+    """Load a calibrated slew model, as written by `save_slew_model`."""
+    with open(filename) as stream:
+        params = yaml.safe_load(stream)
+    set_slew_model(**params["slew_model"])
+
+
+def save_slew_model(filename, model=None):
+    """Write slew model parameters to a YAML file."""
+    if model is None:
+        model = slew_model
+    with open(filename, "w") as stream:
+        model = dict((key, float(val)) for key, val in model.items())
+        yaml.safe_dump({"slew_model": model},
+                       stream,
+                       default_flow_style=False)
+
+
+class AzElCache(object):
+    """Time-bucketed cache of target (az, el) positions and pairwise slew costs.
+
+    Positions are evaluated once per target at the centre of each time bucket
+    and reused for every query that falls in the same bucket, so repeated
+    visits to the same target only cost a lookup.
+
+    Parameters
+    ----------
+    resolution: float
+        Width of the time buckets [sec], exact timestamps are used if 0
+    maxsize: int
+        Maximum number of positions (and slew costs) kept in the cache
+
+    """
+
+    def __init__(self, resolution=_AZEL_CACHE_RESOLUTION_SEC, maxsize=_AZEL_CACHE_SIZE):
+        self.resolution = resolution
+        self.positions = LRUCache(maxsize=maxsize)
+        self.slew_times = LRUCache(maxsize=maxsize)
+        self._antennas = {}
+
+    def _bucket(self, timestamp):
+        if self.resolution > 0:
+            return int(numpy.floor(timestamp / self.resolution))
+        return timestamp
+
+    def _bucket_time(self, bucket):
+        if self.resolution > 0:
+            return (bucket + 0.5) * self.resolution
+        return bucket
+
+    def _key(self, target):
+        antenna = target.antenna
+        return (target.description, antenna.description if antenna else None)
+
+    def _antenna(self, antenna):
+        # katpoint sets the observer date as a side effect of calculating
+        # positions, use a private copy to leave the simulation observer alone
+        if antenna.description not in self._antennas:
+            self._antennas[antenna.description] = katpoint.Antenna(antenna.description)
+        return self._antennas[antenna.description]
+
+    def clear(self):
+        """Remove all cached positions and slew costs."""
+        self.positions.clear()
+        self.slew_times.clear()
+
+    def azel(self, target, timestamp):
+        """Get azimuth and elevation co-ordinates for a target.
+
+        Parameters
+        ----------
+        target: katpoint.Target
+            The target of interest.
+        timestamp: float
+            Time since the epoch [sec]
+
+        Returns
+        -------
+        az: float
+            The azimuth co-ordinate of the target in degrees.
+        el: float
+            The elevation co-ordinate of the target in degrees.
+
+        """
+        bucket = self._bucket(timestamp)
+        key = self._key(target) + (bucket,)
+        azel = self.positions.get(key)
+        if azel is None:
+            antenna = None
+            if target.antenna is not None:
+                antenna = self._antenna(target.antenna)
+            az, el = target.azel(self._bucket_time(bucket), antenna=antenna)
+            azel = (katpoint.rad2deg(az), katpoint.rad2deg(el))
+            self.positions.put(key, azel)
+        return azel
+
+    def precompute(self, targets, start_time, end_time):
+        """Fill the cache with target positions over a time range.
+
+        Parameters
+        ----------
+        targets: list of katpoint.Target
+            The targets of interest.
+        start_time: float
+            Start of the time range as time since the epoch [sec]
+        end_time: float
+            End of the time range as time since the epoch [sec]
+
+        """
+        if not self.resolution > 0:
+            raise ValueError("Precomputing positions requires a time resolution")
+        buckets = numpy.arange(self._bucket(start_time), self._bucket(end_time) + 1)
+        for target in targets:
+            antenna = None
+            if target.antenna is not None:
+                antenna = self._antenna(target.antenna)
+            az, el = target.azel(self._bucket_time(buckets), antenna=antenna)
+            az = katpoint.rad2deg(numpy.broadcast_to(az, buckets.shape))
+            el = katpoint.rad2deg(numpy.broadcast_to(el, buckets.shape))
+            key = self._key(target)
+            for bucket, az_, el_ in zip(buckets, az, el):
+                self.positions.put(key + (int(bucket),), (float(az_), float(el_)))
+
+    def slew_time(self, from_target, to_target, timestamp):
+        """Get estimated slew time between two targets.
+
+        Parameters
+        ----------
+        from_target: katpoint.Target
+            The target currently tracked.
+        to_target: katpoint.Target
+            The target to slew to.
+        timestamp: float
+            Time since the epoch [sec]
+
+        Returns
+        -------
+        slew_time: float
+            The number of seconds it takes to slew.
+
+        """
+        key = (self._key(from_target), self._key(to_target), self._bucket(timestamp))
+        slew_time_ = self.slew_times.get(key)
+        if slew_time_ is None:
+            from_az, from_el = self.azel(from_target, timestamp)
+            to_az, to_el = self.azel(to_target, timestamp)
+            slew_time_ = float(slew_time(from_az, from_el, to_az, to_el))
+            self.slew_times.put(key, slew_time_)
+        return slew_time_
+
+
+global azel_cache
+azel_cache = AzElCache()
+
+
+def set_azel_cache(resolution=_AZEL_CACHE_RESOLUTION_SEC, maxsize=_AZEL_CACHE_SIZE):
+    """Replace the simulation az/el and slew-cost cache.
+
+    Parameters
+    ----------
+    resolution: float
+        Width of the time buckets [sec], exact timestamps are used if 0
+    maxsize: int
+        Maximum number of positions (and slew costs) kept in the cache
+
+    """
+    global azel_cache
+    azel_cache = AzElCache(resolution=resolution, maxsize=maxsize)
+
 
 def setobserver(update):
     """Simulate and update the observer location.
@@ -51,15 +544,66 @@ def setobserver(update):
     simobserver = update
 
 
+# Formatted time string of the last simulated second that was logged
+_sim_time_cache = {"second": None, "timestr": None}
+# ephem.Date of the Unix epoch [days]
+_UNIX_EPOCH_DATE = float(ephem.Date("1970/1/1"))
+
+
+def sim_timestamp():
+    """Simulated time of the observer object as seconds since the epoch."""
+    return (float(simobserver.date) - _UNIX_EPOCH_DATE) * 86400.0
+
+
 def sim_time(record, datefmt=None):
     """Simulate the time of the observer object.
 
     The year, month, dat, hour, minute and seconds string
-    describing the current time at the observer's location
+    describing the current time at the observer's location.
+    The string is only reformatted when the simulated clock
+    has advanced to a new second.
+
+    """
+    second = int(numpy.floor(sim_timestamp()))
+    if second != _sim_time_cache["second"]:
+        now = simobserver.date.datetime()
+        _sim_time_cache["timestr"] = now.strftime("%Y-%m-%d %H:%M:%SZ")
+        _sim_time_cache["second"] = second
+    return _sim_time_cache["timestr"]
+
+
+class SimTimeFormatter(logging.Formatter):
+    """Text log formatter stamping records with the simulated time."""
+
+    def __init__(self, fmt="%(asctime)s - %(message)s", datefmt=None):
+        logging.Formatter.__init__(self, fmt, datefmt)
+
+    def formatTime(self, record, datefmt=None):
+        """Simulated time string, cached per simulated second."""
+        return sim_time(record, datefmt)
+
+
+class SimJsonFormatter(logging.Formatter):
+    """Compact JSON lines log formatter stamped with the simulated time.
+
+    Each record is written as a single JSON object with keys `time`
+    (simulated seconds since the epoch), `level` and `msg`.
+    Structured data passed to the logger as ``extra={"event": {...}}``
+    is added under the `event` key.
 
     """
-    now = simobserver.date.datetime()
-    return now.strftime("%Y-%m-%d %H:%M:%SZ")
+
+    def format(self, record):
+        """Format record as a JSON line."""
+        entry = {
+            "time": round(sim_timestamp(), 6),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        event = getattr(record, "event", None)
+        if event is not None:
+            entry["event"] = event
+        return json.dumps(entry, separators=(",", ":"), default=str)
 
 
 # Fake user logger prints out to screen
@@ -78,19 +622,317 @@ logging.Logger.trace = trace
 
 user_logger = logging.getLogger(__name__)
 out_hdlr = logging.StreamHandler(sys.stdout)
-formatter = logging.Formatter("%(asctime)s - %(message)s")
-formatter.formatTime = sim_time
+formatter = SimTimeFormatter()
 out_hdlr.setFormatter(formatter)
 out_hdlr.setLevel(logging.TRACE)
 user_logger.addHandler(out_hdlr)
 user_logger.setLevel(logging.INFO)
 
 
+def set_log_format(log_format="text"):
+    """Select the simulation log output format.
+
+    Parameters
+    ----------
+    log_format: str
+        'text' for human readable lines or 'json' for compact JSON lines
+
+    """
+    global formatter
+    if log_format == "json":
+        formatter = SimJsonFormatter()
+    elif log_format == "text":
+        formatter = SimTimeFormatter()
+    else:
+        raise ValueError("Unknown log format {}".format(log_format))
+    out_hdlr.setFormatter(formatter)
+
+
 class Fakr(namedtuple("Fakr", "priv_value")):
     def get_value(self):
         return self.priv_value
 
 
+def _timeline_timestamp(value):
+    try:
+        return float(value)
+    except ValueError:
+        return datetime2timestamp(datetime.strptime(value, "%Y-%m-%d %H:%M:%S"))
+
+
+def _timeline_value(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+class SensorTimeline(object):
+    """Time ordered sensor values replayed against the simulated clock.
+
+    A sensor reports the last value recorded at or before the requested
+    time, and its first value for times before the start of the recording.
+
+    Parameters
+    ----------
+    samples: iterable
+        (timestamp, sensor name, value) samples, timestamp since the epoch [sec]
+
+    """
+
+    def __init__(self, samples):
+        sensors = {}
+        for timestamp, name, value in samples:
+            sensors.setdefault(name, []).append((timestamp, value))
+        self._timestamps = {}
+        self._values = {}
+        for name, readings in sensors.items():
+            readings.sort(key=lambda reading: reading[0])
+            self._timestamps[name] = numpy.array([reading[0] for reading in readings])
+            self._values[name] = [reading[1] for reading in readings]
+
+    @classmethod
+    def from_file(cls, filename):
+        """Read a sensor timeline from file.
+
+        Files with a '.csv' extension hold 'timestamp,name,value' rows,
+        any other file holds JSON lines with 'timestamp', 'name' and 'value'
+        keys. Timestamps are seconds since the epoch or UTC datetime strings
+        'YYYY-MM-DD HH:MM:SS', CSV values are parsed as JSON where possible.
+
+        """
+        samples = []
+        with open(filename) as fin:
+            if filename.lower().endswith(".csv"):
+                for row in csv.reader(fin):
+                    if not row or row[0].strip().startswith("#"):
+                        continue
+                    if row[0].strip() == "timestamp":
+                        continue  # header
+                    timestamp, name, value = [item.strip() for item in row[:3]]
+                    samples.append((_timeline_timestamp(timestamp),
+                                    name,
+                                    _timeline_value(value)))
+            else:
+                for line in fin:
+                    if not line.strip():
+                        continue
+                    sample = json.loads(line)
+                    samples.append((_timeline_timestamp(str(sample["timestamp"])),
+                                    sample["name"],
+                                    sample["value"]))
+        return cls(samples)
+
+    def __contains__(self, name):
+        return name in self._timestamps
+
+    def get_value(self, name, timestamp):
+        """Value of a sensor at a given time."""
+        idx = numpy.searchsorted(self._timestamps[name], timestamp, side="right")
+        return self._values[name][max(idx - 1, 0)]
+
+
+class TimelineSensor(namedtuple("TimelineSensor", "timeline name")):
+    def get_value(self):
+        return self.timeline.get_value(self.name, time.time())
+
+
+class SimReply(namedtuple("SimReply", "name arguments")):
+    """KATCP-like request reply."""
+
+    def reply_ok(self):
+        return self.arguments[0] == "ok"
+
+    def __str__(self):
+        return "!{} {}".format(self.name, " ".join(str(arg) for arg in self.arguments))
+
+
+class SimDigitiser(object):
+    """Stand-in digitiser for an antenna, answering noise diode requests.
+
+    Requests block for the reply latency in wall clock time, so that the time
+    needed to command many antennas can be measured without hardware.
+
+    Parameters
+    ----------
+    name: str
+        Antenna name
+    latency: float
+        Mean request round trip time [sec]
+    jitter: float
+        Standard deviation of the request round trip time [sec]
+    clock_offset: float
+        Offset of the digitiser clock, added to the reported switch time [sec]
+    failure_rate: float
+        Fraction of requests answered with a failure reply
+    random_state: numpy.random.RandomState, optional
+        Random generator for jitter and failures
+
+    """
+
+    def __init__(self,
+                 name,
+                 latency=0.0,
+                 jitter=0.0,
+                 clock_offset=0.0,
+                 failure_rate=0.0,
+                 random_state=None):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.clock_offset = clock_offset
+        self.failure_rate = failure_rate
+        self.random_state = random_state or numpy.random.RandomState()
+        # wall clock duration of every request [sec]
+        self.request_times = []
+        # the digitiser is commanded as ant.req.dig_noise_source(...)
+        self.req = self
+
+    def dig_noise_source(self, timestamp, on_fraction, cycle_length=1.0):
+        """Set noise diode pattern, returns (reply, informs)."""
+        delay = self.latency
+        if self.jitter > 0:
+            delay += self.random_state.normal(0.0, self.jitter)
+        delay = max(delay, 0.0)
+        if delay > 0:
+            _wallsleep(delay)
+        self.request_times.append(delay)
+        if self.random_state.uniform() < self.failure_rate:
+            reply = SimReply("dig-noise-source", ["fail", "request timed out"])
+            return reply, []
+        # pattern changes are applied at the requested time,
+        # or immediately if the request arrived late
+        if timestamp == "now":
+            timestamp = time.time()
+        applied = max(float(timestamp), time.time()) + self.clock_offset
+        reply = SimReply("dig-noise-source",
+                         ["ok", applied, float(on_fraction), float(cycle_length)])
+        return reply, []
+
+
+def parse_digitiser_options(options):
+    """Parse simulated digitiser options.
+
+    Parameters
+    ----------
+    options: str
+        Comma separated key=value pairs, with keys 'latency', 'jitter',
+        'clock_offset' (standard deviation of the per antenna offsets),
+        'failure_rate' [sec or fraction] and 'seed'
+
+    Returns
+    -------
+    options: dict
+
+    """
+    keys = ["latency", "jitter", "clock_offset", "failure_rate", "seed"]
+    parsed = {}
+    for option in options.split(","):
+        if not option.strip():
+            continue
+        key, value = [item.strip() for item in option.split("=", 1)]
+        if key not in keys:
+            raise ValueError(
+                "Unknown digitiser option {}, expected one of {}".format(key, keys)
+            )
+        parsed[key] = int(value) if key == "seed" else float(value)
+    return parsed
+
+
+def sim_digitisers(ants, latency=0.0, jitter=0.0, clock_offset=0.0,
+                   failure_rate=0.0, seed=None):
+    """Construct stand-in digitisers for a list of antennas.
+
+    Each antenna gets a fixed clock offset drawn from a normal distribution
+    with standard deviation `clock_offset`, other parameters are shared.
+
+    Returns
+    -------
+    digitisers: dict
+        Mapping of antenna names to `SimDigitiser`
+
+    """
+    random_state = numpy.random.RandomState(seed)
+    digitisers = {}
+    for ant in ants:
+        offset = random_state.normal(0.0, clock_offset) if clock_offset > 0 else 0.0
+        digitisers[ant] = SimDigitiser(
+            ant,
+            latency=latency,
+            jitter=jitter,
+            clock_offset=offset,
+            failure_rate=failure_rate,
+            random_state=numpy.random.RandomState(random_state.randint(2 ** 31)),
+        )
+    return digitisers
+
+
+def read_antenna_names(filename=_MKAT_ANTENNAS_FILE):
+    """Antenna names from an antenna position file such as mkat_antennas.yml."""
+    with open(filename) as stream:
+        data = yaml.safe_load(stream)
+    names = []
+    for antenna in data["antennas"]:
+        for item in antenna.split(","):
+            item = item.strip()
+            if item.startswith("name="):
+                names.append(item[len("name="):])
+    return names
+
+
+def synthetic_antenna_names(nants):
+    """Antenna names for a synthetic array of any size.
+
+    The first 64 antennas are named as the MeerKAT dishes m000 to m063,
+    further antennas follow as extension dishes s0000, s0001, ...
+
+    """
+    names = ["m{:03d}".format(idx) for idx in range(min(nants, _MKAT_NUM_ANTENNAS))]
+    names += ["s{:04d}".format(idx) for idx in range(nants - len(names))]
+    return names
+
+
+def sim_antenna_names(sim_antennas=None, pool_resources=None):
+    """Antennas in the simulated subarray.
+
+    Parameters
+    ----------
+    sim_antennas: str, optional
+        Number of antennas in a synthetic array, 'mkat' for the antennas in
+        astrokat/config/mkat_antennas.yml, the name of an antenna position file
+        or a comma separated list of antenna names
+    pool_resources: str or list, optional
+        Plan instrument pool resources, antenna names in it are used when
+        `sim_antennas` is not given
+
+    Returns
+    -------
+    names: list of str
+
+    """
+    if sim_antennas:
+        sim_antennas = str(sim_antennas).strip()
+        if sim_antennas.isdigit():
+            return synthetic_antenna_names(int(sim_antennas))
+        if sim_antennas == "mkat":
+            return read_antenna_names()
+        if os.path.isfile(sim_antennas):
+            return read_antenna_names(sim_antennas)
+        return [ant.strip() for ant in sim_antennas.split(",") if ant.strip()]
+    if pool_resources:
+        if not isinstance(pool_resources, list):
+            pool_resources = str(pool_resources).split(",")
+        names = [str(ant).strip() for ant in pool_resources]
+        names = [name for name in names if _ANTENNA_NAME.match(name)]
+        if names:
+            return names
+    return list(_DEFAULT_SIM_ANTENNAS)
+
+
+class SimAnt(namedtuple("SimAnt", "name")):
+    pass
+
+
 class SimKat(object):
     """Fake telescope connection."""
 
@@ -100,22 +942,39 @@ class SimKat(object):
         self.obs_params = kwargs["obs_plan_params"]
         self._lst, _ = get_lst(self.obs_params["observation_loop"][0]["LST"])
         self._sensors = self.fake_sensors(kwargs)
+        self._timeline = None
+        if kwargs.get("sensor_timeline"):
+            self._timeline = SensorTimeline.from_file(kwargs["sensor_timeline"])
+        self.sb_id_code = kwargs.get("sb_id_code")
         self._session_cnt = 0
-        self._ants = ["m011", "m022", "m033", "m044"]
+        instrument = self.obs_params.get("instrument") or {}
+        self._ants = sim_antenna_names(
+            sim_antennas=kwargs.get("sim_antennas"),
+            pool_resources=instrument.get("pool_resources"),
+        )
+        self._digitisers = {}
+        if kwargs.get("sim_digitiser"):
+            self._digitisers = sim_digitisers(
+                self._ants, **parse_digitiser_options(kwargs["sim_digitiser"])
+            )
+        # noise diode requests return KATCP replies from simulated digitisers
+        self.sim_digitisers = bool(self._digitisers)
 
     def __enter__(self):
         return self
 
     def __getattr__(self, key):
+        digitisers = self.__dict__.get("_digitisers", {})
+        if key in digitisers:
+            return digitisers[key]
         return self
 
     def __call__(self, *args, **kwargs):
         return self
 
     def __iter__(self):
-        Ant = namedtuple("Ant", ["name"])
         for ant in self._ants:
-            yield Ant(ant)
+            yield SimAnt(ant)
         return
 
     def __exit__(self, type, value, traceback):
@@ -123,8 +982,17 @@ class SimKat(object):
 
     def get(self, sensorname):
         """Get sensor name."""
+        if self._timeline is not None and sensorname in self._timeline:
+            return TimelineSensor(self._timeline, sensorname)
         return self._sensors.get(sensorname)
 
+    def sensor_value(self, sensorname, default=None):
+        """Get current sensor value, or default if the sensor is not simulated."""
+        sensor = self.get(sensorname)
+        if sensor is None:
+            return default
+        return sensor.get_value()
+
     def fake_sensors(self, kwargs):
         """Fake sensors."""
         _sensors = {}
@@ -180,6 +1048,11 @@ class SimSession(object):
 
         time.sleep = simsleep
 
+    @property
+    def inputs(self):
+        """F-engine inputs, both polarisations of each antenna."""
+        return ["{}{}".format(ant, pol) for ant in self.kat._ants for pol in "hv"]
+
     def __enter__(self):
         return self
 
@@ -210,7 +1083,7 @@ class SimSession(object):
         """Simulate data capturing initialisation (if not already done)."""
         if not self.capture_initialised:
             user_logger.info("Waiting for observation setup")
-            time.sleep(_SIM_OVERHEAD_SEC)
+            time.sleep(slew_model["sim_overhead"])
             user_logger.info('INIT')
             self.capture_initialised = True
 
@@ -308,10 +1181,7 @@ class SimSession(object):
             The elevation co-ordinate of the target in degrees.
 
         """
-        az, el = target.azel(simobserver.date)
-        az = katpoint.rad2deg(az)
-        el = katpoint.rad2deg(el)
-        return az, el
+        return azel_cache.azel(target, self.time)
 
     def _fake_slew_(self, target):
         slew_time = 0
@@ -321,7 +1191,7 @@ class SimSession(object):
                 slew_time = _DEFAULT_SLEW_TIME_SEC
             else:
                 user_logger.debug("Slewing to {}".format(target.name))
-                slew_time = self._slew_time(az, el)
+                slew_time = azel_cache.slew_time(self.katpt_current, target, self.time)
             self.katpt_current = target
         return slew_time, az, el
 
@@ -342,50 +1212,7 @@ class SimSession(object):
 
         """
         current_az, current_el = self._target_azel(self.katpt_current)
-
-        az_dist = numpy.abs(new_az - current_az)
-        el_dist = numpy.abs(new_el - current_el)
-
-        # wrap angle into +-180, ignoring receptor cable wrapping
-        if az_dist > 180.0:
-            az_dist = numpy.abs((az_dist + 180.) % 360. - 180.)
-
-        # Time, t, to accelerate to full speed: v = u + at
-        t_el = (_EL_SPEED_DEG_PER_SEC - 0.0) / _EL_ACCEL_DEG_PER_SEC_SQ
-        t_az = (_AZ_SPEED_DEG_PER_SEC - 0.0) / _AZ_ACCEL_DEG_PER_SEC_SQ
-        # Corresponding displacement to accelerate
-        # up to full speed:  s = ut + (at^2)/2
-        s_el = 0.0 * t_el + (_EL_ACCEL_DEG_PER_SEC_SQ * t_el ** 2) / 2.0
-        s_az = 0.0 * t_az + (_AZ_ACCEL_DEG_PER_SEC_SQ * t_az ** 2) / 2.0
-
-        # The factors of 2 account for acceleration and deceleration
-        # i.e., ramping up to full speed, and then ramping down to stop
-        if el_dist > 2.0 * s_el:
-            el_left = el_dist - 2.0 * s_el
-            el_slew_time = 2.0 * t_el + el_left / _EL_SPEED_DEG_PER_SEC
-            if el_left > _EL_LONG_SLEW_DEG:
-                el_slew_time = el_slew_time + _EL_LONG_SLEW_SETTLE_TIME_SEC
-        else:
-            # Time taken to cover distance: s = ut + (at^2)/2
-            s_el = el_dist / 2.0
-            el_slew_time = 2.0 * 2.0 * numpy.sqrt(s_el / _EL_ACCEL_DEG_PER_SEC_SQ)
-
-        # The factors of 2 account for acceleration and deceleration
-        if az_dist > 2.0 * s_az:
-            az_left = az_dist - 2.0 * s_az
-            az_slew_time = 2.0 * t_az + az_left / _AZ_SPEED_DEG_PER_SEC
-            if az_left > _AZ_LONG_SLEW_DEG:
-                az_slew_time = az_slew_time + _AZ_LONG_SLEW_SETTLE_TIME_SEC
-        else:
-            # Time taken to cover distance: s = ut + (at^2)/2
-            s_az = az_dist / 2.0
-            az_slew_time = 2.0 * 2.0 * numpy.sqrt(s_az / _AZ_ACCEL_DEG_PER_SEC_SQ)
-
-        # Add additional overhead between initialising and slewing
-        az_slew_time += _SLEW_INIT_OVERHEAD
-        el_slew_time += _SLEW_INIT_OVERHEAD
-
-        return max([az_slew_time, el_slew_time])
+        return float(slew_time(current_az, current_el, new_az, new_el))
 
 
 def start_session(kat, **kwargs):
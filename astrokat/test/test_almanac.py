@@ -0,0 +1,94 @@
+"""Test precomputed rise and set times of catalogue sources."""
+from __future__ import absolute_import
+
+import ephem
+import katpoint
+import mock
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import datetime
+
+from astrokat import almanac
+from astrokat.observatory import get_ref_location
+
+_CATALOGUE = """\
+J0408-6545 | 0408-658, radec bpcal fluxcal, 04:08:20.38, -65:45:09.6
+J1331+3030 | 3C286, radec bpcal fluxcal, 13:31:08.288, +30:30:32.959
+J1939-6342 | 1934-638, radec bpcal fluxcal, 19:39:25.05, -63:42:43.63
+J2148+0657 | 2145+067, radec gaincal, 21:48:05.46, +06:57:38.6
+"""
+
+
+class TestAlmanac(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.catalogue = os.path.join(self.directory, "Lband-test-calibrators.csv")
+        with open(self.catalogue, "w") as fout:
+            fout.write(_CATALOGUE)
+        self.filename = os.path.join(self.directory, "almanac.npz")
+        self.start = datetime(2027, 3, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_matches_ephem(self):
+        almanac_ = almanac.Almanac.build([self.catalogue], start=self.start, days=10)
+        self.assertEqual(almanac_.days, 10)
+        self.assertIn("3C286", almanac_)
+        observer = katpoint.Antenna(get_ref_location()).observer
+        observer.horizon = ephem.degrees("20.0")
+        body = ephem.FixedBody()
+        body._epoch = ephem.J2000
+        rng = numpy.random.RandomState(7)
+        for timestamp in almanac_.start + rng.uniform(0.0, 8.0 * 86400.0, 20):
+            for idx, name in enumerate(almanac_.names):
+                rise, set_ = almanac_.next_rise_set(name, timestamp)
+                body._ra, body._dec = almanac_.ra[idx], almanac_.dec[idx]
+                observer.date = almanac.timestamp2date(timestamp)
+                rise_time = observer.next_rising(body)
+                set_time = observer.next_setting(body, start=rise_time)
+                self.assertAlmostEqual(rise, (rise_time - 25567.5) * 86400.0,
+                                       delta=1.0)
+                self.assertAlmostEqual(set_, (set_time - 25567.5) * 86400.0,
+                                       delta=1.0)
+        # queries outside the date range have no answer
+        self.assertEqual(almanac_.next_rise_set("3C286", almanac_.start - 1.0),
+                         (None, None))
+        with self.assertRaises(ValueError):
+            almanac_.events_on(datetime(2027, 4, 1))
+
+    def test_rebuilt_on_catalogue_change(self):
+        built = almanac.load_almanac(self.filename, [self.catalogue],
+                                     date=self.start, days=3)
+        with mock.patch.object(almanac.Almanac, "build") as build:
+            loaded = almanac.load_almanac(self.filename, [self.catalogue],
+                                          date=self.start)
+            build.assert_not_called()
+        self.assertEqual(loaded.names, built.names)
+        self.assertEqual(loaded.aliases, built.aliases)
+        for event in ["rise", "transit", "set"]:
+            numpy.testing.assert_array_equal(loaded.events[event], built.events[event])
+        numpy.testing.assert_array_equal(loaded.events_on(self.start)["set"],
+                                         built.events_on(self.start)["set"])
+        with open(self.catalogue, "a") as fout:
+            fout.write("J0010-4153 | 0008-421, radec gaincal, 00:10:52.52, -41:53:10.8\n")
+        rebuilt = almanac.load_almanac(self.filename, [self.catalogue],
+                                       date=self.start, days=3)
+        self.assertEqual(len(rebuilt.names), len(built.names) + 1)
+        self.assertNotEqual(rebuilt.catalogue_hash, built.catalogue_hash)
+
+    def test_matches(self):
+        almanac_ = almanac.Almanac.build([self.catalogue], start=self.start, days=1)
+        location = get_ref_location()
+        target = katpoint.Target("3C286, radec, 13:31:08.288, +30:30:32.959")
+        self.assertTrue(almanac_.matches(target, location, 20.0))
+        self.assertFalse(almanac_.matches(target, location, 15.0))
+        other_location = "other, -30:00:00.0, 21:00:00.0, 1000.0"
+        self.assertFalse(almanac_.matches(target, other_location, 20.0))
+        # same name at another position is a different source
+        moved = katpoint.Target("3C286, radec, 13:31:08.288, +31:30:32.959")
+        self.assertFalse(almanac_.matches(moved, location, 20.0))
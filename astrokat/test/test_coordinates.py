@@ -0,0 +1,97 @@
+"""Test vectorised coordinate conversions against ephem and katpoint."""
+from __future__ import absolute_import
+
+import ephem
+import katpoint
+import numpy
+import unittest
+
+from astrokat import coordinates
+
+# Stated agreement with ephem, see astrokat/coordinates.py
+_TOLERANCE = 1.0 / 3600.  # deg
+_UNIX_EPOCH_DATE = 25567.5
+
+
+class TestCoordinates(unittest.TestCase):
+    def setUp(self):
+        rng = numpy.random.RandomState(42)
+        self.ra = rng.uniform(0.0, 2.0 * numpy.pi, 200)
+        self.dec = numpy.arcsin(rng.uniform(-1.0, 1.0, 200))
+        # 1995 to 2045
+        self.timestamps = rng.uniform(788918400.0, 2366841600.0, 200)
+        self.antenna = katpoint.Antenna("ref, -30:42:39.8, 21:26:38.0, 1035.0, 0.0")
+        self.observer = self.antenna.observer
+
+    def _ephem_positions(self, observer):
+        az, el, ra, dec = [], [], [], []
+        body = ephem.FixedBody()
+        body._epoch = ephem.J2000
+        for ra_, dec_, timestamp in zip(self.ra, self.dec, self.timestamps):
+            body._ra, body._dec = ra_, dec_
+            observer.date = ephem.Date(timestamp / 86400.0 + _UNIX_EPOCH_DATE)
+            body.compute(observer)
+            az.append(body.az)
+            el.append(body.alt)
+            ra.append(body.g_ra)
+            dec.append(body.g_dec)
+        return [numpy.array(values) for values in [az, el, ra, dec]]
+
+    def test_sidereal_time(self):
+        lst = coordinates.local_sidereal_time(self.timestamps, float(self.observer.lon))
+        expected = self.antenna.local_sidereal_time(self.timestamps)
+        diff = numpy.angle(numpy.exp(1j * (lst - expected)))
+        # 0.01 sec of time
+        self.assertLess(numpy.abs(diff).max(), 2.0 * numpy.pi * 0.01 / 86400.0)
+
+    def test_matches_ephem(self):
+        az, el, ha, pa = coordinates.radec_to_azel(self.ra,
+                                                   self.dec,
+                                                   self.timestamps,
+                                                   float(self.observer.lon),
+                                                   float(self.observer.lat))
+        observer = self.observer.copy()
+        ephem_az, ephem_el, ephem_ra, ephem_dec = self._ephem_positions(observer)
+        app_ra, app_dec = coordinates.apparent_radec(self.ra, self.dec, self.timestamps)
+        d_ra = numpy.angle(numpy.exp(1j * (app_ra - ephem_ra))) * numpy.cos(ephem_dec)
+        self.assertLess(numpy.degrees(numpy.abs(d_ra)).max(), _TOLERANCE)
+        self.assertLess(numpy.degrees(numpy.abs(app_dec - ephem_dec)).max(), _TOLERANCE)
+        d_az = numpy.angle(numpy.exp(1j * (az - ephem_az))) * numpy.cos(ephem_el)
+        self.assertLess(numpy.degrees(numpy.abs(d_az)).max(), _TOLERANCE)
+        self.assertLess(numpy.degrees(numpy.abs(el - ephem_el)).max(), _TOLERANCE)
+        self.assertTrue((numpy.abs(ha) <= numpy.pi).all())
+
+    def test_parallactic_angle(self):
+        target = katpoint.Target("a, radec, 10:00:00, -30:00:00", antenna=self.antenna)
+        timestamps = 1573714800.0 + numpy.arange(0.0, 86400.0, 3600.0)
+        ra, dec = target.radec()
+        _, el, _, pa = coordinates.radec_to_azel(float(ra),
+                                                 float(dec),
+                                                 timestamps,
+                                                 float(self.observer.lon),
+                                                 float(self.observer.lat))
+        expected = target.parallactic_angle(timestamps)
+        # the angle is ill-conditioned close to the zenith
+        low = el < numpy.radians(80.0)
+        numpy.testing.assert_allclose(numpy.angle(numpy.exp(1j * (pa - expected)))[low],
+                                      0.0,
+                                      atol=numpy.radians(_TOLERANCE))
+
+    def test_refraction(self):
+        observer = self.observer.copy()
+        observer.pressure = 1010.0
+        observer.temp = 10.0
+        _, el, _, _ = coordinates.radec_to_azel(self.ra,
+                                                self.dec,
+                                                self.timestamps,
+                                                float(observer.lon),
+                                                float(observer.lat),
+                                                pressure=observer.pressure,
+                                                temperature=observer.temp)
+        _, ephem_el, _, _ = self._ephem_positions(observer)
+        # ephem switches to another inversion close to the horizon
+        up = ephem_el > numpy.radians(1.0)
+        self.assertGreater(up.sum(), 0)
+        self.assertLess(numpy.degrees(numpy.abs(el[up] - ephem_el[up])).max(), _TOLERANCE)
+        self.assertEqual(coordinates.refract(numpy.radians(45.0), 0.0),
+                         numpy.radians(45.0))
@@ -0,0 +1,75 @@
+"""Test interpolated ephemerides of moving bodies."""
+from __future__ import absolute_import
+
+import ephem
+import katpoint
+import mock
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+from astrokat import ephemeris
+
+_UNIX_EPOCH_DATE = 25567.5
+
+
+class TestEphemerisCache(unittest.TestCase):
+    def setUp(self):
+        antenna = katpoint.Antenna("ref, -30:42:39.8, 21:26:38.0, 1035.0, 0.0")
+        self.observer = antenna.observer
+        self.timestamps = 1573714800.0 + numpy.linspace(0.0, 2.5 * 86400.0, 97)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_matches_ephem(self):
+        cache = ephemeris.EphemerisCache(accuracy=0.5)
+        observer = self.observer.copy()
+        for body in [ephem.Sun(), ephem.Moon(), ephem.Jupiter()]:
+            az, el, _, _ = cache.azel(body, observer, self.timestamps)
+            for col, timestamp in enumerate(self.timestamps):
+                observer.date = ephem.Date(timestamp / 86400.0 + _UNIX_EPOCH_DATE)
+                body.compute(observer)
+                self.assertAlmostEqual(el[col], body.alt, delta=numpy.radians(1.0 / 3600))
+                self.assertAlmostEqual(numpy.cos(az[col] - body.az), 1.0, delta=1e-10)
+
+    def test_persisted_days(self):
+        cache = ephemeris.EphemerisCache(directory=self.directory)
+        ra, dec = cache.radec(ephem.Moon(), self.observer, self.timestamps)
+        # three UTC days are fitted and saved
+        loaded = ephemeris.EphemerisCache(directory=self.directory)
+        with mock.patch.object(loaded, "_fit_day_") as fit_day:
+            ra_, dec_ = loaded.radec(ephem.Moon(), self.observer, self.timestamps)
+            fit_day.assert_not_called()
+        numpy.testing.assert_array_equal(ra, ra_)
+        numpy.testing.assert_array_equal(dec, dec_)
+        # saved days are refitted if less accurate than requested
+        strict = ephemeris.EphemerisCache(accuracy=0.1, directory=self.directory)
+        with mock.patch.object(strict, "_fit_day_", wraps=strict._fit_day_) as fit_day:
+            strict.radec(ephem.Moon(), self.observer, self.timestamps[:1])
+            self.assertEqual(fit_day.call_count, 1)
+
+    def test_cache_directory(self):
+        self.addCleanup(ephemeris.set_cache_directory,
+                        ephemeris.ephemeris_cache.directory)
+        self.addCleanup(ephemeris.ephemeris_cache.clear)
+        ephemeris.set_cache_directory(self.directory)
+        ephemeris.ephemeris_cache.radec(ephem.Sun(), self.observer, self.timestamps[:1])
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    def test_above_horizon(self):
+        from astrokat import observe_main
+
+        observer = self.observer.copy()
+        sun = katpoint.Target("Sun, special").body
+        with mock.patch("time.time", return_value=self.timestamps[0]):
+            up = observe_main.above_horizon(sun, observer, horizon=20.0, duration=600.0)
+        expected = True
+        for timestamp in [self.timestamps[0], self.timestamps[0] + 600.0]:
+            observer.date = ephem.Date(timestamp / 86400.0 + _UNIX_EPOCH_DATE)
+            sun.compute(observer)
+            expected = expected and sun.alt > numpy.radians(20.0)
+        self.assertEqual(up, expected)
@@ -0,0 +1,154 @@
+"""Test noise diode command helpers."""
+from __future__ import absolute_import
+
+import mock
+import numpy
+import time
+import unittest
+
+from astrokat import noisediode, _DEFAULT_LEAD_TIME
+
+
+class TestAdaptiveLeadTime(unittest.TestCase):
+    def setUp(self):
+        noisediode.nd_latency.reset()
+
+    def tearDown(self):
+        noisediode.nd_latency.reset()
+
+    def test_fixed_lead_time(self):
+        self.assertEqual(noisediode.get_lead_time(), _DEFAULT_LEAD_TIME)
+        self.assertEqual(noisediode.get_lead_time({"cycle_len": 10.0}),
+                         _DEFAULT_LEAD_TIME)
+        self.assertEqual(noisediode.get_lead_time({"lead_time": 5.0}), 5.0)
+
+    def test_auto_lead_time(self):
+        nd_setup = {"lead_time": "auto", "lead_time_margin": 0.25}
+        # default until enough commands have been measured
+        noisediode.nd_latency.add(0.1)
+        self.assertEqual(noisediode.get_lead_time(nd_setup), _DEFAULT_LEAD_TIME)
+        noisediode.nd_latency.add(0.3)
+        noisediode.nd_latency.add(0.2)
+        self.assertAlmostEqual(noisediode.get_lead_time(nd_setup), 0.55)
+        self.assertAlmostEqual(noisediode.get_lead_time({"lead_time": "auto"}),
+                               0.3 + noisediode._LEAD_TIME_MARGIN)
+
+    def test_latency_window(self):
+        latency = noisediode.CommandLatency(window=3)
+        for sample in [2.0, 0.1, 0.1, 0.1]:
+            latency.add(sample)
+        self.assertAlmostEqual(latency.lead_time(margin=0.0), 0.1)
+
+
+class TestNoiseDiodeState(unittest.TestCase):
+    def test_state_tracking(self):
+        state = noisediode.NoiseDiodeState()
+        ants = ["m011", "m022"]
+        self.assertFalse(state.is_set(ants, 0, 1.0))
+        state.update(ants, 0, 1)
+        self.assertTrue(state.is_set(ants, 0, 1.0))
+        state.update(["m022"], 0.5, 10.0)
+        self.assertFalse(state.is_set(ants, 0, 1.0))
+        self.assertTrue(state.is_set(["m022"], 0.5, 10))
+        self.assertFalse(state.is_set([], 0, 1.0))
+        # sync mode and start offsets are part of the setting
+        state.update(ants, 0.5, 10.0, cycle=True)
+        self.assertTrue(state.is_set(ants, 0.5, 10.0, cycle=True))
+        self.assertFalse(state.is_set(ants, 0.5, 10.0))
+        self.assertEqual(state.antennas["m022"], (0.5, 10.0, 5.0))
+        state.forget(["m022"])
+        self.assertFalse(state.is_set(["m022"], 0.5, 10.0, cycle=True))
+        state.restore = {"cycle_len": 10.0}
+        state.reset()
+        self.assertFalse(state.is_set(["m011"], 0, 1.0))
+        self.assertIsNone(state.restore)
+
+    def test_skipped_off_waits(self):
+        kat = mock.Mock(dry_run=True)
+        kat.ants = [mock.Mock(), mock.Mock()]
+        kat.ants[0].name, kat.ants[1].name = "m011", "m022"
+        state = noisediode.NoiseDiodeState()
+        state.update(["m011", "m022"], 0, 1.0)
+        with mock.patch.object(noisediode, "nd_state", state), \
+                mock.patch.object(noisediode, "wait_until") as wait_until, \
+                mock.patch.object(noisediode, "_switch_on_off_") as switch:
+            self.assertEqual(noisediode.off(kat, timestamp=123.0), 123.0)
+        switch.assert_not_called()
+        wait_until.assert_called_once_with(kat, 123.0)
+
+
+class TestDumpAlignment(unittest.TestCase):
+    def tearDown(self):
+        noisediode.set_dump_timing(None)
+
+    def test_dump_aligned(self):
+        aligned = noisediode.dump_aligned([10.0, 10.2, 10.25, 10.3], 0.5, dump_epoch=0.1)
+        numpy.testing.assert_allclose(aligned, [10.35, 10.35, 10.35, 10.35])
+        self.assertAlmostEqual(float(noisediode.dump_aligned(10.36, 0.5, 0.1)), 10.85)
+
+    def test_trigger_edges(self):
+        self.assertEqual(noisediode.trigger_edges(100.0, 5.0), (100.0, 105.0))
+        self.assertEqual(noisediode.trigger_edges(200.0, 0.1), (200.0, 200.1))
+        noisediode.set_dump_timing(2.0, 0.0)
+        self.assertEqual(noisediode.trigger_edges(100.0, 5.2), (101.0, 107.0))
+        # whole number of dumps, at least one
+        self.assertEqual(noisediode.trigger_edges(200.5, 0.1), (201.0, 203.0))
+
+
+class TestDeadlineTimer(unittest.TestCase):
+    def test_wait_until(self):
+        # every clock reading advances the fake clock by one spin tick
+        clock = {"now": 50.0}
+        sleeps = []
+
+        def read_clock():
+            now = clock["now"]
+            clock["now"] += 0.125
+            return now
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock["now"] += seconds
+
+        timer = noisediode.DeadlineTimer(clock=read_clock, sleep=sleep, spin=0.5)
+        with mock.patch.object(noisediode.time, "time", return_value=1000.0):
+            overshoot = timer.wait_until(1002.0)
+            # coarse sleep up to the spin, then poll the clock past the deadline
+            self.assertEqual(sleeps, [1.5])
+            self.assertEqual(overshoot, 0.125)
+            # passed deadlines return at once, overshoot is the lateness
+            self.assertEqual(timer.wait_until(999.0), 1.25)
+        self.assertEqual(sleeps, [1.5])
+        self.assertEqual(list(timer.overshoot), [0.125, 1.25])
+
+    def test_replace_clock(self):
+        clock = {"now": 100.0}
+
+        def sleep(seconds):
+            clock["now"] += seconds
+
+        timer = noisediode.DeadlineTimer(clock=lambda: clock["now"], sleep=sleep, spin=0)
+        overshoot = timer.wait_until(time.time() + 5.0)
+        self.assertAlmostEqual(clock["now"], 105.0, places=2)
+        self.assertAlmostEqual(overshoot, 0.0, places=2)
+
+
+class TestSwitchTiming(unittest.TestCase):
+    def test_switch_timing(self):
+        requested = [100.0, 100.0, 200.0, 200.0]
+        reported = [100.1, 100.3, 200.25, 200.2]
+        timing = noisediode.switch_timing(requested,
+                                          reported,
+                                          [0, 0, 1, 1],
+                                          dump_period=0.5,
+                                          dump_epoch=0.0,
+                                          track_starts=[104.0, 195.0])
+        numpy.testing.assert_allclose(timing["offset"], [0.1, 0.3, 0.25, 0.2])
+        numpy.testing.assert_allclose(timing["skew"], [0.2, 0.2, 0.05, 0.05])
+        numpy.testing.assert_allclose(timing["dump_distance"], [0.1, 0.2, 0.25, 0.2])
+        numpy.testing.assert_allclose(timing["track_distance"],
+                                      [3.9, 3.7, -5.25, -5.2])
+        # unknown dump timing
+        timing = noisediode.switch_timing(requested, reported, [0, 0, 1, 1])
+        self.assertTrue(numpy.isnan(timing["dump_distance"]).all())
+        self.assertTrue(numpy.isnan(timing["track_distance"]).all())
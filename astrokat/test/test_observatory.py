@@ -0,0 +1,155 @@
+"""Test observatory rise and set calculations."""
+from __future__ import absolute_import
+
+import ephem
+import katpoint
+import mock
+import numpy
+import unittest
+
+from astrokat import observatory
+
+
+class TestMemoisedObservatory(unittest.TestCase):
+    def setUp(self):
+        self.date = ephem.Date("2018/8/6 12:34")
+        self.body = katpoint.Target("a, radec, 1:38:13.25, -42:37:41").body
+
+    def test_shared_observatory(self):
+        obs = observatory.get_observatory(horizon=20.0, datetime=self.date)
+        self.assertIs(observatory.get_observatory(horizon=20.0, datetime=self.date), obs)
+        self.assertIsNot(observatory.get_observatory(horizon=15.0, datetime=self.date),
+                         obs)
+
+    def test_memoised_rise_set(self):
+        obs = observatory.get_observatory(horizon=20.0, datetime=self.date)
+        rise_lst = obs._ephem_risetime_(self.body)
+        set_lst = obs._ephem_settime_(self.body)
+        # queries do not change the observer date
+        self.assertEqual(obs.observer.date, self.date)
+        observatory._rise_set_cache.clear()
+        fresh = observatory.Observatory(horizon=20.0, datetime=self.date)
+        self.assertEqual(rise_lst, fresh._ephem_risetime_(self.body))
+        self.assertEqual(set_lst, fresh._ephem_settime_(self.body))
+        hits = observatory._rise_set_cache.hits
+        self.assertEqual(obs._ephem_risetime_(self.body), rise_lst)
+        self.assertEqual(observatory._rise_set_cache.hits, hits + 1)
+
+
+class TestVectorisedRiseSet(unittest.TestCase):
+    def setUp(self):
+        self.obs = observatory.Observatory(datetime=ephem.Date("2019/11/14 07:00"))
+
+    def test_rise_set_matches_ephem(self):
+        ra = numpy.radians([15.0, 100.0, 200.0, 330.0])
+        dec = numpy.radians([-45.0, 10.0, -80.0, 60.0])
+        times = self.obs.rise_set(ra, dec)
+        numpy.testing.assert_array_equal(times["always_up"], [False, False, True, False])
+        numpy.testing.assert_array_equal(times["never_up"], [False, False, False, True])
+        for idx in [0, 1]:
+            body = ephem.FixedBody()
+            body._ra, body._dec = ra[idx], dec[idx]
+            observer = self.obs.observer.copy()
+            for event, ephem_time in [("rise", observer.next_rising(body)),
+                                      ("set", observer.next_setting(body)),
+                                      ("transit", observer.next_transit(body))]:
+                self.assertAlmostEqual(times["{}_utc".format(event)][idx],
+                                       float(ephem_time),
+                                       delta=1.0 / 86400)
+        self.assertTrue(numpy.isnan(times["rise_lst"][2:]).all())
+
+    def test_start_end_obs(self):
+        targets = ["name=t1, radec=1:00:00 -45:00:00, tags=target",
+                   "name=t2, radec=7:00:00 -30:00:00, tags=target",
+                   "name=t3, azel=10 40, tags=target"]
+        self.assertAlmostEqual(float(self.obs.start_obs(targets[:2])), 1.458, delta=0.002)
+        self.assertAlmostEqual(float(self.obs.end_obs(targets[:2])), 12.568, delta=0.002)
+        # no rise or set for fixed azel positions
+        self.assertEqual(self.obs.start_obs(targets, str_flag=True), "0:00:01.00")
+
+
+class TestNodeConfig(unittest.TestCase):
+    def test_without_katconf(self):
+        with mock.patch.dict("sys.modules", {"katconf": None}):
+            with mock.patch.object(observatory, "_node_config", None), \
+                    mock.patch("os.path.isdir") as isdir:
+                self.assertEqual(observatory.get_ref_location(),
+                                 observatory._DEFAULT_REF_LOCATION)
+                self.assertFalse(observatory.Observatory().node_config_available)
+                # no node config probing without katconf
+                isdir.assert_not_called()
+
+
+class TestBuildCatalogue(unittest.TestCase):
+    def setUp(self):
+        default = katpoint.Catalogue(["PKS 1934-63, radec, 19:39:25.03, -63:42:45.7"])
+        self.kat = mock.Mock()
+        self.kat.sources.__getitem__ = mock.Mock(side_effect=default.__getitem__)
+
+    def test_build_catalogue(self):
+        targets = ["t1, radec target, 1:00:00, -45:00:00",
+                   "PKS 1934-63",
+                   "unknown",
+                   "t2, radec target, 7:00:00, -30:00:00",
+                   "t1, radec target, 1:00:00, -45:00:00",
+                   "PKS 1934-63"]
+        catalogue = observatory.build_catalogue(self.kat, targets)
+        self.assertEqual([target.name for target in catalogue],
+                         ["t1", "PKS 1934-63", "t2"])
+        # one lookup per name in the default catalogue
+        self.assertEqual(self.kat.sources.__getitem__.call_count, 2)
+        observatory.build_catalogue(self.kat, ["PKS 1934-63"])
+        self.assertEqual(self.kat.sources.__getitem__.call_count, 2)
+        # names not found are looked up again
+        observatory.build_catalogue(self.kat, ["PKS 1934-63", "unknown"])
+        self.assertEqual(self.kat.sources.__getitem__.call_count, 3)
+        # other connections have their own cache
+        other_kat = mock.Mock()
+        other_kat.sources.__getitem__ = mock.Mock(return_value=None)
+        with self.assertRaises(ValueError):
+            observatory.build_catalogue(other_kat, ["PKS 1934-63"])
+
+    def test_collect_targets_order(self):
+        with mock.patch.object(observatory, "open", create=True,
+                               side_effect=IOError) as open_:
+            catalogue = observatory.collect_targets(
+                self.kat, ["t1, radec target, 1:00:00, -45:00:00", "PKS 1934-63"])
+        # descriptions are not tried as catalogue files
+        open_.assert_called_once_with("PKS 1934-63")
+        self.assertEqual([target.name for target in catalogue], ["t1", "PKS 1934-63"])
+
+
+class TestSkyPositions(unittest.TestCase):
+    def test_matches_ephem(self):
+        obs = observatory.Observatory()
+        targets = [katpoint.Target("a, radec, 10:00:00, -30:00:00"),
+                   katpoint.Target("Sun, special"),
+                   katpoint.Target("c, azel, 20, 40")]
+        timestamps = 1573714800.0 + numpy.arange(0.0, 86400.0, 3600.0)
+        positions = obs.sky_positions(targets, timestamps)
+        for key in ["az", "el", "ha", "pa"]:
+            self.assertEqual(positions[key].shape, (3, 24))
+        observer = obs.observer.copy()
+        for idx, target in enumerate(targets):
+            for col in [0, 7, 15]:
+                observer.date = ephem.Date(timestamps[col] / 86400.0 + 25567.5)
+                target.body.compute(observer)
+                self.assertAlmostEqual(positions["el"][idx, col],
+                                       numpy.degrees(target.body.alt),
+                                       delta=1.0 / 3600)
+                d_az = numpy.radians(positions["az"][idx, col]) - target.body.az
+                self.assertAlmostEqual(numpy.cos(d_az), 1.0, delta=1e-9)
+        # fixed azel pointing does not move
+        numpy.testing.assert_allclose(positions["el"][2], 40.0)
+        self.assertTrue((numpy.abs(positions["ha"]) <= 12.0).all())
+
+    def test_few_positions(self):
+        obs = observatory.Observatory()
+        targets = [katpoint.Target("a, radec, 10:00:00, -30:00:00")]
+        timestamps = 1573714800.0 + numpy.arange(0.0, 86400.0, 3600.0)
+        positions = obs.sky_positions(targets, timestamps)
+        # visibility checks of a single target are computed by ephem
+        few = obs.sky_positions(targets, timestamps[[3, 9]])
+        for key in ["az", "el", "ha", "pa"]:
+            numpy.testing.assert_allclose(few[key], positions[key][:, [3, 9]],
+                                          atol=1.0 / 3600)
@@ -4,7 +4,7 @@ from __future__ import print_function
 
 import unittest
 
-from mock import patch
+from mock import Mock, patch
 
 from .testutils import LoggedTelescope, execute_observe_main
 
@@ -162,3 +162,34 @@ class TestAstrokatYAML(unittest.TestCase):
         self.assertIn(
             expected_results, result, "J1833-2103 skipped"
         )
+
+
+class TestSubarraySetup(unittest.TestCase):
+    """Tests instrument checks against subarray sensors."""
+
+    def test_all_errors_reported(self):
+        from astrokat import observe_main
+        from astrokat.simulate import Fakr
+
+        sensors = {"approved_schedule": Fakr(["20191114-0001"]),
+                   "sub_band": Fakr("l"),
+                   "sub_product": Fakr("c856M4k"),
+                   "sub_pool_resources": Fakr("m011,m022")}
+        instrument = {"band": "u",
+                      "product": "c856M4k",
+                      "pool_resources": "m011,m033",
+                      "dump_rate": 0.25}
+        array = Mock()
+        array.sb_id_code = "20191114-0001"
+        array.sched.sensor.get = sensors.get
+        array.sensor.get = sensors.get
+        telescope = observe_main.Telescope.__new__(observe_main.Telescope)
+        telescope.array = array
+        telescope.opts = Mock(obs_plan_params={"instrument": instrument})
+        with self.assertRaises(RuntimeError) as context:
+            telescope.subarray_setup(instrument)
+        errors = str(context.exception).split("\n")
+        self.assertEqual(len(errors), 3)
+        self.assertIn("sub_dump_rate could not be read", errors[0])
+        self.assertTrue(any("sub_band error" in error for error in errors))
+        self.assertTrue(any("m033 required" in error for error in errors))
@@ -0,0 +1,82 @@
+"""Test astrokat observation plan analysis."""
+from __future__ import absolute_import
+
+import mock
+import unittest
+
+from astrokat import planning
+
+
+class TestRunSummary(unittest.TestCase):
+    def test_cadence_misses(self):
+        self.assertEqual(planning.cadence_misses([0.0, 100.0, 200.0], 100.0, 300.0), 0)
+        self.assertEqual(planning.cadence_misses([0.0, 350.0], 100.0, 400.0), 2)
+        self.assertEqual(planning.cadence_misses([0.0, 350.0], -1, 400.0), 0)
+        self.assertEqual(planning.cadence_misses([], 100.0, 400.0), 0)
+
+    def test_run_summary(self):
+        cycle = {
+            "start_time": 0.0,
+            "total_obs_time": 400.0,
+            "targets": {
+                "a": {"obs_cntr": 2, "on_source": 60.0, "cadence": 100.0,
+                      "visits": [0.0, 350.0]},
+                "b": {"obs_cntr": 0, "on_source": 0.0, "cadence": -1,
+                      "visits": []},
+            },
+        }
+        summary = planning.run_summary([cycle, cycle])
+        self.assertEqual(summary["total_obs_time"], 800.0)
+        self.assertEqual(summary["targets"]["a"],
+                         {"on_source": 120.0, "obs_cntr": 4, "cadence_misses": 4,
+                          "last_observed": 350.0})
+        statistics = planning.sweep_statistics([summary, {"total_obs_time": 0.0,
+                                                          "targets": {}}])
+        self.assertEqual(statistics["targets"]["a"]["skipped"], 1)
+        self.assertEqual(statistics["targets"]["b"]["skipped"], 2)
+
+
+class TestCampaign(unittest.TestCase):
+    def test_remaining_plan(self):
+        obs_plan_params = {
+            "observation_loop": [
+                {"LST": "0:00-12:00",
+                 "target_list": ["name=a, radec=0 -30, tags=target, duration=10.0",
+                                 "name=b, radec=1 -30, tags=target, duration=10.0"]},
+                {"LST": "12:00-0:00",
+                 "target_list": ["name=a, radec=0 -30, tags=target, duration=10.0"]},
+            ]
+        }
+        remaining = planning.remaining_plan(obs_plan_params, set(["a"]))
+        self.assertEqual(len(remaining["observation_loop"]), 1)
+        self.assertEqual(remaining["observation_loop"][0]["target_list"],
+                         ["name=b, radec=1 -30, tags=target, duration=10.0"])
+        # the original plan is left untouched
+        self.assertEqual(len(obs_plan_params["observation_loop"][0]["target_list"]), 2)
+
+    def test_state_continues(self):
+        obs_plan_params = {
+            "observation_loop": [
+                {"LST": "0:00-12:00",
+                 "target_list": ["name=a, radec=0 -30, tags=target, duration=10.0, "
+                                 "cadence=100.0"]},
+            ]
+        }
+
+        def night(plan, start_time, obs_duration, target_state=None):
+            return [{"start_time": start_time,
+                     "total_obs_time": obs_duration,
+                     "targets": {"a": {"obs_cntr": 1, "on_source": 10.0,
+                                       "cadence": 100.0,
+                                       "visits": [start_time + 50.0]}}}]
+
+        with mock.patch.object(planning, "simulate_plan", side_effect=night) as sim, \
+                mock.patch.object(planning.simulate, "set_azel_cache"), \
+                mock.patch.object(planning.simulate, "azel_cache"):
+            state = planning.campaign(obs_plan_params, [(0.0, 100.0), (1000.0, 100.0)])
+        self.assertIsNone(sim.call_args_list[0][1]["target_state"].get("a"))
+        # the second night starts from the counters of the first
+        self.assertEqual(sim.call_args_list[1][1]["target_state"]["a"],
+                         {"obs_cntr": 1, "last_observed": 50.0})
+        self.assertEqual(state["targets"]["a"],
+                         {"on_source": 20.0, "obs_cntr": 2, "last_observed": 1050.0})
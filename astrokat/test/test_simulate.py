@@ -2,6 +2,12 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import json
+import logging
+import os
+import shutil
+import tempfile
+import timeit
 import unittest
 
 from collections import namedtuple
@@ -10,6 +16,7 @@ from datetime import datetime
 import ephem
 import katpoint
 import mock
+import numpy
 
 from astrokat import simulate, observatory
 
@@ -20,7 +27,7 @@ class TestSimSession(unittest.TestCase):
         observer = ephem.Observer()
         observer.date = ephem.Date(start_time)
         simulate.setobserver(observer)
-        self.antenna = katpoint.Antenna(observatory._ref_location)
+        self.antenna = katpoint.Antenna(observatory.get_ref_location())
         self.mock_kat = mock.Mock()
         self.mock_kat.obs_params = {"durations": {"start_time": start_time}}
         self.DUT = simulate.SimSession(self.mock_kat)
@@ -74,3 +81,298 @@ class TestSimSession(unittest.TestCase):
             self.DUT._fake_slew_(initial_target)
             slew_time = self.DUT._slew_time(test.az2, test.el2)
             self.assertAlmostEqual(slew_time, test.slew_time, places=2)
+
+    def test_slew_time_matrix_matches_pairwise_slew_time(self):
+        az = [0.0, 0.5, 20.0, -180.0, 275.0]
+        el = [40.0, 40.0, 45.0, 60.0, 20.0]
+        slew_times = simulate.slew_time_matrix(az, el)
+        self.assertEqual(slew_times.shape, (5, 5))
+        for i in range(len(az)):
+            for j in range(len(az)):
+                self.assertAlmostEqual(
+                    slew_times[i, j], simulate.slew_time(az[i], el[i], az[j], el[j])
+                )
+        # slewing is symmetric and staying on target only costs the overhead
+        self.assertTrue((abs(slew_times - slew_times.T) < 1e-9).all())
+        for i in range(len(az)):
+            self.assertAlmostEqual(slew_times[i, i], simulate._SLEW_INIT_OVERHEAD)
+
+    def test_slew_time_matrix_over_time_grid(self):
+        az = [[0.0, 5.0, 20.0], [10.0, 15.0, 30.0]]
+        el = [[40.0, 45.0, 60.0], [41.0, 46.0, 61.0]]
+        slew_times = simulate.slew_time_matrix(az, el)
+        self.assertEqual(slew_times.shape, (2, 3, 3))
+        self.assertAlmostEqual(slew_times[0, 0, 1],
+                               simulate.slew_time(0.0, 40.0, 5.0, 45.0))
+        self.assertAlmostEqual(slew_times[1, 2, 0],
+                               simulate.slew_time(30.0, 61.0, 10.0, 41.0))
+
+
+class TestAzElCache(unittest.TestCase):
+    def setUp(self):
+        self.antenna = katpoint.Antenna(observatory.get_ref_location())
+        self.target = katpoint.Target(
+            "1934-638, radec bpcal, 19:39:25.03, -63:42:45.63", antenna=self.antenna
+        )
+        self.timestamp = 1544158800.0  # 2018-12-07 05:00:00
+
+    def test_positions_reused_within_time_bucket(self):
+        cache = simulate.AzElCache(resolution=60.0)
+        azel = cache.azel(self.target, self.timestamp + 1.0)
+        self.assertEqual(cache.azel(self.target, self.timestamp + 50.0), azel)
+        self.assertEqual(cache.positions.hits, 1)
+        self.assertEqual(cache.positions.misses, 1)
+        # position is evaluated at the bucket centre
+        az, el = self.target.azel(self.timestamp + 30.0)
+        self.assertAlmostEqual(azel[0], katpoint.rad2deg(az))
+        self.assertAlmostEqual(azel[1], katpoint.rad2deg(el))
+        # new bucket needs a new ephemeris calculation
+        self.assertNotEqual(cache.azel(self.target, self.timestamp + 90.0), azel)
+
+    def test_exact_positions_without_resolution(self):
+        # dry-run positions are exact unless a resolution is chosen
+        cache = simulate.AzElCache()
+        az, el = self.target.azel(self.timestamp + 17.0)
+        azel = cache.azel(self.target, self.timestamp + 17.0)
+        self.assertAlmostEqual(azel[0], katpoint.rad2deg(az))
+        self.assertAlmostEqual(azel[1], katpoint.rad2deg(el))
+
+    def test_slew_time_cached_and_matches_model(self):
+        cache = simulate.AzElCache(resolution=60.0)
+        other = katpoint.Target("test, azel, 32.0, 64.0", antenna=self.antenna)
+        slew_time = cache.slew_time(self.target, other, self.timestamp)
+        az, el = cache.azel(self.target, self.timestamp)
+        self.assertAlmostEqual(slew_time, simulate.slew_time(az, el, 32.0, 64.0))
+        cache.slew_time(self.target, other, self.timestamp + 10.0)
+        self.assertEqual(cache.slew_times.hits, 1)
+
+    def test_bounded_lru_eviction(self):
+        cache = simulate.AzElCache(resolution=1.0, maxsize=3)
+        for offset in range(5):
+            cache.azel(self.target, self.timestamp + offset)
+        self.assertEqual(len(cache.positions), 3)
+        cache.azel(self.target, self.timestamp + 4)
+        self.assertEqual(cache.positions.hits, 1)
+        cache.azel(self.target, self.timestamp)
+        self.assertEqual(cache.positions.misses, 6)
+
+
+class TestSimLogFormatters(unittest.TestCase):
+    def setUp(self):
+        observer = ephem.Observer()
+        observer.date = ephem.Date(datetime(2018, 12, 7, 5, 0, 0))
+        simulate.setobserver(observer)
+        self.record = logging.LogRecord(
+            "test", logging.INFO, __file__, 1, "Tracked %s", ("1934-638",), None
+        )
+
+    def test_sim_time_reformatted_only_when_clock_advances(self):
+        formatter = simulate.SimTimeFormatter()
+        timestr = formatter.formatTime(self.record)
+        self.assertEqual(timestr, "2018-12-07 05:00:00Z")
+        simulate.simobserver.date += 0.5 * ephem.second
+        # same simulated second returns the cached string
+        self.assertIs(formatter.formatTime(self.record), timestr)
+        simulate.simobserver.date += ephem.second
+        self.assertEqual(formatter.formatTime(self.record), "2018-12-07 05:00:01Z")
+        self.assertEqual(
+            formatter.format(self.record), "2018-12-07 05:00:01Z - Tracked 1934-638"
+        )
+
+    def test_json_log_lines(self):
+        formatter = simulate.SimJsonFormatter()
+        self.record.event = {"ant": "m011"}
+        entry = json.loads(formatter.format(self.record))
+        self.assertEqual(entry["msg"], "Tracked 1934-638")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["event"], {"ant": "m011"})
+        self.assertAlmostEqual(entry["time"], 1544158800.0, places=3)
+
+
+class TestSensorTimeline(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, filename, content):
+        filename = os.path.join(self.tmpdir, filename)
+        with open(filename, "w") as fout:
+            fout.write(content)
+        return filename
+
+    def test_csv_timeline_lookup(self):
+        filename = self.write(
+            "sensors.csv",
+            "timestamp,name,value\n"
+            "2018-12-07 05:00:00,sub_band,l\n"
+            "1544158900,sub_band,u\n"
+            "1544158800,int_time,7.997\n"
+            "1544158850,sub_pool_resources,\"m011,m022\"\n",
+        )
+        timeline = simulate.SensorTimeline.from_file(filename)
+        self.assertIn("sub_band", timeline)
+        self.assertNotIn("sub_product", timeline)
+        self.assertEqual(timeline.get_value("sub_band", 1544158700.0), "l")
+        self.assertEqual(timeline.get_value("sub_band", 1544158899.0), "l")
+        self.assertEqual(timeline.get_value("sub_band", 1544158900.0), "u")
+        self.assertEqual(timeline.get_value("int_time", 1544159000.0), 7.997)
+        self.assertEqual(
+            timeline.get_value("sub_pool_resources", 1544159000.0), "m011,m022"
+        )
+
+    def test_simkat_replays_timeline_on_simulated_clock(self):
+        filename = self.write(
+            "sensors.jsonl",
+            '{"timestamp": 1544158800, "name": "sub_band", "value": "l"}\n'
+            '{"timestamp": 1544158900, "name": "sub_band", "value": "u"}\n',
+        )
+        opts = mock.Mock()
+        opts.obs_plan_params = {
+            "instrument": {"band": "l", "product": "c856M4k"},
+            "observation_loop": [{"LST": "0:00-12:00"}],
+        }
+        opts.sensor_timeline = filename
+        opts.sb_id_code = "20181207-0001"
+        kat = simulate.SimKat(opts)
+        self.assertEqual(kat.sb_id_code, "20181207-0001")
+        with mock.patch("time.time", return_value=1544158850.0):
+            self.assertEqual(kat.sensor_value("sub_band"), "l")
+        with mock.patch("time.time", return_value=1544158950.0):
+            self.assertEqual(kat.get("sub_band").get_value(), "u")
+        # sensors without a timeline fall back to the plan instrument values
+        self.assertEqual(kat.sensor_value("sub_product"), "c856M4k")
+        self.assertEqual(kat.sensor_value("int_time", 0.5), 0.5)
+
+
+class TestSimDigitiser(unittest.TestCase):
+    def setUp(self):
+        opts = mock.Mock()
+        opts.obs_plan_params = {"observation_loop": [{"LST": "0:00-12:00"}]}
+        opts.sensor_timeline = None
+        opts.sim_digitiser = "clock_offset=0.001,seed=1"
+        self.kat = simulate.SimKat(opts)
+
+    def test_parse_options(self):
+        self.assertEqual(
+            simulate.parse_digitiser_options("latency=0.05, failure_rate=0.1,seed=3"),
+            {"latency": 0.05, "failure_rate": 0.1, "seed": 3},
+        )
+        with self.assertRaises(ValueError):
+            simulate.parse_digitiser_options("delay=1")
+
+    def test_katcp_replies(self):
+        digitiser = self.kat.m011
+        self.assertIsInstance(digitiser, simulate.SimDigitiser)
+        with mock.patch("time.time", return_value=1000.0):
+            reply, informs = digitiser.req.dig_noise_source(1005.0, 0.5, 16.0)
+            self.assertTrue(reply.reply_ok())
+            self.assertAlmostEqual(reply.arguments[1], 1005.0, delta=0.01)
+            self.assertNotEqual(reply.arguments[1], 1005.0)
+            self.assertEqual(reply.arguments[2:], [0.5, 16.0])
+            # late requests are applied on arrival
+            reply, _ = digitiser.req.dig_noise_source(995.0, 0.5, 16.0)
+            self.assertAlmostEqual(reply.arguments[1], 1000.0, delta=0.01)
+        self.assertEqual(len(digitiser.request_times), 2)
+
+    def test_concurrent_dispatch(self):
+        from astrokat import noisediode
+
+        opts = mock.Mock()
+        opts.obs_plan_params = {"observation_loop": [{"LST": "0:00-12:00"}]}
+        opts.sensor_timeline = None
+        opts.sim_antennas = "16"
+        opts.sim_digitiser = "latency=0.1,clock_offset=0.002,seed=1"
+        kat = simulate.SimKat(opts)
+        start = timeit.default_timer()
+        with mock.patch("time.time", return_value=1000.0):
+            timestamp = noisediode._set_dig_nd_(kat, 1005.0, switch=1)
+        # requests overlap instead of taking 16 x 0.1 sec
+        self.assertLess(timeit.default_timer() - start, 0.8)
+        self.assertAlmostEqual(timestamp, 1005.0, delta=0.01)
+        requests = [(ant.name, 1005.0) for ant in kat.ants]
+        ant_timestamps = dict((ant, 1005.0 + kat._digitisers[ant].clock_offset)
+                              for ant, _ in requests)
+        offsets = [digitiser.clock_offset for digitiser in kat._digitisers.values()]
+        self.assertAlmostEqual(noisediode._nd_skew_log_(requests, ant_timestamps),
+                               max(offsets) - min(offsets))
+
+    def test_failed_replies_are_skipped(self):
+        from astrokat import noisediode
+
+        self.kat.m022.failure_rate = 1.0
+        with mock.patch("time.time", return_value=1000.0):
+            timestamp = noisediode._set_dig_nd_(self.kat, 1005.0, switch=1)
+        self.assertAlmostEqual(timestamp, 1005.0, delta=0.01)
+
+
+class TestSimAntennas(unittest.TestCase):
+    def test_antenna_lists(self):
+        self.assertEqual(simulate.sim_antenna_names(), ["m011", "m022", "m033", "m044"])
+        self.assertEqual(simulate.sim_antenna_names("m000, m063"), ["m000", "m063"])
+        names = simulate.sim_antenna_names("300")
+        self.assertEqual(len(names), 300)
+        self.assertEqual(names[63:65], ["m063", "s0000"])
+        self.assertEqual(len(simulate.sim_antenna_names("mkat")), 64)
+        self.assertEqual(
+            simulate.sim_antenna_names(pool_resources="m001,m002,cbf_1,sdp_1"),
+            ["m001", "m002"],
+        )
+        self.assertEqual(
+            simulate.sim_antenna_names(pool_resources="available"),
+            ["m011", "m022", "m033", "m044"],
+        )
+
+    def test_simkat_antennas(self):
+        opts = mock.Mock()
+        opts.obs_plan_params = {
+            "instrument": {"pool_resources": "m000,m001"},
+            "observation_loop": [{"LST": "0:00-12:00"}],
+        }
+        opts.sensor_timeline = None
+        opts.sim_digitiser = None
+        opts.sim_antennas = None
+        kat = simulate.SimKat(opts)
+        self.assertEqual([ant.name for ant in kat.ants], ["m000", "m001"])
+        opts.sim_antennas = "128"
+        kat = simulate.SimKat(opts)
+        self.assertEqual(len(list(kat.ants)), 128)
+        session = simulate.SimSession(kat)
+        self.assertEqual(len(session.cbf.fengine.inputs), 256)
+
+
+class TestSlewModelFit(unittest.TestCase):
+    def tearDown(self):
+        simulate.set_slew_model(**simulate._DEFAULT_SLEW_MODEL)
+
+    def test_fit_recovers_model(self):
+        random_state = numpy.random.RandomState(0)
+        nslews = 500
+        from_az = random_state.uniform(0.0, 360.0, nslews)
+        from_el = random_state.uniform(20.0, 85.0, nslews)
+        extent = random_state.choice([0.5, 3.0, 10.0, 60.0], nslews)
+        to_az = from_az + random_state.uniform(-1.0, 1.0, nslews) * extent
+        to_el = numpy.clip(from_el + random_state.uniform(-1.0, 1.0, nslews) * extent,
+                           15.0, 88.0)
+        model = dict(simulate._DEFAULT_SLEW_MODEL)
+        model.update(az_speed=1.8, el_accel=0.6, slew_init_overhead=3.1,
+                     el_long_slew_settle_time=6.0)
+        durations = simulate.slew_time(from_az, from_el, to_az, to_el, model=model)
+        fitted = simulate.fit_slew_model(from_az, from_el, to_az, to_el, durations,
+                                         model=simulate._DEFAULT_SLEW_MODEL)
+        for key in model:
+            self.assertAlmostEqual(fitted[key], model[key], places=3)
+
+    def test_load_slew_model(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, "slew_model.yml")
+            model = dict(simulate._DEFAULT_SLEW_MODEL, slew_init_overhead=10.0)
+            simulate.save_slew_model(filename, model)
+            simulate.load_slew_model(filename)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertAlmostEqual(float(simulate.slew_time(0.0, 45.0, 0.0, 45.0)), 10.0)
+        with self.assertRaises(ValueError):
+            simulate.set_slew_model(az_jerk=1.0)
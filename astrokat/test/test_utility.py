@@ -0,0 +1,90 @@
+"""Test astrokat utilities."""
+from __future__ import absolute_import
+
+import mock
+import unittest
+
+from astrokat import utility
+
+
+class TestSensorCache(unittest.TestCase):
+    def test_ttl(self):
+        cache = utility.SensorCache(ttl={"sub_band": None, "int_time": 10.0})
+        read = mock.Mock(return_value="l")
+        with mock.patch("time.time", return_value=100.0):
+            self.assertEqual(cache.get("sub_band", read), "l")
+            self.assertEqual(cache.get("sub_band", read), "l")
+        self.assertEqual(read.call_count, 1)
+        # kept until invalidated
+        with mock.patch("time.time", return_value=1e6):
+            cache.get("sub_band", read)
+        self.assertEqual(read.call_count, 1)
+        cache.invalidate("sub_band")
+        cache.get("sub_band", read)
+        self.assertEqual(read.call_count, 2)
+
+        read = mock.Mock(return_value=0.5)
+        with mock.patch("time.time", return_value=100.0):
+            cache.get("int_time", read)
+        with mock.patch("time.time", return_value=105.0):
+            cache.get("int_time", read)
+        self.assertEqual(read.call_count, 1)
+        with mock.patch("time.time", return_value=111.0):
+            cache.get("int_time", read)
+        self.assertEqual(read.call_count, 2)
+
+    def test_uncached_sensor(self):
+        cache = utility.SensorCache()
+        read = mock.Mock(return_value=None)
+        self.assertIsNone(cache.get("other", read))
+        self.assertIsNone(cache.get("other", read))
+        self.assertEqual(read.call_count, 2)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+
+class TestFetchSensors(unittest.TestCase):
+    def test_fetch_sensors(self):
+        def get(name):
+            if name == "sub_missing":
+                return None
+            sensor = mock.Mock()
+            if name == "sub_broken":
+                sensor.get_value.side_effect = RuntimeError("timeout")
+            else:
+                sensor.get_value.return_value = name.upper()
+            return sensor
+
+        sensors = mock.Mock(get=get)
+        names = ["sub_band", "sub_product", "sub_missing", "sub_broken"]
+        values, errors = utility.fetch_sensors(sensors, names)
+        self.assertEqual(values, {"sub_band": "SUB_BAND", "sub_product": "SUB_PRODUCT"})
+        self.assertEqual(sorted(errors), ["sub_broken", "sub_missing"])
+        self.assertIn("timeout", errors["sub_broken"])
+
+    def test_cached_fetch(self):
+        sensor = mock.Mock()
+        sensor.get_value.return_value = "l"
+        sensors = mock.Mock()
+        sensors.get.return_value = sensor
+        cache = utility.SensorCache(ttl={"sub_band": None})
+        utility.fetch_sensors(sensors, ["sub_band"], cache=cache)
+        values, _ = utility.fetch_sensors(sensors, ["sub_band"], cache=cache)
+        self.assertEqual(values, {"sub_band": "l"})
+        self.assertEqual(sensor.get_value.call_count, 1)
+
+    def test_cache_per_connection(self):
+        kat, other_kat = mock.Mock(), mock.Mock()
+        cache = utility.get_sensor_cache(kat)
+        self.assertIs(utility.get_sensor_cache(kat), cache)
+        cache.get("sub_band", lambda: "l")
+        # a new connection, as for the next schedule block, reads again
+        other_cache = utility.get_sensor_cache(other_kat)
+        self.assertIsNot(other_cache, cache)
+        self.assertEqual(other_cache.get("sub_band", lambda: "u"), "u")
+
+
+class TestLogTimestamp(unittest.TestCase):
+    def test_log_timestamp(self):
+        self.assertEqual(utility.log_timestamp("2019-11-14 07:00:51"), 1573714851.0)
+        self.assertAlmostEqual(utility.log_timestamp("2019-11-14 07:00:51.250"),
+                               1573714851.25)
@@ -5,6 +5,12 @@ import numpy
 import time
 import yaml
 
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+# Maximum number of sensor reads in flight at the same time
+_SENSOR_FETCH_THREADS = 16
+
 
 class NotAllTargetsUpError(Exception):
     """Raise error when not all targets are at the desired horizon.
@@ -18,6 +24,182 @@ class NoTargetsUpError(Exception):
     """No targets are above the horizon at the start of the observation."""
 
 
+class LRUCache(object):
+    """Bounded mapping that evicts the least recently used entry when full.
+
+    Parameters
+    ----------
+    maxsize: int
+        Maximum number of entries kept in the cache
+
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Return cached value for key and mark it as recently used."""
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Add value to the cache, evicting the oldest entries if required."""
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries and reset the hit statistics."""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class SensorCache(object):
+    """Sensor values reused until their time to live expires.
+
+    Configuration sensors rarely change during a schedule block, caching
+    them avoids a network round trip per read.
+
+    Parameters
+    ----------
+    ttl: dict, optional
+        Time to live [sec] per sensor name, None keeps the value until
+        the sensor is invalidated
+    default_ttl: float, optional
+        Time to live of sensors not listed in `ttl` [sec], 0 always reads
+
+    """
+
+    def __init__(self, ttl=None, default_ttl=0.):
+        self.ttl = dict(ttl or {})
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._values = {}
+
+    def get(self, name, read):
+        """Return the sensor value, calling `read()` if not cached or expired."""
+        # looked up per call, simulated sessions replace time.time
+        now = time.time()
+        ttl = self.ttl.get(name, self.default_ttl)
+        if name in self._values:
+            value, read_time = self._values[name]
+            if ttl is None or now - read_time < ttl:
+                self.hits += 1
+                return value
+        self.misses += 1
+        value = read()
+        self._values[name] = (value, now)
+        return value
+
+    def invalidate(self, name=None):
+        """Forget the value of a sensor, or of all sensors if no name given."""
+        if name is None:
+            self._values.clear()
+        else:
+            self._values.pop(name, None)
+
+
+# Sensors fixed for the duration of a schedule block are read once per block
+_SENSOR_TTL = {
+    "sub_band": None,
+    "int_time": None,
+    "sync_time": None,
+    "approved_schedule": 10.,
+}
+
+
+def get_sensor_cache(kat):
+    """Sensor cache of a telescope connection, created on first use.
+
+    Every kat object holds its own cache, values are never shared
+    between connections and so between schedule blocks.
+
+    Parameters
+    ----------
+    kat: object
+        Live or simulated telescope connection
+
+    """
+    # vars, simulated connections return themselves for unknown attributes
+    cache = vars(kat).get("sensor_cache")
+    if cache is None:
+        cache = SensorCache(ttl=_SENSOR_TTL)
+        kat.sensor_cache = cache
+    return cache
+
+
+def fetch_sensors(sensors, names, cache=None):
+    """Read the values of several sensors concurrently.
+
+    Parameters
+    ----------
+    sensors: object
+        Sensor group with a `get(name)` method, e.g. `kat.sensor`
+    names: list of str
+        Names of the sensors to read
+    cache: SensorCache, optional
+        Cache to reuse recently read values from
+
+    Returns
+    -------
+    values: dict
+        Value per sensor name read successfully
+    errors: dict
+        Error message per sensor name that could not be read
+
+    """
+    def read_sensor(name):
+        sensor = sensors.get(name)
+        if sensor is None:
+            raise KeyError("sensor does not exist")
+        return sensor.get_value()
+
+    def fetch(name):
+        try:
+            if cache is None:
+                return name, read_sensor(name), None
+            return name, cache.get(name, lambda: read_sensor(name)), None
+        except Exception as err:
+            return name, None, "{}: {}".format(type(err).__name__, err)
+
+    if len(names) < 2:
+        results = [fetch(name) for name in names]
+    else:
+        pool = ThreadPool(min(len(names), _SENSOR_FETCH_THREADS))
+        try:
+            results = pool.map(fetch, names)
+        finally:
+            pool.close()
+            pool.join()
+
+    values = {}
+    errors = {}
+    for name, value, error in results:
+        if error is None:
+            values[name] = value
+        else:
+            errors[name] = error
+    return values, errors
+
+
 def read_yaml(filename):
     """Read config .yaml file."""
     with open(filename, "r") as stream:
@@ -104,6 +286,12 @@ def timestamp2datetime(timestamp):
     return datetime.datetime.utcfromtimestamp(timestamp)
 
 
+def log_timestamp(datetime_str):
+    """UTC timestamp of a log time string 'YYYY-MM-DD HH:MM:SS[.ffffff]'."""
+    fmt = "%Y-%m-%d %H:%M:%S.%f" if "." in datetime_str else "%Y-%m-%d %H:%M:%S"
+    return datetime2timestamp(datetime.datetime.strptime(datetime_str, fmt))
+
+
 def katpoint_target(target_item):
     """Construct an expected katpoint target from a target_item string."""
     coords = ["radec", "azel", "gal"]
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""Build and query rise, transit and set almanacs of calibrator catalogues."""
+
+from __future__ import print_function
+
+import argparse
+import numpy
+import os
+import sys
+
+from astrokat import __version__
+from astrokat.almanac import Almanac, catalogue_files, load_almanac
+from datetime import datetime
+
+_EVENTS = ["rise", "transit", "set"]
+
+
+def cli(prog):
+    """Define command line input arguments."""
+    usage = "{} [options]".format(prog)
+    description = ("precompute daily rise, transit and set times of all sources "
+                   "in calibrator catalogues, rebuilt only when the catalogues "
+                   "change, and look up the times of sources for a date")
+
+    parser = argparse.ArgumentParser(
+        usage=usage,
+        description=description,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=__version__)
+    parser.add_argument(
+        "--cat-path",
+        type=str,
+        default="catalogues",
+        help="path to calibrator catalogue folder")
+    parser.add_argument(
+        "--almanac",
+        type=str,
+        default="almanac.npz",
+        help="almanac file to read or create")
+    parser.add_argument(
+        "--horizon",
+        type=float,
+        default=20.0,  # angle in degrees
+        help="minimum pointing angle (in degrees) of MeerKAT dish")
+    parser.add_argument(
+        "--date",
+        type=str,
+        help="first day of a new almanac and day of source queries "
+             "with string format 'YYYY-MM-DD' (default today)")
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=366,
+        help="number of days in a new almanac")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="rebuild the almanac even if the catalogues did not change")
+    parser.add_argument(
+        "--source",
+        type=str,
+        nargs="+",
+        metavar="<name>",
+        help="list rise, transit and set times of sources on the date")
+    parser.add_argument(
+        "--lst",
+        action="store_true",
+        help="display rise and set times in LST (default UTC)")
+
+    return parser.parse_args()
+
+
+def _time_str(timestamp):
+    if not numpy.isfinite(timestamp):
+        return "-"
+    return datetime.utcfromtimestamp(timestamp).strftime("%H:%M:%S")
+
+
+def _lst_str(hours):
+    if not numpy.isfinite(hours):
+        return "-"
+    seconds = int(round(hours * 3600.)) % 86400
+    return "{:02d}:{:02d}:{:02d}".format(seconds // 3600,
+                                         seconds // 60 % 60,
+                                         seconds % 60)
+
+
+def main(args):
+    """Build the almanac if required and show source times."""
+    catalogues = catalogue_files(args.cat_path)
+    if len(catalogues) < 1:
+        raise RuntimeError("No catalogue files found in {}".format(args.cat_path))
+    if args.date is None:
+        date = datetime.utcnow()
+    else:
+        date = datetime.strptime(args.date, "%Y-%m-%d")
+
+    if args.force or not os.path.isfile(args.almanac):
+        almanac = Almanac.build(catalogues,
+                                horizon=args.horizon,
+                                start=date,
+                                days=args.days)
+        almanac.save(args.almanac)
+    else:
+        almanac = load_almanac(args.almanac,
+                               catalogues,
+                               horizon=args.horizon,
+                               date=date,
+                               days=args.days)
+    print("Almanac {} of {} sources for {} days from {:%Y-%m-%d} "
+          "above {} degrees".format(args.almanac,
+                                    len(almanac.names),
+                                    almanac.days,
+                                    datetime.utcfromtimestamp(almanac.start),
+                                    almanac.horizon))
+    if args.source is None:
+        return
+
+    unknown = [name for name in args.source if name not in almanac]
+    if unknown:
+        raise RuntimeError("Sources not in catalogues: {}".format(", ".join(unknown)))
+    date_str = "LST" if args.lst else "UTC"
+    print("Times on {:%Y-%m-%d} in {}".format(date, date_str))
+    print("{: <16}{: <16}{: <16}{: <16}".format("Sources", "Rise Time",
+                                                "Transit Time", "Set Time"))
+    times = almanac.events_on(date, names=args.source)
+    for idx, name in enumerate(args.source):
+        if args.lst:
+            events = [_lst_str(almanac.local_sidereal_time(times[event][idx]))
+                      for event in _EVENTS]
+        else:
+            events = [_time_str(times[event][idx]) for event in _EVENTS]
+        print("{: <16}{: <16}{: <16}{: <16}".format(name, *events))
+
+
+if __name__ == "__main__":
+    main(cli(sys.argv[0]))
+
+# -fin-
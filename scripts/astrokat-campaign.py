@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""Multi-night observation campaign simulation."""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+
+from astrokat import read_yaml, __version__
+from astrokat import planning
+from datetime import datetime
+
+_DATE_FMT = "%Y-%m-%d %H:%M"
+
+
+def cli(prog):
+    """Define command line input arguments."""
+    usage = "{} [options] --yaml <YAMLfile>".format(prog)
+    description = ("simulate an observation plan over consecutive nights or "
+                   "allocated observation windows, accumulating on-source "
+                   "time until the target goals are met")
+
+    parser = argparse.ArgumentParser(
+        usage=usage,
+        description=description,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=__version__)
+    parser.add_argument(
+        "--yaml",
+        type=str,
+        required=True,
+        help="observation file, obs_plan.yaml (**required**)")
+    parser.add_argument(
+        "--date",
+        type=str,
+        help="first night of the campaign 'YYYY-MM-DD' "
+             "(default plan start time date or today)")
+    parser.add_argument(
+        "--nights",
+        type=int,
+        default=1,
+        help="number of consecutive nights starting at the plan LST")
+    parser.add_argument(
+        "--window",
+        nargs=2,
+        action="append",
+        metavar=("START", "END"),
+        help="allocated UTC observation window 'YYYY-MM-DD HH:MM', "
+             "repeat for multiple windows (replaces --nights)")
+    parser.add_argument(
+        "--obs-duration",
+        type=float,
+        help="nightly observation duration in seconds "
+             "(default plan obs_duration or LST window)")
+    parser.add_argument(
+        "--goal",
+        action="append",
+        default=[],
+        metavar="NAME=HOURS",
+        help="on-source time goal for a target, repeat for multiple targets")
+    parser.add_argument(
+        "--state",
+        type=str,
+        help="JSON file with campaign progress, continued from "
+             "if it exists and updated after the simulation")
+    parser.add_argument(
+        "--resolution",
+        type=float,
+        default=60.0,
+        help="time resolution in seconds of the sky position cache")
+
+    return parser.parse_args()
+
+
+def main(args):
+    """Run campaign simulation."""
+    obs_plan_params = read_yaml(args.yaml)
+
+    goals = {}
+    for goal in args.goal:
+        name, hours = goal.rsplit("=", 1)
+        goals[name.strip()] = float(hours) * 3600.0
+
+    if args.window:
+        windows = []
+        for start, end in args.window:
+            start = datetime.strptime(start, _DATE_FMT)
+            end = datetime.strptime(end, _DATE_FMT)
+            windows.append(((start - datetime(1970, 1, 1)).total_seconds(),
+                            (end - start).total_seconds()))
+    else:
+        date = None
+        if args.date:
+            date = datetime.strptime(args.date, "%Y-%m-%d")
+        windows = planning.campaign_windows(obs_plan_params,
+                                            args.nights,
+                                            date=date,
+                                            obs_duration=args.obs_duration)
+
+    state = None
+    if args.state and os.path.isfile(args.state):
+        state = planning.read_campaign_state(args.state)
+    state = planning.campaign(obs_plan_params,
+                              windows,
+                              goals=goals,
+                              state=state,
+                              resolution=args.resolution)
+    if args.state:
+        planning.write_campaign_state(args.state, state)
+    print(planning.campaign_report(state, goals=goals))
+
+
+if __name__ == "__main__":
+    main(cli(sys.argv[0]))
+
+# -fin-
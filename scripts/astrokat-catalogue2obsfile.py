@@ -3,7 +3,7 @@
 
 from __future__ import print_function
 
-from astrokat import Observatory, __version__
+from astrokat import get_observatory, __version__
 import argparse
 import sys
 
@@ -266,9 +266,9 @@ class BuildObservation(object):
         if obs_duration is not None:
             obs_plan["durations"] = {"obs_duration": obs_duration}
         # LST times only HH:MM in OPT
-        start_lst = Observatory().start_obs(self.target_list, str_flag=True)
+        start_lst = get_observatory().start_obs(self.target_list, str_flag=True)
         start_lst = ":".join(start_lst.split(":")[:-1])
-        end_lst = Observatory().end_obs(self.target_list, str_flag=True)
+        end_lst = get_observatory().end_obs(self.target_list, str_flag=True)
         end_lst = ":".join(end_lst.split(":")[:-1])
         if lst is None:
             lst = "{}-{}".format(start_lst, end_lst)
@@ -8,7 +8,7 @@ import re
 import sys
 import time
 
-from astrokat import Observatory, lst2utc, __version__
+from astrokat import Observatory, get_observatory, lst2utc, __version__
 from datetime import datetime
 
 
@@ -83,8 +83,8 @@ def main(args):
         args.target = [target.strip() for target in args.target]
         target = ",".join(["radec target"] + args.target)
         target = katpoint.Target(target).body
-        rise_lst = Observatory()._ephem_risetime_(target)
-        set_lst = Observatory()._ephem_settime_(target)
+        rise_lst = get_observatory()._ephem_risetime_(target)
+        set_lst = get_observatory()._ephem_settime_(target)
         return_str = ("Target ({}) rises at LST {} and sets at LST {}"
                       .format(" ".join(args.target),
                               rise_lst,
@@ -96,7 +96,7 @@ def main(args):
                       .format(observer.date, observer.sidereal_time()))
 
     elif args.lst:
-        date_lst = lst2utc(args.lst, Observatory().location, date=utc_datetime)
+        date_lst = lst2utc(args.lst, get_observatory().location, date=utc_datetime)
         return_str = ("{} {} LST corresponds to {}Z UTC"
                       .format(args.date,
                               args.lst,
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+"""Analyse noise diode switch timing in recorded or simulated observations."""
+
+from __future__ import print_function
+
+import argparse
+import csv
+import json
+import numpy
+import re
+import sys
+
+from astrokat import noisediode, __version__
+from astrokat.utility import log_timestamp
+
+_LOG_LINE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(\.\d+)?)Z? - (.*)$")
+_ND_REPLY = re.compile(r"Noise diode for antenna (\S+) requested at ([-\d.e+]+), "
+                       r"reported ([-\d.e+]+)")
+_ND_DRYRUN = re.compile(r"Dry-run: Set noise diode for antenna (\S+) at "
+                        r"timestamp ([-\d.e+]+)")
+_ND_COMMAND = "Set all noise diodes with timestamp"
+_ND_DUMPS = re.compile(r"aligning noise diode switching to ([-\d.e+]+) sec "
+                       r"dumps from ([-\d.e+]+)")
+_SLEWED = "Slewed to "
+# noise diode setup before the first and switching off after the last track
+_SESSION_MARGIN = 3600.  # sec
+
+
+def cli(prog):
+    """Define command line input arguments."""
+    usage = "{} [options] <logfile> [<logfile> ...]".format(prog)
+    description = ("compare requested and reported noise diode switch times, "
+                   "per antenna skew and switch time distance to correlator dump "
+                   "boundaries and track starts in observation logs or noise "
+                   "diode event files")
+
+    parser = argparse.ArgumentParser(
+        usage=usage,
+        description=description,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=__version__)
+    parser.add_argument(
+        "logfiles",
+        nargs="+",
+        help="observation logs (text or JSON lines) with DEBUG messages, "
+             "or noise diode event files (.csv or .jsonl) with command, "
+             "antenna, requested and reported fields per event, "
+             "and type 'track' records with a time field per track start")
+    parser.add_argument(
+        "--dump-period",
+        type=float,
+        help="correlator integration time [sec], "
+             "overrides the dump timing found in the logs")
+    parser.add_argument(
+        "--dump-epoch",
+        type=float,
+        default=0.,
+        help="start of any correlator dump, e.g. the correlator sync time [sec]")
+    parser.add_argument(
+        "--max-offset",
+        type=float,
+        default=0.01,
+        help="report events switching further from the requested time [sec]")
+    parser.add_argument(
+        "--max-skew",
+        type=float,
+        default=0.01,
+        help="report commands with a larger spread over antennas [sec]")
+    parser.add_argument(
+        "--min-dump-distance",
+        type=float,
+        default=0.05,
+        help="report events switching closer to a dump boundary [sec]")
+    parser.add_argument(
+        "--show",
+        type=int,
+        default=10,
+        help="number of worst events listed per outlier type")
+    parser.add_argument(
+        "--session-margin",
+        type=float,
+        default=_SESSION_MARGIN,
+        help="ignore events switching further than this before the first or "
+             "after the last track start of a file, e.g. the wall clock "
+             "setup commands of dry-runs [sec]")
+    parser.add_argument(
+        "--output",
+        type=str,
+        help="write the timing of every event to this CSV file")
+
+    return parser.parse_args()
+
+
+class NDEvents(object):
+    """Noise diode events and track starts collected over input files.
+
+    Parameters
+    ----------
+    session_margin: float, optional
+        Events of a file switching further than this before its first or after
+        its last track start are not part of the observation and ignored [sec]
+
+    """
+
+    def __init__(self, session_margin=_SESSION_MARGIN):
+        self.session_margin = session_margin
+        self.ignored = 0
+        self.antennas = []
+        self.requested = []
+        self.reported = []
+        self.commands = []
+        self.dump_periods = []
+        self.dump_epochs = []
+        self.track_starts = []
+        self.ncommands = 0
+        self._dumps = (numpy.nan, 0.)
+
+    def add(self, ant, requested, reported, command=None):
+        self.antennas.append(ant)
+        self.requested.append(float(requested))
+        self.reported.append(float(reported))
+        self.commands.append(self.ncommands if command is None else command)
+        self.dump_periods.append(self._dumps[0])
+        self.dump_epochs.append(self._dumps[1])
+
+    def _session_only(self, first_event, first_track):
+        """Drop events of the last file outside the time span of its tracks."""
+        track_starts = self.track_starts[first_track:]
+        if len(track_starts) < 1:
+            return
+        start = min(track_starts) - self.session_margin
+        end = max(track_starts) + self.session_margin
+        keep = [idx for idx in range(first_event, len(self.reported))
+                if start <= self.reported[idx] <= end]
+        self.ignored += len(self.reported) - first_event - len(keep)
+        for name in ["antennas", "requested", "reported", "commands",
+                     "dump_periods", "dump_epochs"]:
+            values = getattr(self, name)
+            values[first_event:] = [values[idx] for idx in keep]
+
+    def read_log(self, filename):
+        """Events from a text or JSON lines observation log."""
+        first_event, first_track = len(self.reported), len(self.track_starts)
+        self._dumps = (numpy.nan, 0.)
+        with open(filename) as fin:
+            for line in fin:
+                # cheap filter first, week long logs are mostly other messages
+                if "oise diode" not in line and _SLEWED not in line:
+                    continue
+                line = line.strip()
+                if line.startswith("{"):
+                    entry = json.loads(line)
+                    timestamp, msg = float(entry["time"]), entry["msg"]
+                else:
+                    # log times are only parsed for track starts
+                    match = _LOG_LINE.match(line)
+                    timestamp, msg = (None, line) if match is None else (
+                        match.group(1), match.group(3))
+                self._read_message(timestamp, msg)
+        # commands do not continue across files
+        self.ncommands += 1
+        self._session_only(first_event, first_track)
+
+    def _read_message(self, timestamp, msg):
+        if msg.startswith(_SLEWED):
+            if isinstance(timestamp, float):
+                self.track_starts.append(timestamp)
+            elif timestamp is not None:
+                self.track_starts.append(log_timestamp(timestamp))
+            return
+        if _ND_COMMAND in msg:
+            self.ncommands += 1
+            return
+        match = _ND_REPLY.search(msg)
+        if match is not None:
+            self.add(match.group(1), match.group(2), match.group(3))
+            return
+        match = _ND_DRYRUN.search(msg)
+        if match is not None:
+            self.add(match.group(1), match.group(2), match.group(2))
+            return
+        match = _ND_DUMPS.search(msg)
+        if match is not None:
+            self._dumps = (float(match.group(1)), float(match.group(2)))
+
+    def read_events(self, filename):
+        """Events from a CSV or JSON lines noise diode event file."""
+        first_event, first_track = len(self.reported), len(self.track_starts)
+        first_command = self.ncommands
+        with open(filename) as fin:
+            if filename.lower().endswith(".csv"):
+                records = csv.DictReader(fin)
+            else:
+                records = (json.loads(line) for line in fin if line.strip())
+            for record in records:
+                if record.get("type") == "track":
+                    self.track_starts.append(float(record["time"]))
+                    continue
+                command = first_command + int(record["command"])
+                self.ncommands = max(self.ncommands, command + 1)
+                self.add(record["antenna"],
+                         record["requested"],
+                         record["reported"],
+                         command=command)
+        self._session_only(first_event, first_track)
+
+
+def _stats(label, values, unit="sec"):
+    values = values[numpy.isfinite(values)]
+    if values.size < 1:
+        return
+    print("  {:<22} median {:10.6f}  99% {:10.6f}  max {:10.6f} {}"
+          .format(label,
+                  numpy.median(values),
+                  numpy.percentile(values, 99),
+                  values.max(),
+                  unit))
+
+
+def _outliers(label, mask, order, events, timing, show):
+    idx = numpy.flatnonzero(mask)
+    print("{}: {} events".format(label, idx.size))
+    for i in idx[numpy.argsort(order[idx])][:show]:
+        print("  command {:<6} {:<6} requested {:.6f} offset {:+.6f} "
+              "skew {:.6f} dump distance {:.6f}"
+              .format(events.commands[i],
+                      events.antennas[i],
+                      events.requested[i],
+                      timing["offset"][i],
+                      timing["skew"][i],
+                      timing["dump_distance"][i]))
+
+
+def main(args):
+    """Read noise diode events and report timing outliers."""
+    events = NDEvents(session_margin=args.session_margin)
+    for filename in args.logfiles:
+        if filename.lower().endswith((".csv", ".jsonl")):
+            events.read_events(filename)
+        else:
+            events.read_log(filename)
+    if len(events.requested) < 1:
+        raise RuntimeError("No noise diode events found in {}"
+                           .format(", ".join(args.logfiles)))
+
+    dump_period = events.dump_periods
+    dump_epoch = events.dump_epochs
+    if args.dump_period is not None:
+        dump_period, dump_epoch = args.dump_period, args.dump_epoch
+    timing = noisediode.switch_timing(events.requested,
+                                      events.reported,
+                                      events.commands,
+                                      dump_period=dump_period,
+                                      dump_epoch=dump_epoch,
+                                      track_starts=events.track_starts)
+    events.commands = numpy.asarray(events.commands)
+    events.antennas = numpy.asarray(events.antennas)
+    events.requested = numpy.asarray(events.requested)
+
+    antennas, ant_idx = numpy.unique(events.antennas, return_inverse=True)
+    print("{} noise diode events, {} commands, {} antennas, {} track starts"
+          .format(len(events.requested),
+                  numpy.unique(events.commands).size,
+                  antennas.size,
+                  len(events.track_starts)))
+    if events.ignored:
+        print("{} events outside the observation time span ignored"
+              .format(events.ignored))
+    _stats("|reported - requested|", numpy.abs(timing["offset"]))
+    _stats("command skew", timing["skew"])
+    _stats("dump distance", timing["dump_distance"])
+    _stats("|track distance|", numpy.abs(timing["track_distance"]))
+
+    # mean offset per antenna shows digitisers with a consistent clock error
+    ant_offset = (numpy.bincount(ant_idx, weights=timing["offset"])
+                  / numpy.bincount(ant_idx))
+    worst = numpy.argsort(-numpy.abs(ant_offset))[:args.show]
+    print("Antennas with largest mean offset:")
+    for i in worst:
+        print("  {:<6} {:+.6f} sec".format(antennas[i], ant_offset[i]))
+
+    abs_offset = numpy.abs(timing["offset"])
+    _outliers("Offset > {} sec".format(args.max_offset),
+              abs_offset > args.max_offset,
+              -abs_offset, events, timing, args.show)
+    _outliers("Command skew > {} sec".format(args.max_skew),
+              timing["skew"] > args.max_skew,
+              -timing["skew"], events, timing, args.show)
+    with numpy.errstate(invalid="ignore"):
+        near_boundary = timing["dump_distance"] < args.min_dump_distance
+    _outliers("Dump distance < {} sec".format(args.min_dump_distance),
+              near_boundary,
+              timing["dump_distance"], events, timing, args.show)
+
+    if args.output is not None:
+        with open(args.output, "w") as fout:
+            writer = csv.writer(fout)
+            writer.writerow(["command", "antenna", "requested", "reported",
+                             "offset", "skew", "dump_distance", "track_distance"])
+            for row in zip(events.commands,
+                           events.antennas,
+                           events.requested,
+                           events.reported,
+                           timing["offset"],
+                           timing["skew"],
+                           timing["dump_distance"],
+                           timing["track_distance"]):
+                writer.writerow(row)
+
+
+if __name__ == "__main__":
+    main(cli(sys.argv[0]))
+
+# -fin-
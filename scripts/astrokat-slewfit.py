@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""Calibrate the simulator slew model from recorded antenna slews."""
+
+from __future__ import print_function
+
+import argparse
+import csv
+import json
+import numpy
+import sys
+
+from astrokat import simulate, __version__
+
+# Axis speed separating slews from sidereal tracking [deg/sec]
+_SLEW_SPEED = 0.05
+
+
+def cli(prog):
+    """Define command line input arguments."""
+    usage = ("{} [options] --output <YAMLfile> "
+             "[<eventfile> ...] [--positions <file> ...]".format(prog))
+    description = ("fit the simulator slew and overhead model to slews in "
+                   "slew event files, or found in recorded antenna positions")
+
+    parser = argparse.ArgumentParser(
+        usage=usage,
+        description=description,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=__version__)
+    parser.add_argument(
+        "eventfiles",
+        nargs="*",
+        help="slew event files (.csv or .jsonl) with from_az, from_el, to_az, "
+             "to_el and duration fields per slew, and type 'setup' records "
+             "with the duration of the observation setup")
+    parser.add_argument(
+        "--positions",
+        nargs="+",
+        default=[],
+        metavar="<file>",
+        help="antenna position samples (.csv or .jsonl) with timestamp, az "
+             "and el fields [sec, deg], such as the actual azimuth and "
+             "elevation sensor history of an antenna")
+    parser.add_argument(
+        "--slew-speed",
+        type=float,
+        default=_SLEW_SPEED,
+        help="axis speed above which an antenna is slewing [deg/sec]")
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="calibrated slew model YAML file for the simulator --slew-model "
+             "option (**required**)")
+    parser.add_argument(
+        "--max-duration",
+        type=float,
+        default=300.0,
+        help="ignore slews taking longer than this [sec], "
+             "such as slews interrupted by other activities")
+
+    return parser.parse_args()
+
+
+def _read_records(filename):
+    with open(filename) as fin:
+        if filename.lower().endswith(".csv"):
+            return list(csv.DictReader(fin))
+        return [json.loads(line) for line in fin if line.strip()]
+
+
+def read_positions(filename):
+    """Time ordered antenna position samples [sec, deg, deg]."""
+    samples = numpy.array([(float(record["timestamp"]),
+                            float(record["az"]),
+                            float(record["el"]))
+                           for record in _read_records(filename)])
+    return samples[numpy.argsort(samples[:, 0])].T
+
+
+def position_slews(timestamps, az, el, slew_speed=_SLEW_SPEED):
+    """Slews between stationary or tracking periods of an antenna.
+
+    A slew starts at the last sample before an axis moves faster than
+    `slew_speed` and ends at the first sample after both axes are slower
+    again, so settling is part of the slew duration.
+
+    """
+    if len(timestamps) < 2:
+        return []
+    dt = numpy.diff(timestamps)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        speed = numpy.maximum(numpy.abs(numpy.diff(az)), numpy.abs(numpy.diff(el))) / dt
+    moving = numpy.concatenate([[False], speed > slew_speed, [False]]).astype(int)
+    # sample intervals [first, last) of every run of moving intervals
+    edges = numpy.diff(moving)
+    starts = numpy.flatnonzero(edges > 0)
+    ends = numpy.flatnonzero(edges < 0)
+    return [(az[start], el[start], az[end], el[end], timestamps[end] - timestamps[start])
+            for start, end in zip(starts, ends)]
+
+
+def read_slew_events(filename):
+    """Slews from a CSV or JSON lines slew event file."""
+    fields = ["from_az", "from_el", "to_az", "to_el", "duration"]
+    slews = []
+    setups = []
+    for record in _read_records(filename):
+        if record.get("type") == "setup":
+            setups.append(float(record["duration"]))
+        else:
+            slews.append(tuple(float(record[field]) for field in fields))
+    return slews, setups
+
+
+def main(args):
+    """Fit slew model and write model file."""
+    slews = []
+    setups = []
+    for filename in args.eventfiles:
+        slews_, setups_ = read_slew_events(filename)
+        slews.extend(slews_)
+        setups.extend(setups_)
+    for filename in args.positions:
+        slews.extend(position_slews(*read_positions(filename),
+                                    slew_speed=args.slew_speed))
+    if len(slews) < 1:
+        raise RuntimeError("No slews found in {}"
+                           .format(", ".join(args.eventfiles + args.positions)))
+
+    from_az, from_el, to_az, to_el, durations = numpy.array(slews, dtype=float).T
+    valid = (durations > 0) & (durations <= args.max_duration)
+    model = simulate.fit_slew_model(from_az[valid],
+                                    from_el[valid],
+                                    to_az[valid],
+                                    to_el[valid],
+                                    durations[valid])
+    if setups:
+        model["sim_overhead"] = float(numpy.median(setups))
+
+    residuals = durations[valid] - simulate.slew_time(from_az[valid],
+                                                      from_el[valid],
+                                                      to_az[valid],
+                                                      to_el[valid],
+                                                      model=model)
+    print("Fitted {} slews ({} rejected), residual rms {:.2f} sec"
+          .format(int(valid.sum()),
+                  int((~valid).sum()),
+                  numpy.sqrt(numpy.mean(residuals ** 2))))
+    for key in sorted(model):
+        print("  {}: {:.3f}".format(key, model[key]))
+    simulate.save_slew_model(args.output, model)
+
+
+if __name__ == "__main__":
+    main(cli(sys.argv[0]))
+
+# -fin-
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""Observation plan robustness over the LST window."""
+
+from __future__ import print_function
+
+import argparse
+import sys
+
+from astrokat import read_yaml, __version__
+from astrokat import planning
+from datetime import datetime
+
+
+def cli(prog):
+    """Define command line input arguments."""
+    usage = "{} [options] --yaml <YAMLfile>".format(prog)
+    description = ("simulate an observation plan for start times spread over "
+                   "its LST window and report the spread in outcomes")
+
+    parser = argparse.ArgumentParser(
+        usage=usage,
+        description=description,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=__version__)
+    parser.add_argument(
+        "--yaml",
+        type=str,
+        required=True,
+        help="observation file, obs_plan.yaml (**required**)")
+    parser.add_argument(
+        "--date",
+        type=str,
+        help="observation date 'YYYY-MM-DD' "
+             "(default plan start time date or today)")
+    parser.add_argument(
+        "--nruns",
+        type=int,
+        default=24,
+        help="number of simulated start times")
+    parser.add_argument(
+        "--monte-carlo",
+        action="store_true",
+        help="random start times instead of a regular grid over the LST window")
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="random generator seed for repeatable Monte Carlo sweeps")
+    parser.add_argument(
+        "--obs-duration",
+        type=float,
+        help="observation duration in seconds (default plan obs_duration)")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help="number of parallel simulations (default number of CPUs)")
+    parser.add_argument(
+        "--resolution",
+        type=float,
+        default=60.0,
+        help="time resolution in seconds of the shared sky position grid")
+
+    return parser.parse_args()
+
+
+def main(args):
+    """Run LST start time sweep."""
+    obs_plan_params = read_yaml(args.yaml)
+    date = None
+    if args.date:
+        date = datetime.strptime(args.date, "%Y-%m-%d")
+    start_times = planning.sweep_start_times(obs_plan_params,
+                                             nruns=args.nruns,
+                                             date=date,
+                                             monte_carlo=args.monte_carlo,
+                                             seed=args.seed)
+    summaries = planning.lst_sweep(obs_plan_params,
+                                   start_times,
+                                   obs_duration=args.obs_duration,
+                                   processes=args.processes,
+                                   resolution=args.resolution)
+    print(planning.sweep_report(planning.sweep_statistics(summaries)))
+
+
+if __name__ == "__main__":
+    main(cli(sys.argv[0]))
+
+# -fin-
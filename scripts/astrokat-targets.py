@@ -14,7 +14,11 @@ import numpy
 import os
 import sys
 
-from astrokat import Observatory, read_yaml, katpoint_target, __version__
+from astrokat import Observatory, get_observatory, read_yaml, katpoint_target, __version__
+from astrokat.almanac import Almanac, catalogue_files, load_almanac, timestamp2date
+from astrokat.ephemeris import set_cache_directory
+from astrokat.observatory import sky_positions, _SIDEREAL_RATE
+from astrokat.simulate import _UNIX_EPOCH_DATE
 from astrokat.utility import datetime2timestamp, timestamp2datetime
 from copy import deepcopy
 from datetime import datetime, timedelta
@@ -103,6 +107,17 @@ def cli(prog):
         action="store_true",
         help="display rise and set times in LST (default UTC)",
     )
+    parser.add_argument(
+        "--almanac",
+        type=str,
+        help="rise and set time almanac file of the calibrator catalogues, "
+             "created by astrokat-almanac.py or rebuilt if the catalogues changed",
+    )
+    parser.add_argument(
+        "--ephemeris-cache",
+        type=str,
+        help="directory to save and reuse fitted Sun, Moon and planet positions",
+    )
 
     group = parser.add_argument_group(
         title="observation target specification (*required*) ",
@@ -226,6 +241,18 @@ def source_solar_angle(catalogue, ref_antenna):
     target_tags = get_filter_tags(catalogue, targets=True)
     katpt_targets = catalogue.filter(target_tags)
 
+    # angle between Sun and targets from their horizontal coordinates
+    timestamps = [datetime2timestamp(the_date) for the_date in date_list]
+    positions = sky_positions(ref_antenna.observer,
+                              [sun] + katpt_targets.targets,
+                              timestamps)
+    az = numpy.radians(positions["az"])
+    el = numpy.radians(positions["el"])
+    separation = numpy.degrees(numpy.arccos(numpy.clip(
+        numpy.sin(el[0]) * numpy.sin(el[1:])
+        + numpy.cos(el[0]) * numpy.cos(el[1:]) * numpy.cos(az[1:] - az[0]),
+        -1., 1.)))
+
     for cnt, katpt_target in enumerate(katpt_targets):
         plt.figure(figsize=(17, 7), facecolor="white")
         ax = plt.subplot(111)
@@ -233,14 +260,7 @@ def source_solar_angle(catalogue, ref_antenna):
         fontP = FontProperties()
         fontP.set_size("small")
 
-        solar_angle = []
-        for the_date in date_list:
-            ref_antenna.observer.date = the_date
-            sun.body.compute(ref_antenna.observer)
-            katpt_target.body.compute(ref_antenna.observer)
-            solar_angle.append(
-                numpy.degrees(ephem.separation(sun.body,
-                                               katpt_target.body)))
+        solar_angle = separation[cnt]
 
         myplot, = plt.plot_date(date_list,
                                 solar_angle,
@@ -264,6 +284,17 @@ def source_solar_angle(catalogue, ref_antenna):
         ax.set_xlabel("Date")
 
 
+def _utc_hours_(ephem_time):
+    """Hour of the day of an ephem date, or of the time of day returned for
+    targets that do not rise or set."""
+    if isinstance(ephem_time, ephem.Date):
+        ephem_time = ephem_time.datetime().time()
+        return (ephem_time.hour
+                + ephem_time.minute / 60.0
+                + ephem_time.second / 3600.0)
+    return numpy.degrees(float(ephem_time)) / 15.0
+
+
 def source_rise_set(catalogue, ref_antenna):
     """Set source rise time.
 
@@ -289,23 +320,52 @@ def source_rise_set(catalogue, ref_antenna):
     target_tags = get_filter_tags(catalogue, targets=True)
     katpt_targets = catalogue.filter(target_tags)
 
+    horizon = numpy.degrees(ref_antenna.observer.horizon)
+    rise_hours = numpy.empty((len(katpt_targets), numdays))
+    set_hours = numpy.empty((len(katpt_targets), numdays))
+    radec = [cnt for cnt, target in enumerate(katpt_targets)
+             if target.body_type == "radec"]
+    if radec:
+        # hour angle at midnight and hour angle of rising give the next rise
+        radec_targets = [katpt_targets.targets[cnt] for cnt in radec]
+        timestamps = [datetime2timestamp(the_date) for the_date in date_list]
+        hour_angle = sky_positions(ref_antenna.observer,
+                                   radec_targets,
+                                   timestamps)["ha"]
+        observatory = get_observatory(location=ref_antenna.description,
+                                      horizon=horizon,
+                                      datetime=ref_antenna.observer.date)
+        times = observatory.rise_set([target.body._ra for target in radec_targets],
+                                     [target.body._dec for target in radec_targets])
+        rise_ha = numpy.mod(times["rise_lst"] - times["transit_lst"] + 12.0,
+                            24.0) - 12.0
+        rise_wait = (numpy.mod(rise_ha[:, numpy.newaxis] - hour_angle, 24.0)
+                     / _SIDEREAL_RATE)
+        set_wait = rise_wait - 2.0 * rise_ha[:, numpy.newaxis] / _SIDEREAL_RATE
+        rise_hours[radec] = numpy.mod(rise_wait, 24.0)
+        set_hours[radec] = numpy.mod(set_wait, 24.0)
+    others = [cnt for cnt in range(len(katpt_targets)) if cnt not in radec]
+    if others:
+        # special and azel targets, rise and set computed by ephem per day
+        observatory = Observatory(location=ref_antenna.description,
+                                  horizon=horizon)
+        for day, the_date in enumerate(date_list):
+            observatory.observer.date = the_date
+            for cnt in others:
+                body = katpt_targets.targets[cnt].body
+                rise_hours[cnt, day] = _utc_hours_(
+                    observatory._ephem_risetime_(body, lst=False))
+                set_hours[cnt, day] = _utc_hours_(
+                    observatory._ephem_settime_(body, lst=False))
+
     for cnt, katpt_target in enumerate(katpt_targets):
         plt.figure(figsize=(17, 7), facecolor="white")
         ax = plt.subplot(111)
         plt.subplots_adjust(right=0.8)
         fontP = FontProperties()
         fontP.set_size("small")
-        rise_times = []
-        set_times = []
-        for the_date in date_list:
-            ref_antenna.observer.date = the_date
-            risetime = ref_antenna.observer.next_rising(katpt_target.body)
-            settime = ref_antenna.observer.next_setting(katpt_target.body,
-                                                        risetime)
-            risetime = risetime.datetime().time()
-            rise_times.append(risetime.hour + risetime.minute / 60.0)
-            settime = settime.datetime().time()
-            set_times.append(settime.hour + settime.minute / 60.0)
+        rise_times = rise_hours[cnt]
+        set_times = set_hours[cnt]
 
         myplot, = plt.plot_date(date_list,
                                 rise_times,
@@ -366,12 +426,11 @@ def source_elevation(catalogue, ref_antenna):
     fontP = FontProperties()
     fontP.set_size("small")
 
+    elevations = sky_positions(catalogue.antenna.observer,
+                               catalogue.targets,
+                               time_range)["el"]
     for cnt, target in enumerate(catalogue.targets):
-        elev = []
-        for idx, timestamp in enumerate(timestamps):
-            catalogue.antenna.observer.date = ephem.Date(timestamp)
-            target.body.compute(catalogue.antenna.observer)
-            elev.append(numpy.degrees(target.body.alt))
+        elev = elevations[cnt]
 
         label = "{} ".format(target.name)
         target.tags.remove("radec")
@@ -460,6 +519,7 @@ def table_line(datetime,
                sol_limit=None,
                lst=False,
                notes="",
+               almanac=None,
                ):
     """Construct a line of target information to display on command line output.
 
@@ -481,15 +541,30 @@ def table_line(datetime,
         display times in LST rather than UTC
     notes: str
         user provided extra information
+    almanac: astrokat.almanac.Almanac
+        precomputed rise and set times [optional]
 
     Returns
     -------
         <name> <risetime UTC> <settime UTC> <Separation> <Notes>
 
     """
-    observatory = Observatory(horizon=horizon, datetime=datetime)
-    rise_time = observatory._ephem_risetime_(target.body, lst=lst)
-    set_time = observatory._ephem_settime_(target.body, lst=lst)
+    rise_time = set_time = None
+    observatory = get_observatory(horizon=horizon, datetime=datetime)
+    if (almanac is not None
+            and almanac.matches(target, observatory.location, horizon)):
+        timestamp = (float(datetime) - _UNIX_EPOCH_DATE) * 86400.0
+        rise_time, set_time = almanac.next_rise_set(target.name, timestamp)
+    if rise_time is None:
+        rise_time = observatory._ephem_risetime_(target.body, lst=lst)
+        set_time = observatory._ephem_settime_(target.body, lst=lst)
+    elif lst:
+        rise_lst, set_lst = almanac.local_sidereal_time([rise_time, set_time])
+        rise_time = ephem.hours(numpy.radians(15.0 * rise_lst))
+        set_time = ephem.hours(numpy.radians(15.0 * set_lst))
+    else:
+        rise_time = timestamp2date(rise_time)
+        set_time = timestamp2date(set_time)
     if not lst:
         rise_time = rise_time.datetime().strftime("%H:%M:%S")
         set_time = set_time.datetime().strftime("%H:%M:%S")
@@ -529,6 +604,7 @@ def obs_table(ref_antenna,
               ref_tgt_list=[],
               solar_sep=90.,
               lst=False,
+              almanac=None,
               ):
     """Construct a command line table to displaying catalogue target information.
 
@@ -544,6 +620,8 @@ def obs_table(ref_antenna,
         minimum solar separation angle [optional]
     lst: datetime
         LST
+    almanac: astrokat.almanac.Almanac
+        precomputed rise and set times [optional]
 
     Returns
     -------
@@ -588,6 +666,7 @@ def obs_table(ref_antenna,
                                         sol_limit=solar_sep,
                                         lst=lst,
                                         notes=note,
+                                        almanac=almanac,
                                         )
 
     current_target = ""
@@ -615,7 +694,8 @@ def obs_table(ref_antenna,
                                         sep_angle=separation_angle,
                                         cal_limit=15,
                                         lst=lst,
-                                        notes=note)
+                                        notes=note,
+                                        almanac=almanac)
 
     return observation_table
 
@@ -779,8 +859,8 @@ def best_cal_cover(catalogue, katpt_target, ref_antenna):
     horizon = numpy.degrees(ref_antenna.observer.horizon)
     if separation > 20.0:  # calibrator rises some time after target
         # add another calibrator preceding the target
-        observatory = Observatory(horizon=horizon,
-                                  datetime=ref_antenna.observer.date)
+        observatory = get_observatory(horizon=horizon,
+                                      datetime=ref_antenna.observer.date)
         tgt_rise_time = observatory._ephem_risetime_(katpt_target.body,
                                                      lst=False)
         preceding_cals = []
@@ -834,6 +914,31 @@ def main(args):
     ref_antenna.observer.date = ephem.Date(creation_time)
     ref_antenna.observer.horizon = ephem.degrees(str(args.horizon))
 
+    if args.ephemeris_cache is not None:
+        set_cache_directory(args.ephemeris_cache)
+
+    almanac = None
+    if args.almanac is not None:
+        catalogues = catalogue_files(args.cat_path or "katconfig/user/catalogues")
+        if catalogues:
+            almanac = load_almanac(args.almanac,
+                                   catalogues,
+                                   location=location,
+                                   horizon=args.horizon,
+                                   date=ref_antenna.observer.date.datetime())
+        else:
+            almanac = Almanac.load(args.almanac)
+            timestamp = datetime2timestamp(ref_antenna.observer.date.datetime())
+            if almanac.location != location or not almanac.covers(timestamp):
+                msg = bcolors.WARNING
+                msg += "Almanac {} does not cover this location and date, ".format(
+                    args.almanac)
+                msg += "and no catalogues were found to rebuild it\n"
+                msg += "Computing rise and set times directly\n"
+                msg += bcolors.ENDC
+                print(msg)
+                almanac = None
+
     if args.view:
         # check if view file in CSV or YAML
         data_dict = read_yaml(args.view)
@@ -849,7 +954,11 @@ def main(args):
             with open(args.view, 'r') as fin:
                 catalogue = katpoint.Catalogue(fin)
         obs_summary = obs_table(
-            ref_antenna, catalogue=catalogue, solar_sep=args.solar_angle, lst=args.lst
+            ref_antenna,
+            catalogue=catalogue,
+            solar_sep=args.solar_angle,
+            lst=args.lst,
+            almanac=almanac,
         )
         print(obs_summary)
 
@@ -991,6 +1100,7 @@ def main(args):
         ref_tgt_list=cal_targets,
         solar_sep=args.solar_angle,
         lst=args.lst,
+        almanac=almanac,
     )
     print(obs_summary)
 
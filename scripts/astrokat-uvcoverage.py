@@ -15,7 +15,8 @@ import numpy as np
 import sys
 import yaml
 
-from astrokat import __version__
+from astrokat import __version__, datetime2timestamp
+from astrokat.observatory import sky_positions
 
 text_only = False
 try:
@@ -385,8 +386,8 @@ def get_ha_range(telescope,
 
     telescope.observer.date = ephem.Date(start_time)
     star = ephem.FixedBody()
-    star._ra = target.ra.degree
-    star._dec = target.dec.degree
+    star._ra = np.radians(target.ra.degree)
+    star._dec = np.radians(target.dec.degree)
     rise_time = telescope.observer.previous_rising(star)
     set_time = telescope.observer.next_setting(star,
                                                start=rise_time).datetime()
@@ -412,14 +413,8 @@ def get_ha_range(telescope,
 
     time_step = float(duration) / float(ntimeslots)
     dtime = np.arange(0, duration + time_step, time_step)
-    ha_range = np.zeros((dtime.size), dtype=float)
-    for cnt, dt in enumerate(dtime):
-        time_ = start_time + timedelta(seconds=dt)
-        if time_ < transit_time:
-            dt_transit = -(transit_time - time_).total_seconds()
-        else:
-            dt_transit = (time_ - transit_time).total_seconds()
-        ha_range[cnt] = dt_transit / 3600.
+    timestamps = datetime2timestamp(start_time) + dtime
+    ha_range = sky_positions(telescope.observer, [star], timestamps)["ha"][0]
 
     # 1hr = 15 deg = pi/12 rad
     return ha_range * np.pi / 12.
@@ -13,12 +13,18 @@ setup(
     author="Ruby van Rooyen / MeerKAT CAM team",
     author_email="cam@ska.ac.za",
     packages=find_packages(),
+    package_data={"astrokat": ["config/*.yml"]},
     scripts=[
+        "scripts/astrokat-almanac.py",
         "scripts/astrokat-catalogue2obsfile.py",
         "scripts/astrokat-coords.py",
         "scripts/astrokat-fitflux.py",
         "scripts/astrokat-lst.py",
+        "scripts/astrokat-ndtiming.py",
         "scripts/astrokat-observe.py",
+        "scripts/astrokat-slewfit.py",
+        "scripts/astrokat-sweep.py",
+        "scripts/astrokat-campaign.py",
         "scripts/astrokat-targets.py",
         "scripts/astrokat-uvcoverage.py",
     ],